@@ -0,0 +1,267 @@
+# Compiles the MITRE ATT&CK Enterprise STIX bundle (enterprise-attack.json)
+# into a small SQLite index holding techniques, groups, group->technique
+# relationships and external IDs.  Parsing the full bundle takes seconds and
+# hundreds of MB of memory, so it is only done when the bundle changes; every
+# other run reads the rows it needs straight from the index.
+import os
+import json
+import sqlite3
+import hashlib
+import argparse
+
+# Bumped when compile_attack_index changes what it writes, so older indexes are rebuilt
+INDEX_FORMAT = "2"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS techniques (
+    stix_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    external_id TEXT NOT NULL,
+    display_name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS groups (
+    stix_id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    external_id TEXT,
+    aliases TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS group_techniques (
+    group_id TEXT NOT NULL,
+    technique_id TEXT NOT NULL,
+    PRIMARY KEY (group_id, technique_id)
+);
+CREATE INDEX IF NOT EXISTS techniques_external_id ON techniques (external_id);
+CREATE INDEX IF NOT EXISTS groups_name ON groups (name COLLATE NOCASE);
+"""
+
+
+def bundle_hash(bundle_path, chunk_size=1024 * 1024):
+    """
+    Returns the sha256 hex digest of the STIX bundle.
+    """
+    digest = hashlib.sha256()
+    with open(bundle_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _mitre_external_id(stix_object):
+    for reference in stix_object.get('external_references', []):
+        if reference.get('source_name') == 'mitre-attack' and 'external_id' in reference:
+            return reference['external_id']
+    return None
+
+
+def _is_active(stix_object):
+    # Revoked and deprecated objects stay in the bundle but are no longer part of ATT&CK
+    return not stix_object.get('revoked', False) and not stix_object.get('x_mitre_deprecated', False)
+
+
+def compile_attack_index(bundle_path, index_path):
+    """
+    Parses the STIX bundle once and writes the techniques, groups and
+    group->technique relationships into a fresh SQLite index.  Revoked and
+    deprecated objects are left out.
+
+    Args:
+        bundle_path: Path to enterprise-attack.json.
+        index_path: Path of the SQLite index to (re)create.
+
+    Returns:
+        str: The sha256 of the bundle the index was built from.
+    """
+    stat = os.stat(bundle_path)
+    digest = bundle_hash(bundle_path)
+    with open(bundle_path, 'r', encoding='utf-8') as file:
+        bundle = json.load(file)
+
+    techniques = []
+    groups = []
+    relationships = []
+    for stix_object in bundle.get('objects', []):
+        object_type = stix_object.get('type')
+        if not _is_active(stix_object):
+            continue
+        if object_type == 'attack-pattern':
+            # Same rows load_techniques used to build from MitreAttackData:
+            # one per external reference that carries an external_id
+            for reference in stix_object.get('external_references', []):
+                if 'external_id' in reference:
+                    techniques.append((
+                        stix_object['id'],
+                        stix_object['name'],
+                        reference['external_id'],
+                        f"{stix_object['name']} ({reference['external_id']})"
+                    ))
+        elif object_type == 'intrusion-set':
+            groups.append((
+                stix_object['id'],
+                stix_object['name'],
+                _mitre_external_id(stix_object),
+                json.dumps(stix_object.get('aliases', []))
+            ))
+        elif object_type == 'relationship' and stix_object.get('relationship_type') == 'uses':
+            source_ref = stix_object.get('source_ref', '')
+            target_ref = stix_object.get('target_ref', '')
+            if source_ref.startswith('intrusion-set--') and target_ref.startswith('attack-pattern--'):
+                relationships.append((source_ref, target_ref))
+    del bundle
+
+    # Build into a temporary file and swap it in, so a crash mid-compile never
+    # leaves a half written index behind
+    tmp_path = f"{index_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection = sqlite3.connect(tmp_path)
+    try:
+        connection.executescript(SCHEMA)
+        connection.executemany("INSERT INTO techniques VALUES (?, ?, ?, ?)", techniques)
+        connection.executemany("INSERT OR REPLACE INTO groups VALUES (?, ?, ?, ?)", groups)
+        connection.executemany("INSERT OR IGNORE INTO group_techniques VALUES (?, ?)", relationships)
+        connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+            ('bundle_sha256', digest),
+            ('index_format', INDEX_FORMAT),
+            ('bundle_size', str(stat.st_size)),
+            ('bundle_mtime_ns', str(stat.st_mtime_ns)),
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+    os.replace(tmp_path, index_path)
+    return digest
+
+
+class AttackIndex:
+    """
+    Read-only view over a compiled ATT&CK index.  The SQLite connection is only
+    opened on first use, and each accessor reads just the rows it returns.
+    """
+
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(f"file:{self.index_path}?mode=ro", uri=True)
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def techniques(self):
+        """
+        Returns every technique row in the same shape load_techniques produces.
+        """
+        rows = self.connection.execute(
+            "SELECT stix_id, name, external_id, display_name FROM techniques ORDER BY rowid")
+        return [{
+            'id': stix_id,
+            'Technique Name': name,
+            'External ID': external_id,
+            'Display Name': display_name
+        } for stix_id, name, external_id, display_name in rows]
+
+    def group_names(self):
+        rows = self.connection.execute("SELECT name FROM groups ORDER BY name")
+        return [name for (name,) in rows]
+
+    def group_techniques(self, group_name):
+        """
+        Returns the display names of the ATT&CK techniques (T-numbers only) used
+        by the named threat group, matched on its name or any of its aliases.
+        """
+        group_ids = [stix_id for (stix_id,) in self.connection.execute(
+            "SELECT stix_id FROM groups WHERE name = ? COLLATE NOCASE", (group_name,))]
+        if not group_ids:
+            group_ids = [stix_id for stix_id, aliases in self.connection.execute(
+                "SELECT stix_id, aliases FROM groups")
+                if group_name.lower() in (alias.lower() for alias in json.loads(aliases))]
+        if not group_ids:
+            return []
+        placeholders = ", ".join("?" * len(group_ids))
+        rows = self.connection.execute(
+            f"""SELECT DISTINCT t.display_name FROM group_techniques g
+                JOIN techniques t ON t.stix_id = g.technique_id
+                WHERE g.group_id IN ({placeholders}) AND t.external_id LIKE 'T%'
+                ORDER BY t.external_id""", group_ids)
+        return [display_name for (display_name,) in rows]
+
+
+def _index_is_current(bundle_path, index_path):
+    if not os.path.exists(index_path):
+        return False
+    try:
+        index = AttackIndex(index_path)
+        try:
+            indexed_format = index.meta('index_format')
+            indexed_hash = index.meta('bundle_sha256')
+            indexed_size = index.meta('bundle_size')
+            indexed_mtime = index.meta('bundle_mtime_ns')
+        finally:
+            index.close()
+    except sqlite3.DatabaseError:
+        return False
+    if indexed_format != INDEX_FORMAT:
+        return False
+    stat = os.stat(bundle_path)
+    # Size and mtime unchanged: skip hashing the bundle entirely
+    if indexed_size == str(stat.st_size) and indexed_mtime == str(stat.st_mtime_ns):
+        return True
+    if indexed_hash != bundle_hash(bundle_path):
+        return False
+    # Same content with a new mtime (e.g. re-downloaded); remember the new stat
+    connection = sqlite3.connect(index_path)
+    try:
+        connection.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", [
+            ('bundle_size', str(stat.st_size)),
+            ('bundle_mtime_ns', str(stat.st_mtime_ns)),
+        ])
+        connection.commit()
+    finally:
+        connection.close()
+    return True
+
+
+def open_attack_index(bundle_path, index_path=None):
+    """
+    Returns an AttackIndex for the bundle, compiling it first if the index is
+    missing or was built from a bundle with a different hash.
+
+    Args:
+        bundle_path: Path to enterprise-attack.json.
+        index_path: Where to keep the index (default: next to the bundle, with a .db suffix).
+    """
+    if index_path is None:
+        index_path = f"{os.path.splitext(bundle_path)[0]}.db"
+    if not _index_is_current(bundle_path, index_path):
+        print(f"Compiling ATT&CK index {index_path} from {bundle_path}...")
+        compile_attack_index(bundle_path, index_path)
+    return AttackIndex(index_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile the MITRE ATT&CK STIX bundle into a SQLite index.")
+    parser.add_argument("bundle", nargs="?", default="enterprise-attack.json", help="Path to enterprise-attack.json")
+    parser.add_argument("--index", help="Path of the index to write (default: <bundle>.db)")
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the bundle hash is unchanged")
+    args = parser.parse_args()
+
+    index_path = args.index or f"{os.path.splitext(args.bundle)[0]}.db"
+    if args.force:
+        compile_attack_index(args.bundle, index_path)
+    index = open_attack_index(args.bundle, index_path)
+    print(f"Index {index_path}: {len(index.techniques())} techniques, {len(index.group_names())} groups "
+          f"(bundle sha256 {index.meta('bundle_sha256')})")
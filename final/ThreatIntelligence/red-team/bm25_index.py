@@ -0,0 +1,188 @@
+# Local BM25 inverted index over the Atomic Red Team chunks, kept next to the
+# Chroma collection by loaddb.py.  Analyst queries usually hinge on exact
+# technique IDs and command names ("List the commands used T1040"), which
+# lexical matching handles far better than embeddings.  HybridRetriever fuses
+# the BM25 ranking with the vector ranking through reciprocal rank fusion, and
+# answers queries that are nothing but technique IDs from BM25 alone, without
+# embedding the query.  The index holds term frequencies and lengths only; the
+# text of the chunks it ranks is fetched from the Chroma collection by id, so
+# the resident query server does not keep a second copy of the corpus.
+import os
+import re
+import json
+import math
+import hashlib
+import threading
+from collections import Counter, defaultdict
+
+TECHNIQUE_ID = re.compile(r"\bT\d{4}(?:\.\d{3})?\b", re.IGNORECASE)
+TOKEN = re.compile(r"[a-z0-9][a-z0-9_.\-/\\]*[a-z0-9]|[a-z0-9]")
+# Technique IDs found in a chunk's path (atomics/T1040/T1040.md) count this many times
+ID_FIELD_BOOST = 3
+
+
+def tokenize(text):
+    """
+    Lowercases and splits text into terms.  Compound tokens such as command
+    names, flags or paths (net.exe, T1059.001, /etc/passwd) are kept whole and
+    their parts are added as well, so both "t1059.001" and "t1059" match.
+    """
+    terms = []
+    for token in TOKEN.findall(text.lower()):
+        terms.append(token)
+        parts = [part for part in re.split(r"[_.\-/\\]+", token) if part]
+        if len(parts) > 1:
+            terms.extend(parts)
+    return terms
+
+
+def technique_ids(text):
+    return [match.upper() for match in TECHNIQUE_ID.findall(text)]
+
+
+def _doc_key(doc):
+    return hashlib.sha1(f"{doc.metadata.get('source', '')}\x00{doc.page_content}".encode('utf-8')).hexdigest()
+
+
+def documents_by_id(vectorstore, chunk_ids):
+    """
+    Fetches chunks from the Chroma collection by id (no embedding, no similarity search).
+
+    Returns:
+        list: The documents in the order of `chunk_ids`, skipping ids the collection does not have.
+    """
+    if not chunk_ids:
+        return []
+    from langchain_core.documents import Document
+    result = vectorstore.get(ids=list(chunk_ids))
+    found = {chunk_id: Document(page_content=text, metadata=metadata or {})
+             for chunk_id, text, metadata in zip(result['ids'], result['documents'], result['metadatas'])}
+    return [found[chunk_id] for chunk_id in chunk_ids if chunk_id in found]
+
+
+class BM25Index:
+    """
+    BM25 (Okapi) index persisted as JSON.  Each chunk stores its term
+    frequencies and length; the postings are rebuilt from the term frequencies
+    on first search, so adding or removing the chunks of one file never needs a
+    re-tokenize of the whole corpus.
+    """
+
+    def __init__(self, path, k1=1.5, b=0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.chunks = {}
+        # (postings, average length), published in one assignment once built
+        self._index = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                chunks = json.load(file).get('chunks', {})
+            # Indexes written before the texts moved out still carry them
+            self.chunks = {chunk_id: {'tf': chunk['tf'], 'length': chunk['length']}
+                           for chunk_id, chunk in chunks.items()}
+
+    def add(self, chunk_id, doc):
+        source = doc.metadata.get('source', '')
+        terms = tokenize(doc.page_content)
+        for technique_id in technique_ids(source):
+            terms.extend([technique_id.lower()] * ID_FIELD_BOOST)
+        self.chunks[chunk_id] = {'tf': Counter(terms), 'length': len(terms)}
+        self._index = None
+
+    def remove(self, chunk_ids):
+        for chunk_id in chunk_ids:
+            self.chunks.pop(chunk_id, None)
+        self._index = None
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({'chunks': self.chunks}, file)
+        os.replace(tmp_path, self.path)
+
+    def _build(self):
+        # Searches run on the query server's handler threads; build once, under
+        # the lock, and publish postings and average length together
+        with self._lock:
+            if self._index is None:
+                postings = defaultdict(list)
+                for chunk_id, chunk in self.chunks.items():
+                    for term, count in chunk['tf'].items():
+                        postings[term].append((chunk_id, count))
+                total = sum(chunk['length'] for chunk in self.chunks.values())
+                self._index = (dict(postings), total / len(self.chunks) if self.chunks else 0.0)
+            return self._index
+
+    def search(self, query, k=20):
+        """
+        Returns up to k (chunk_id, score) pairs, best first.
+        """
+        postings_by_term, avg_length = self._index or self._build()
+        if not self.chunks:
+            return []
+        scores = defaultdict(float)
+        n = len(self.chunks)
+        for term in set(tokenize(query)):
+            postings = postings_by_term.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for chunk_id, count in postings:
+                length = self.chunks[chunk_id]['length']
+                norm = count + self.k1 * (1 - self.b + self.b * length / (avg_length or 1))
+                scores[chunk_id] += idf * count * (self.k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings, k=60):
+    """
+    Fuses several rankings of documents: each document scores sum(1 / (k + rank)).
+
+    Returns:
+        list: The fused documents, best first.
+    """
+    scores = defaultdict(float)
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            key = _doc_key(doc)
+            scores[key] += 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+    return [docs[key] for key in sorted(scores, key=scores.get, reverse=True)]
+
+
+def is_id_lookup(query):
+    """
+    True when the query consists only of technique IDs (e.g. "T1040" or "T1059.001, T1040").
+    """
+    return bool(technique_ids(query)) and not TECHNIQUE_ID.sub("", query).strip(" ,;")
+
+
+class HybridRetriever:
+    """
+    Retriever combining the Chroma vector retriever with the BM25 index.
+    `retrieve` also reports which path served the query.  The texts of the BM25
+    hits are read from the vector retriever's collection.
+    """
+
+    def __init__(self, vector_retriever, bm25, k=20):
+        self.vector_retriever = vector_retriever
+        self.bm25 = bm25
+        self.k = k
+
+    def retrieve(self, query):
+        """
+        Returns:
+            tuple: (documents, path) where path is "bm25-id" or "hybrid".
+        """
+        hits = [chunk_id for chunk_id, _ in self.bm25.search(query, self.k)]
+        lexical = documents_by_id(self.vector_retriever.vectorstore, hits)
+        if lexical and is_id_lookup(query):
+            return lexical, "bm25-id"
+        vector = self.vector_retriever.invoke(query)
+        return reciprocal_rank_fusion([vector, lexical])[:self.k], "hybrid"
+
+    def invoke(self, query):
+        return self.retrieve(query)[0]
@@ -0,0 +1,151 @@
+# Context packing for the "stuff" QA chain in ragquery.py.  The retriever
+# over-fetches (k=20) and the chain would otherwise paste every document into
+# the prompt.  The packer sits in between and:
+#   - drops near-identical chunks (the atomics often repeat the same test text),
+#   - orders the rest with maximal marginal relevance (MMR), so the context
+#     covers different aspects of the question instead of one,
+#   - keeps adding chunks in that order until a token budget is filled
+#     (the top ranked chunk is always kept, truncated if it alone is over
+#     the budget, so the chain never answers without context),
+# and reports how many prompt tokens that saved.
+import re
+import math
+import hashlib
+
+DEFAULT_TOKEN_BUDGET = 6000
+DEFAULT_MMR_LAMBDA = 0.7
+NEAR_DUPLICATE_THRESHOLD = 0.9
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Counts tokens with tiktoken's cl100k_base encoding.  Gemini uses a different
+    tokenizer, so treat this as an estimate; falls back to ~4 characters per token.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return (len(text) + 3) // 4
+
+
+def truncate_to_tokens(text, token_budget):
+    """
+    Cuts text down to at most `token_budget` tokens (as count_tokens counts them).
+    """
+    if count_tokens(text) <= token_budget:
+        return text
+    if _encoding:
+        return _encoding.decode(_encoding.encode(text, disallowed_special=())[:token_budget])
+    return text[:token_budget * 4]
+
+
+def _shingles(text, size=5):
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= size:
+        return {" ".join(words)}
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def dedupe(docs, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """
+    Removes exact and near-identical chunks (word 5-gram Jaccard similarity at
+    or above `threshold`), keeping the first, i.e. best ranked, occurrence.
+    """
+    kept = []
+    seen_hashes = set()
+    kept_shingles = []
+    for doc in docs:
+        normalized = " ".join(doc.page_content.lower().split())
+        digest = hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        if digest in seen_hashes:
+            continue
+        shingles = _shingles(normalized)
+        if any(_jaccard(shingles, other) >= threshold for other in kept_shingles):
+            continue
+        seen_hashes.add(digest)
+        kept_shingles.append(shingles)
+        kept.append(doc)
+    return kept
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def mmr_order(query_vector, doc_vectors, lambda_mult=DEFAULT_MMR_LAMBDA):
+    """
+    Returns document indices in maximal marginal relevance order.
+    """
+    relevance = [_cosine(query_vector, vector) for vector in doc_vectors]
+    remaining = list(range(len(doc_vectors)))
+    selected = []
+    # Highest similarity to any already selected document, per remaining document
+    redundancy = [0.0] * len(doc_vectors)
+    while remaining:
+        best = max(remaining, key=lambda i: lambda_mult * relevance[i] - (1 - lambda_mult) * redundancy[i])
+        selected.append(best)
+        remaining.remove(best)
+        for i in remaining:
+            redundancy[i] = max(redundancy[i], _cosine(doc_vectors[best], doc_vectors[i]))
+    return selected
+
+
+def pack_context(docs, query, embedding_function=None, token_budget=DEFAULT_TOKEN_BUDGET,
+                 lambda_mult=DEFAULT_MMR_LAMBDA):
+    """
+    Dedupes, MMR-ranks and budget-fills the retrieved documents.
+
+    The document and query vectors come from `embedding_function`; with the
+    cached embedding client they are normally cache hits, since loaddb.py
+    embedded the same chunks and the retriever just embedded the query.
+    Without an embedding function the retriever's order is kept.
+
+    Returns:
+        tuple: (packed documents, stats dict with tokens_in, tokens_out, tokens_saved and documents in/out)
+    """
+    token_counts = [count_tokens(doc.page_content) for doc in docs]
+    tokens_in = sum(token_counts)
+    unique = dedupe(docs)
+
+    order = list(range(len(unique)))
+    if embedding_function is not None and len(unique) > 1:
+        doc_vectors = embedding_function.embed_documents([doc.page_content for doc in unique])
+        order = mmr_order(embedding_function.embed_query(query), doc_vectors, lambda_mult)
+
+    packed = []
+    tokens_out = 0
+    for index in order:
+        doc = unique[index]
+        tokens = count_tokens(doc.page_content)
+        if not packed and tokens > token_budget:
+            # Never return an empty context: keep the best chunk, cut to the budget
+            doc = type(doc)(page_content=truncate_to_tokens(doc.page_content, token_budget), metadata=doc.metadata)
+            tokens = count_tokens(doc.page_content)
+        # Skip chunks that do not fit, a smaller one further down may still fit
+        if tokens_out + tokens > token_budget:
+            continue
+        packed.append(doc)
+        tokens_out += tokens
+    return packed, {
+        'documents_in': len(docs),
+        'documents_out': len(packed),
+        'tokens_in': tokens_in,
+        'tokens_out': tokens_out,
+        'tokens_saved': tokens_in - tokens_out,
+    }
@@ -1,18 +1,26 @@
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from embedding_service import get_embedding_function
+from bm25_index import BM25Index, HybridRetriever
+from technique_lookup import TechniqueIdMap, lookup_documents
 import readline
 import re
 
 vectorstore = Chroma(
-    embedding_function=GoogleGenerativeAIEmbeddings(model="models/embedding-001", task_type="retrieval_query"),
+    embedding_function=get_embedding_function(task_type="retrieval_query"),
     collection_name="groups_collection",
     persist_directory="./.chromadb"
 )
+retriever = HybridRetriever(vectorstore.as_retriever(), BM25Index("./.chromadb/bm25.json"), k=4)
+id_map = TechniqueIdMap("./.chromadb/id_map.json")
 
 def search_db(query):
     print(f'[+] Test similarity search with query: {query}')
-    relevant_docs = vectorstore.similarity_search(query)
-    print(f"Search returned {len(relevant_docs)} documents")
+    # Queries naming a technique ID are resolved through the ID map, no embedding needed
+    relevant_docs = lookup_documents(id_map, vectorstore, query)
+    path = "id-map"
+    if not relevant_docs:
+        relevant_docs, path = retriever.retrieve(query)
+    print(f"Search returned {len(relevant_docs)} documents ({path})")
     for doc in relevant_docs:
         docpath = re.sub("^.*final","final",doc.metadata['source'])
         print(f"  {docpath}")
@@ -0,0 +1,185 @@
+# Shared embedding client for the red-team Chroma scripts (loaddb.py,
+# docsearch.py, ragquery.py).  It wraps a LangChain embeddings backend and:
+#   - keeps a persistent text-hash -> vector cache, so identical chunks and
+#     repeated queries are never embedded twice,
+#   - coalesces the texts that do need embedding into maximum-size batches and
+#     sends the batches concurrently, under a requests-per-minute limit,
+#   - can swap Gemini for a deterministic local backend (EMBEDDINGS_BACKEND=local)
+#     for offline tests and benchmarks.
+#
+# Configuration (environment variables):
+#   EMBEDDINGS_BACKEND          "google" (default) or "local"
+#   EMBEDDING_CACHE_PATH        SQLite file (default: red-team/.embedding_cache.db)
+#   EMBEDDING_BATCH_SIZE        texts per embedding request (default: 100)
+#   EMBEDDING_CONCURRENCY       concurrent embedding requests (default: 4)
+#   EMBEDDING_RPM               embedding requests per minute (default: 1500)
+import os
+import time
+import array
+import sqlite3
+import hashlib
+import threading
+import contextvars
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".embedding_cache.db")
+LOCAL_EMBEDDING_SIZE = 768
+# Per-call lookup counts for count_lookups; each thread / task has its own
+_call_stats = contextvars.ContextVar("embedding_call_stats", default=None)
+
+
+@contextmanager
+def count_lookups():
+    """
+    Counts the cache hits and misses of the embedding calls made inside the
+    block by this thread only, unlike CachedEmbeddings.stats(), which counts
+    every call of the process:
+
+        with count_lookups() as lookups:
+            retriever.invoke(query)
+        lookups["hits"] + lookups["misses"]
+    """
+    stats = {"hits": 0, "misses": 0}
+    token = _call_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _call_stats.reset(token)
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that no more than `requests_per_minute` start per minute.
+    """
+
+    def __init__(self, requests_per_minute):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute else 0.0
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper adding a persistent vector cache and batched, concurrent,
+    rate limited calls to the wrapped backend.
+    """
+
+    def __init__(self, backend, cache_path=DEFAULT_CACHE_PATH, batch_size=100, max_concurrency=4,
+                 requests_per_minute=1500):
+        self.backend = backend
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        # Vectors from different models or task types are not interchangeable
+        self.namespace = "{}:{}".format(
+            getattr(backend, 'model', type(backend).__name__),
+            getattr(backend, 'task_type', None) or getattr(backend, 'size', ''))
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS vectors (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self._connection.commit()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.namespace}\x00{text}".encode('utf-8')).hexdigest()
+
+    def _get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._connection.execute(
+                    f"SELECT key, vector FROM vectors WHERE key IN ({', '.join('?' * len(chunk))})", chunk)
+                for key, blob in rows:
+                    found[key] = array.array('f', blob).tolist()
+        return found
+
+    def _put_many(self, items):
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?)",
+                [(key, array.array('f', vector).tobytes()) for key, vector in items])
+            self._connection.commit()
+
+    def _embed_batch(self, texts):
+        self.rate_limiter.wait()
+        return self.backend.embed_documents(texts)
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        vectors = self._get_many(set(keys))
+
+        # Embed each distinct uncached text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        self._count(len(texts) - len(missing), len(missing))
+
+        if missing:
+            missing_keys = list(missing)
+            batches = [missing_keys[start:start + self.batch_size]
+                       for start in range(0, len(missing_keys), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+                results = executor.map(lambda batch: self._embed_batch([missing[key] for key in batch]), batches)
+                for batch, batch_vectors in zip(batches, results):
+                    items = list(zip(batch, batch_vectors))
+                    self._put_many(items)
+                    vectors.update(items)
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key(f"query\x00{text}")
+        cached = self._get_many([key])
+        if key in cached:
+            self._count(1, 0)
+            return cached[key]
+        self._count(0, 1)
+        self.rate_limiter.wait()
+        vector = self.backend.embed_query(text)
+        self._put_many([(key, vector)])
+        return vector
+
+    def _count(self, hits, misses):
+        self.hits += hits
+        self.misses += misses
+        stats = _call_stats.get()
+        if stats is not None:
+            stats["hits"] += hits
+            stats["misses"] += misses
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+def get_embedding_function(task_type="retrieval_query"):
+    """
+    Returns the shared embedding client configured from the environment.
+    """
+    if os.getenv("EMBEDDINGS_BACKEND", "google") == "local":
+        from langchain_core.embeddings import DeterministicFakeEmbedding
+        backend = DeterministicFakeEmbedding(size=LOCAL_EMBEDDING_SIZE)
+    else:
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
+        backend = GoogleGenerativeAIEmbeddings(model="models/embedding-001", task_type=task_type)
+    return CachedEmbeddings(
+        backend,
+        cache_path=os.getenv("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_PATH),
+        batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", 100)),
+        max_concurrency=int(os.getenv("EMBEDDING_CONCURRENCY", 4)),
+        requests_per_minute=float(os.getenv("EMBEDDING_RPM", 1500)),
+    )
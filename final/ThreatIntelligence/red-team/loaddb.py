@@ -1,41 +1,209 @@
 # Derived from https://github.com/OTRF/GenAI-Security-Adventures
-# This script downloads the real-time Mitre ATT&CK information on a variety of
-# attack groups, formats them in Markdown files, then loads them into a vector
+# This script loads the Atomic Red Team markdown documents into a vector
 # database (ChromaDB).  This is subsequently used in a RAG chain to handle
 # queries through an LLM
+#
+# Ingestion is incremental: a manifest next to the Chroma collection records
+# the sha256 of every source file and the ids of the chunks it produced, so a
+# re-run only parses, splits and embeds files that were added or changed, and
+# deletes the chunks of files that were removed upstream.  A collection that
+# has chunks but no manifest (built by the original, non-incremental script)
+# is emptied before its first incremental run.  The same chunks are
+# kept in a BM25 index (bm25_index.py) next to the collection for hybrid
+# lexical + vector retrieval, and a technique ID -> chunk map
+# (technique_lookup.py) serves queries that name a technique directly.
 import os
 import re
 import glob
-from langchain_community.document_loaders import UnstructuredMarkdownLoader, JSONLoader
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from langchain_community.document_loaders import UnstructuredMarkdownLoader
+from bm25_index import BM25Index
+from technique_lookup import TechniqueIdMap, file_technique_ids
 
 current_directory = f"{os.path.dirname(__file__)}"
 documents_directory = f"{os.getenv('ATOMICS_PATH')}/atomics"
+persist_directory = f"{current_directory}/.chromadb"
+manifest_path = os.path.join(persist_directory, "manifest.json")
+bm25_path = os.path.join(persist_directory, "bm25.json")
+id_map_path = os.path.join(persist_directory, "id_map.json")
 
-group_files = glob.glob(os.path.join(documents_directory, "**/*.md"), recursive=True)
-
-# Loading Markdown files
-md_docs = []
-print("[+] Loading Group markdown files..")
-for group in group_files:
-    print(f' [*] Loading {os.path.basename(group)}')
-    loader = UnstructuredMarkdownLoader(group)
-    md_docs.extend(loader.load_and_split())
-
-print(f'[+] Number of .md documents processed: {len(md_docs)}')
-
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain_community.vectorstores import Chroma
-# Define the embedding function
-embedding_function = GoogleGenerativeAIEmbeddings(model="models/embedding-001", task_type="retrieval_query")
-
-# Load documents into Chroma and save it to disk
-vectorstore = Chroma.from_documents(md_docs, embedding_function, collection_name="groups_collection", persist_directory=f"{current_directory}/.chromadb")
-retriever = vectorstore.as_retriever()
-
-print("RAG database initialized.")
-document_data_sources = set()
-for doc_metadata in retriever.vectorstore.get()['metadatas']:
-    document_data_sources.add(doc_metadata['source']) 
-for doc in document_data_sources:
-    docpath = re.sub("^.*final","final",doc)
-    print(f"  {docpath}")
+
+def file_hash(path):
+    with open(path, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def load_markdown(path):
+    """
+    Parses and splits one markdown file and reads the technique IDs it
+    documents.  Runs in a worker process.
+    """
+    loader = UnstructuredMarkdownLoader(path)
+    return path, loader.load_and_split(), file_technique_ids(path)
+
+
+def load_manifest():
+    try:
+        with open(manifest_path, 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_manifest(manifest):
+    os.makedirs(persist_directory, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def plan_changes(group_files, manifest, force=False):
+    """
+    Compares the files on disk with the manifest.  With force=True every file
+    is treated as changed.
+
+    Returns:
+        tuple: (hashes of every file on disk, files to (re)index, files to remove)
+    """
+    hashes = {path: file_hash(path) for path in group_files}
+    changed = [path for path, digest in hashes.items()
+               if force or manifest.get(path, {}).get('sha256') != digest]
+    removed = [path for path in manifest if path not in hashes]
+    return hashes, changed, removed
+
+
+def reset_unmanaged(vectorstore, bm25=None, id_map=None, batch_size=5000):
+    """
+    Deletes every chunk of a collection that has no manifest, i.e. one built
+    before ingestion was incremental, whose chunks have random ids that the
+    manifest could never track.
+
+    Returns:
+        int: The number of chunks deleted.
+    """
+    existing = vectorstore.get(include=[])['ids']
+    for start in range(0, len(existing), batch_size):
+        vectorstore.delete(ids=existing[start:start + batch_size])
+    if bm25 is not None:
+        bm25.remove(list(bm25.chunks))
+    if id_map is not None:
+        for source in list(id_map.sources):
+            id_map.remove_source(source)
+    return len(existing)
+
+
+def ingest(vectorstore, group_files, bm25=None, id_map=None, workers=None, flush_size=500):
+    """
+    Brings the vector store in line with `group_files`, embedding only new or
+    changed files and deleting the chunks of removed ones.  Chunks from several
+    files are buffered and added together (up to `flush_size` chunks), so the
+    embedding client can fill whole batches.  When given, the BM25 index and
+    the technique ID map are kept in step with the vector store.
+
+    Returns:
+        dict: The updated manifest.
+    """
+    manifest = load_manifest()
+    if not manifest:
+        # Without a manifest every file looks new; chunks already in the
+        # collection would stay next to their re-added copies
+        deleted = reset_unmanaged(vectorstore, bm25, id_map)
+        if deleted:
+            print(f"[+] Collection has {deleted} chunks but no manifest: reset it before a full ingest")
+    # An existing collection without a BM25 index or ID map (built before they
+    # existed) is re-indexed once; the embedding cache makes re-adding the chunks cheap
+    rebuild = bool(manifest) and ((bm25 is not None and not bm25.chunks) or
+                                  (id_map is not None and not id_map.sources))
+    hashes, changed, removed = plan_changes(group_files, manifest, force=rebuild)
+
+    def save_side_indexes():
+        if bm25 is not None:
+            bm25.save()
+        if id_map is not None:
+            id_map.save()
+    print(f"[+] {len(group_files)} files: {len(changed)} new or changed, {len(removed)} removed, "
+          f"{len(group_files) - len(changed)} unchanged")
+
+    for path in removed:
+        print(f' [-] Removing {os.path.basename(path)}')
+        ids = manifest.pop(path)['ids']
+        vectorstore.delete(ids=ids)
+        if bm25 is not None:
+            bm25.remove(ids)
+        if id_map is not None:
+            id_map.remove_source(path)
+    if removed:
+        save_manifest(manifest)
+        save_side_indexes()
+
+    chunk_count = 0
+    pending = []
+
+    def flush():
+        docs = [doc for _, doc_list, _, _ in pending for doc in doc_list]
+        ids = [chunk_id for _, _, id_list, _ in pending for chunk_id in id_list]
+        if docs:
+            vectorstore.add_documents(docs, ids=ids)
+            if bm25 is not None:
+                for chunk_id, doc in zip(ids, docs):
+                    bm25.add(chunk_id, doc)
+        for path, _, id_list, technique_ids in pending:
+            manifest[path] = {'sha256': hashes[path], 'ids': id_list}
+            if id_map is not None:
+                id_map.set_source(path, technique_ids, id_list)
+        pending.clear()
+        # Persist progress after every flush so an interrupted run resumes where it stopped
+        save_manifest(manifest)
+        save_side_indexes()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, docs, technique_ids in executor.map(load_markdown, changed, chunksize=8):
+            print(f' [*] Loading {os.path.basename(path)} ({len(docs)} chunks)')
+            digest = hashes[path]
+            previous = manifest.get(path)
+            if previous:
+                vectorstore.delete(ids=previous['ids'])
+                if bm25 is not None:
+                    bm25.remove(previous['ids'])
+            # Chunk ids include the path, so two files with identical content never collide
+            prefix = f"{hashlib.sha256(path.encode('utf-8')).hexdigest()[:12]}-{digest[:12]}"
+            pending.append((path, docs, [f"{prefix}-{index}" for index in range(len(docs))], technique_ids))
+            chunk_count += len(docs)
+            if sum(len(doc_list) for _, doc_list, _, _ in pending) >= flush_size:
+                flush()
+    flush()
+    print(f'[+] Number of .md chunks embedded: {chunk_count}')
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally load the Atomic Red Team documents into ChromaDB.")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: number of CPUs)")
+    args = parser.parse_args()
+
+    group_files = glob.glob(os.path.join(documents_directory, "**/*.md"), recursive=True)
+
+    from langchain_community.vectorstores import Chroma
+    from embedding_service import get_embedding_function
+    # Define the embedding function (batched, cached)
+    embedding_function = get_embedding_function(task_type="retrieval_query")
+
+    # Open the Chroma collection saved on disk and bring it up to date
+    vectorstore = Chroma(
+        embedding_function=embedding_function,
+        collection_name="groups_collection",
+        persist_directory=persist_directory
+    )
+    os.makedirs(persist_directory, exist_ok=True)
+    bm25 = BM25Index(bm25_path)
+    id_map = TechniqueIdMap(id_map_path)
+    manifest = ingest(vectorstore, group_files, bm25=bm25, id_map=id_map, workers=args.workers)
+
+    print("RAG database initialized.")
+    for doc in sorted(manifest):
+        docpath = re.sub("^.*final","final",doc)
+        print(f"  {docpath}")
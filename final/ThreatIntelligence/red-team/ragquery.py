@@ -1,28 +1,47 @@
 from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAI, GoogleGenerativeAIEmbeddings
 import chromadb
 import os
+import sys
+import json
+import time
+import socket
+import socketserver
+import argparse
 import readline
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
+from langchain_core.prompts import format_document
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from llm_cache import get_llm_cache
+from embedding_service import get_embedding_function, count_lookups
+from context_packer import DEFAULT_TOKEN_BUDGET, count_tokens, pack_context
+from bm25_index import BM25Index, HybridRetriever
+from technique_lookup import TechniqueIdMap, lookup_documents
 
 
-llm = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0, safety_settings={ HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,})  
+llm = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0, safety_settings={ HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,}, cache=get_llm_cache())
 
 # Define embedding function
-embedding_function = GoogleGenerativeAIEmbeddings(model="models/embedding-001", task_type="retrieval_query")
+embedding_function = get_embedding_function(task_type="retrieval_query")
 
 # Open vector database
 current_directory = f"{os.path.dirname(__file__)}"
 chroma_db = os.path.join(current_directory, f"{current_directory}/.chromadb")
 
+# Opening the collection is cheap: nothing is read until the first similarity search
 persistent_client = chromadb.PersistentClient(path=chroma_db)
 db = Chroma(
     client=persistent_client,
     collection_name="groups_collection",
     embedding_function=embedding_function,
 )
-db.get()
-retriever = db.as_retriever(search_kwargs={"k":20})
+# Vector results are fused with the BM25 index loaddb.py keeps next to the collection.
+# It holds term frequencies only (the texts are read from Chroma by id); postings
+# are built on the first query
+bm25 = BM25Index(os.path.join(chroma_db, "bm25.json"))
+retriever = HybridRetriever(db.as_retriever(search_kwargs={"k":20}), bm25, k=20)
+# Technique ID -> chunk map, also built by loaddb.py
+id_map = TechniqueIdMap(os.path.join(chroma_db, "id_map.json"))
 
 # Instantiate LLM and QA chain
 from langchain.chains.question_answering import load_qa_chain
@@ -30,21 +49,234 @@ from langchain.chains.question_answering import load_qa_chain
 #llm = GoogleGenerativeAI(model="gemini-pro")
 chain = load_qa_chain(llm, chain_type="stuff")
 
+def build_prompt(chain, docs, query):
+    """
+    Builds the prompt the "stuff" QA chain would send: the documents formatted
+    with the chain's document prompt, joined and placed in its QA prompt.
+    """
+    context = chain.document_separator.join(format_document(doc, chain.document_prompt) for doc in docs)
+    return chain.llm_chain.prompt.format_prompt(**{chain.document_variable_name: context, 'question': query})
+
+def retrieve_documents(retriever, query):
+    """
+    Queries naming a known ATT&CK technique ID are served from the ID map
+    without embedding the query; everything else goes through the retriever.
+
+    Returns:
+        tuple: (documents, path) where path is "id-map", "bm25-id" or "hybrid".
+    """
+    docs = lookup_documents(id_map, db, query)
+    if docs:
+        return docs, "id-map"
+    return retriever.retrieve(query)
+
+def answer_query(retriever, chain, query, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Answers a query and reports how long each stage took.  Retrieved documents
+    are deduped, MMR-ranked and packed into `token_budget` prompt tokens before
+    they reach the chain; pass token_budget=None to stuff all of them.  Results
+    of the id-map and bm25-id paths keep their lookup order, since MMR ranking
+    would embed the query those paths exist to avoid embedding.
+
+    Returns:
+        dict: The answer, the retrieval path, packing stats, prompt size, the
+              number of embedding client lookups and per-stage timings in
+              milliseconds (retrieve, pack, prompt_build, llm, total).
+    """
+    timings = {}
+    start = time.perf_counter()
+    # Counted for this request only; the server answers several at once
+    with count_lookups() as lookups:
+        relevant_docs, retrieval_path = retrieve_documents(retriever, query)
+        timings['retrieve'] = time.perf_counter()
+
+        if token_budget:
+            ranking = embedding_function if retrieval_path == "hybrid" else None
+            relevant_docs, packing = pack_context(relevant_docs, query, ranking, token_budget)
+        else:
+            packing = None
+        timings['pack'] = time.perf_counter()
+    embedding_lookups = lookups["hits"] + lookups["misses"]
+
+    prompt = build_prompt(chain, relevant_docs, query)
+    timings['prompt_build'] = time.perf_counter()
+
+    answer = chain.llm_chain.llm.invoke(prompt)
+    timings['llm'] = time.perf_counter()
+
+    previous = start
+    for stage, finished in timings.items():
+        timings[stage] = round((finished - previous) * 1000, 1)
+        previous = finished
+    timings['total'] = round((previous - start) * 1000, 1)
+    return {
+        'answer': answer,
+        'retrieval_path': retrieval_path,
+        'documents': len(relevant_docs),
+        'packing': packing,
+        'prompt_tokens': count_tokens(prompt.to_string()),
+        'embedding_lookups': embedding_lookups,
+        'timings_ms': timings,
+    }
+
 def perform_query(retriever, chain, query):
-    relevant_docs = retriever.invoke(query)
-    results = chain.invoke({'input_documents':relevant_docs, 'question':query})
-    return(results['output_text'])
+    return answer_query(retriever, chain, query)['answer']
 
-print("Welcome to my Mitre ATT&CK Q&A application.  Type a query and I'll answer it based on the latest data. Example:\n List the commands used T1040 - Network Sniffing and explain all the platforms that I can run the command in. ")
-while True:
-    line = input("llm>> ")
-    try:
-        if line:
-            print(perform_query(retriever, chain, line))
+# Fixed query set for --benchmark
+BENCHMARK_QUERIES = [
+    "List the commands used T1040 - Network Sniffing and explain all the platforms that I can run the command in.",
+    "What threat actors sent phishing messages to their targets?",
+    "What are some phishing techniques used by threat actors?",
+    "How can I test credential dumping from LSASS?",
+    "Which atomic tests use PowerShell to download a payload?",
+    "What techniques does APT 28 utilize?",
+]
+
+def benchmark(retriever, chain, queries, token_budget=DEFAULT_TOKEN_BUDGET):
+    """
+    Runs every query with all retrieved documents stuffed and with packing,
+    and prints prompt size and end-to-end latency side by side.  Fails if a
+    query served from the ID map or BM25 alone used the embedding client.
+    """
+    rows = []
+    for query in queries:
+        full = answer_query(retriever, chain, query, token_budget=None)
+        packed = answer_query(retriever, chain, query, token_budget=token_budget)
+        for result in (full, packed):
+            if result['retrieval_path'] != "hybrid" and result['embedding_lookups']:
+                raise AssertionError(f"{query[:60]!r} was served via {result['retrieval_path']} "
+                                     f"but made {result['embedding_lookups']} embedding lookups")
+        rows.append((full, packed))
+        print(f"{query[:60]:<60} prompt {full['prompt_tokens']:>6} -> {packed['prompt_tokens']:>6} tokens, "
+              f"latency {full['timings_ms']['total']:>8} -> {packed['timings_ms']['total']:>8} ms")
+    full_tokens = sum(full['prompt_tokens'] for full, _ in rows)
+    packed_tokens = sum(packed['prompt_tokens'] for _, packed in rows)
+    full_ms = sum(full['timings_ms']['total'] for full, _ in rows)
+    packed_ms = sum(packed['timings_ms']['total'] for _, packed in rows)
+    print(f"Total prompt tokens {full_tokens} -> {packed_tokens} "
+          f"({1 - packed_tokens / max(full_tokens, 1):.0%} smaller), "
+          f"mean latency {full_ms / len(rows):.0f} -> {packed_ms / len(rows):.0f} ms")
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    POST /query with {"query": "..."} returns {"answer": ..., "documents": ..., "timings_ms": {...}}.
+    GET /health returns {"status": "ok"}.
+    """
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
         else:
-            break
-    except:
-        print()
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path != "/query":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            query = json.loads(self.rfile.read(length) or b"{}").get("query", "").strip()
+        except (ValueError, AttributeError):
+            self._send_json(400, {"error": "expected a JSON body like {\"query\": \"...\"}"})
+            return
+        if not query:
+            self._send_json(400, {"error": "missing query"})
+            return
+        try:
+            result = answer_query(retriever, chain, query, token_budget=self.server.token_budget)
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, result)
+
+    def address_string(self):
+        # Unix socket clients have no (host, port) address
+        return self.client_address[0] or "unix"
+
+
+class ThreadingUnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+        # HTTPServer.server_bind expects a (host, port) address, so bind like a plain socket server
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = self.server_address
+        self.server_port = 0
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("",)
+
+
+def serve(host, port, unix_socket=None, token_budget=DEFAULT_TOKEN_BUDGET):
+    if unix_socket:
+        server = ThreadingUnixHTTPServer(unix_socket, QueryHandler)
+        print(f"Serving Mitre ATT&CK Q&A on unix socket {unix_socket}")
+    else:
+        server = ThreadingHTTPServer((host, port), QueryHandler)
+        print(f"Serving Mitre ATT&CK Q&A on http://{host}:{port}/query")
+    server.token_budget = token_budget
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mitre ATT&CK Q&A over the Atomic Red Team RAG database.")
+    parser.add_argument("--serve", action="store_true", help="Run as a long-lived HTTP query server")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on (default: 8765)")
+    parser.add_argument("--socket", help="Listen on this unix socket instead of TCP")
+    parser.add_argument("--timings", action="store_true", help="Print per-stage timings in the interactive mode")
+    parser.add_argument("--token-budget", type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help=f"Prompt tokens to fill with retrieved context, 0 to stuff everything (default: {DEFAULT_TOKEN_BUDGET})")
+    parser.add_argument("--benchmark", nargs="?", const="", metavar="QUERY_FILE",
+                        help="Compare prompt size and latency with and without packing over a fixed query set "
+                             "(one query per line; run with LLM_CACHE=0 for honest latencies)")
+    args = parser.parse_args()
+
+    if args.benchmark is not None:
+        queries = BENCHMARK_QUERIES
+        if args.benchmark:
+            with open(args.benchmark, 'r') as file:
+                queries = [line.strip() for line in file if line.strip()]
+        benchmark(retriever, chain, queries, args.token_budget or DEFAULT_TOKEN_BUDGET)
+        sys.exit(0)
+
+    if args.serve:
+        serve(args.host, args.port, args.socket, args.token_budget)
+        sys.exit(0)
+
+    print("Welcome to my Mitre ATT&CK Q&A application.  Type a query and I'll answer it based on the latest data. Example:\n List the commands used T1040 - Network Sniffing and explain all the platforms that I can run the command in. ")
+    while True:
+        line = input("llm>> ")
+        try:
+            if line:
+                result = answer_query(retriever, chain, line, token_budget=args.token_budget)
+                print(result['answer'])
+                if result['packing']:
+                    print(f"[context] {result['packing']['documents_out']}/{result['packing']['documents_in']} documents, "
+                          f"{result['packing']['tokens_saved']} tokens saved")
+                if args.timings:
+                    print(f"[timings ms] {result['timings_ms']} via {result['retrieval_path']}")
+            else:
+                break
+        except:
+            print()
 
 # Perform query by retrieving context and invoking chain
 # line = """What threat actors sent phishing messages to their targets?"""
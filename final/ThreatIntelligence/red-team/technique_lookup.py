@@ -0,0 +1,122 @@
+# Direct technique-ID lookup for ragquery.py and docsearch.py.  loaddb.py
+# records which ATT&CK technique IDs every atomic file documents (from its
+# path, atomics/T1040/T1040.md, and its front-matter / title heading) together
+# with the ids of the chunks it produced.  A query that names a known technique
+# ID is then answered straight from that map, without embedding the query or
+# running a similarity search.
+import os
+import json
+import threading
+from bm25_index import TECHNIQUE_ID, documents_by_id
+
+# How far into a file to look for front-matter and the title heading
+HEADER_BYTES = 2048
+
+
+def ids_in_text(text):
+    seen = []
+    for match in TECHNIQUE_ID.findall(text):
+        technique_id = match.upper()
+        if technique_id not in seen:
+            seen.append(technique_id)
+    return seen
+
+
+def file_technique_ids(path):
+    """
+    Returns the technique IDs an atomic markdown file documents: IDs in its
+    path, plus IDs in its YAML front-matter or first heading
+    (e.g. "# T1040 - Network Sniffing" or "attack_technique: T1040").
+    """
+    technique_ids = ids_in_text(os.path.relpath(path, os.path.dirname(os.path.dirname(path))))
+    with open(path, 'r', encoding='utf-8', errors='ignore') as file:
+        header = file.read(HEADER_BYTES)
+    lines = header.splitlines()
+    if lines and lines[0].strip() == '---':
+        # YAML front-matter: everything up to the closing ---
+        for line in lines[1:]:
+            if line.strip() == '---':
+                break
+            technique_ids += [i for i in ids_in_text(line) if i not in technique_ids]
+    for line in lines:
+        if line.startswith('#'):
+            technique_ids += [i for i in ids_in_text(line) if i not in technique_ids]
+            break
+    return technique_ids
+
+
+class TechniqueIdMap:
+    """
+    Technique ID -> chunk id map, persisted as JSON per source file so that
+    loaddb.py can update it incrementally.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        self._by_id = None
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.sources = json.load(file).get('sources', {})
+
+    def set_source(self, source, technique_ids, chunk_ids):
+        self.sources[source] = {'techniques': technique_ids, 'ids': chunk_ids}
+        self._by_id = None
+
+    def remove_source(self, source):
+        self.sources.pop(source, None)
+        self._by_id = None
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({'sources': self.sources}, file)
+        os.replace(tmp_path, self.path)
+
+    def _index(self):
+        # Called from the query server's handler threads: build once, under the
+        # lock, and publish the finished map
+        by_id = self._by_id
+        if by_id is not None:
+            return by_id
+        with self._lock:
+            if self._by_id is None:
+                by_id = {}
+                for entry in self.sources.values():
+                    for technique_id in entry['techniques']:
+                        by_id.setdefault(technique_id, []).extend(entry['ids'])
+                self._by_id = by_id
+            return self._by_id
+
+    def chunk_ids(self, technique_id):
+        """
+        Chunk ids for a technique; a parent technique without its own file
+        (T1059) resolves to its sub-techniques (T1059.001, ...).
+        """
+        by_id = self._index()
+        if technique_id in by_id:
+            return by_id[technique_id]
+        prefix = f"{technique_id}."
+        return [chunk_id for known, ids in sorted(by_id.items()) if known.startswith(prefix) for chunk_id in ids]
+
+    def resolve(self, query):
+        """
+        Returns the chunk ids for every technique ID named in the query, or an
+        empty list when the query names none that are known.
+        """
+        chunk_ids = []
+        for technique_id in ids_in_text(query):
+            chunk_ids += [chunk_id for chunk_id in self.chunk_ids(technique_id) if chunk_id not in chunk_ids]
+        return chunk_ids
+
+
+def lookup_documents(id_map, vectorstore, query):
+    """
+    Fetches the chunks of the technique IDs named in the query straight from
+    the Chroma collection by id (no embedding, no similarity search).
+
+    Returns:
+        list: The documents in file order, or an empty list when the fast path does not apply.
+    """
+    return documents_by_id(vectorstore, id_map.resolve(query))
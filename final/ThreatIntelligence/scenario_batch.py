@@ -0,0 +1,218 @@
+# Batch mode for threat_scenario.py: generates incident response scenarios for
+# every combination in a selection matrix (industry x company size x threat
+# group x template) concurrently, reusing one LLM client, and streams each
+# result to a JSONL file as soon as it completes.
+import os
+import csv
+import sys
+import json
+import time
+import asyncio
+import argparse
+import itertools
+from threat_scenario import incident_response_templates, build_scenario_messages, get_llm
+
+# Template value meaning "use the techniques the threat group is known to use"
+GROUP_TECHNIQUES = "Group Techniques"
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+def _split_techniques(value):
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [technique.strip() for technique in value.split(';') if technique.strip()]
+
+
+def load_selection_matrix(matrix_path):
+    """
+    Reads a selection matrix and returns one row per scenario to generate.
+
+    YAML files either list the dimensions to combine:
+        industries: [Finance / Banking, Healthcare]
+        company_sizes: [51-200 employees]
+        threat_groups: [APT28, FIN7]
+        templates: [Phishing Attack, Ransomware Attack]
+    or give the rows explicitly under a "scenarios" key.  CSV files have one
+    row per scenario with the columns industry, company_size, threat_group,
+    template and an optional semicolon separated techniques column.
+
+    Returns:
+        list of dict: Rows with the keys industry, company_size, threat_group, template and techniques.
+    """
+    if matrix_path.endswith(('.yaml', '.yml')):
+        import yaml
+        with open(matrix_path, 'r') as file:
+            data = yaml.safe_load(file) or {}
+        if 'scenarios' in data:
+            rows = data['scenarios']
+        else:
+            rows = [{
+                'industry': industry,
+                'company_size': company_size,
+                'threat_group': threat_group,
+                'template': template,
+            } for industry, company_size, threat_group, template in itertools.product(
+                _as_list(data.get('industries')),
+                _as_list(data.get('company_sizes')),
+                _as_list(data.get('threat_groups')),
+                _as_list(data.get('templates')) or [GROUP_TECHNIQUES],
+            )]
+    elif matrix_path.endswith('.csv'):
+        with open(matrix_path, 'r', newline='') as file:
+            rows = list(csv.DictReader(file))
+    else:
+        raise ValueError(f"Unsupported selection matrix format: {matrix_path} (expected .yaml, .yml or .csv)")
+
+    matrix = []
+    for row in rows:
+        missing = [key for key in ('industry', 'company_size', 'threat_group') if not row.get(key)]
+        if missing:
+            raise ValueError(f"Selection matrix row {row} is missing {', '.join(missing)}")
+        matrix.append({
+            'industry': row['industry'],
+            'company_size': row['company_size'],
+            'threat_group': row['threat_group'],
+            'template': row.get('template') or GROUP_TECHNIQUES,
+            'techniques': _split_techniques(row.get('techniques')),
+        })
+    return matrix
+
+
+def resolve_selections(row, attack_index=None):
+    """
+    Turns a matrix row into the selections dictionary generate_scenario_google expects.
+    """
+    template = row['template']
+    techniques = row['techniques']
+    if not techniques:
+        if template in incident_response_templates:
+            techniques = incident_response_templates[template]
+        elif template == GROUP_TECHNIQUES and attack_index is not None:
+            techniques = attack_index.group_techniques(row['threat_group'])
+        else:
+            raise ValueError(f"Unknown template '{template}' and no techniques given for {row['threat_group']}")
+    return {
+        "industry": row['industry'],
+        "company_size": row['company_size'],
+        "threat_group": row['threat_group'],
+        "techniques": techniques,
+        "template": template if template in incident_response_templates else None
+    }
+
+
+async def _generate(index, row, llm, semaphore, attack_index, max_retries, retry_delay):
+    record = {'index': index, **{key: row[key] for key in ('industry', 'company_size', 'threat_group', 'template')}}
+    attempts = 0
+    async with semaphore:
+        # Latency is measured from when the item gets a slot, not while it queues
+        start = time.perf_counter()
+        try:
+            selections = resolve_selections(row, attack_index)
+            record['techniques'] = selections['techniques']
+            messages = build_scenario_messages(selections)
+        except Exception as e:
+            record.update(status='error', attempts=0, latency_s=0.0, error=str(e))
+            return record
+
+        while True:
+            attempts += 1
+            try:
+                scenario = await llm.ainvoke(messages)
+                record.update(status='ok', scenario=scenario)
+                break
+            except Exception as e:
+                if attempts > max_retries:
+                    record.update(status='error', error=str(e))
+                    break
+                # Exponential backoff before retrying the same prompt
+                await asyncio.sleep(retry_delay * 2 ** (attempts - 1))
+        record['attempts'] = attempts
+        record['retried'] = attempts > 1
+        record['latency_s'] = round(time.perf_counter() - start, 3)
+    return record
+
+
+async def run_batch(matrix, output_file, llm=None, concurrency=8, attack_index=None, max_retries=2, retry_delay=2.0):
+    """
+    Generates a scenario for every matrix row with at most `concurrency` LLM
+    calls in flight, writing each result to `output_file` as one JSON line as
+    soon as it is ready (results are therefore not in matrix order; use "index").
+
+    Args:
+        matrix: Rows returned by load_selection_matrix.
+        output_file: Open text file the JSONL records are written to.
+        llm: LLM to use (default: the shared client from threat_scenario.get_llm).
+        concurrency: Maximum number of concurrent LLM calls.
+        attack_index: Optional AttackIndex used to resolve "Group Techniques" rows.
+        max_retries: How many times a failed call is retried.
+        retry_delay: Initial retry delay in seconds, doubled on every retry.
+
+    Returns:
+        dict: Counts of successful and failed generations and the total wall time.
+    """
+    llm = llm or get_llm()
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    summary = {'ok': 0, 'error': 0}
+    tasks = [_generate(index, row, llm, semaphore, attack_index, max_retries, retry_delay)
+             for index, row in enumerate(matrix)]
+    for task in asyncio.as_completed(tasks):
+        record = await task
+        summary[record['status']] += 1
+        output_file.write(json.dumps(record) + "\n")
+        output_file.flush()
+        print(f" [*] {record['index']}: {record['threat_group']} / {record['industry']} / {record['company_size']} "
+              f"/ {record['template']} -> {record['status']} in {record['latency_s']}s ({record['attempts']} attempt(s))")
+    summary['elapsed_s'] = round(time.perf_counter() - start, 3)
+    return summary
+
+
+def fake_llm(delay=0.0):
+    """
+    Local stand-in for Gemini that answers every prompt with a fixed Markdown
+    scenario, so batches can be exercised and benchmarked offline.
+    """
+    from langchain_core.language_models import FakeListLLM
+
+    class DelayedFakeListLLM(FakeListLLM):
+        async def _acall(self, *args, **kwargs):
+            await asyncio.sleep(delay)
+            return await super()._acall(*args, **kwargs)
+
+    return DelayedFakeListLLM(responses=["## Incident Response Testing Scenario\n\nFake scenario for offline runs."])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate incident response scenarios for a whole selection matrix.")
+    parser.add_argument("matrix", help="Selection matrix (.yaml/.yml or .csv)")
+    parser.add_argument("-o", "--output", default="scenarios.jsonl", help="JSONL file to write results to")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="Maximum concurrent LLM calls")
+    parser.add_argument("--retries", type=int, default=2, help="Retries per failed generation")
+    parser.add_argument("--attack-json", default="./enterprise-attack.json",
+                        help=f"ATT&CK bundle used to resolve '{GROUP_TECHNIQUES}' rows")
+    parser.add_argument("--fake-llm", action="store_true", help="Use a local fake LLM instead of Gemini")
+    parser.add_argument("--fake-delay", type=float, default=0.5, help="Simulated latency of the fake LLM in seconds")
+    args = parser.parse_args()
+
+    matrix = load_selection_matrix(args.matrix)
+    attack_index = None
+    if os.path.exists(args.attack_json):
+        from attack_index import open_attack_index
+        attack_index = open_attack_index(args.attack_json)
+
+    llm = fake_llm(args.fake_delay) if args.fake_llm else None
+    print(f"[+] Generating {len(matrix)} scenarios with concurrency {args.concurrency}")
+    with open(args.output, 'w') as output_file:
+        summary = asyncio.run(run_batch(matrix, output_file, llm=llm, concurrency=args.concurrency,
+                                        attack_index=attack_index, max_retries=args.retries))
+    print(f"[+] {summary['ok']} succeeded, {summary['error']} failed in {summary['elapsed_s']}s. Results in {args.output}")
+    sys.exit(1 if summary['error'] else 0)
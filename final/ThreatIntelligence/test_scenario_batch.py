@@ -0,0 +1,68 @@
+import io
+import json
+import asyncio
+import scenario_batch
+
+MATRIX = [
+    {'industry': 'Finance / Banking', 'company_size': '51-200 employees', 'threat_group': 'APT28',
+     'template': 'Phishing Attack', 'techniques': []},
+    {'industry': 'Healthcare', 'company_size': '1-50 employees', 'threat_group': 'FIN7',
+     'template': 'Custom', 'techniques': ['T1566 - Phishing', 'T1059 - Command and Scripting Interpreter']},
+]
+
+
+class FlakyLLM:
+    """
+    Wraps fake_llm: fails the first call for the FIN7 row and records how many
+    calls are in flight at once.
+    """
+
+    def __init__(self, delay=0.05):
+        self.llm = scenario_batch.fake_llm(delay)
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failed = False
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if not self.failed and 'FIN7' in str(messages):
+                self.failed = True
+                await asyncio.sleep(0)
+                raise RuntimeError("429 Resource exhausted")
+            return await self.llm.ainvoke(messages)
+        finally:
+            self.in_flight -= 1
+
+
+def test_run_batch_writes_a_record_per_row_with_retries():
+    llm = FlakyLLM()
+    output = io.StringIO()
+    summary = asyncio.run(scenario_batch.run_batch(MATRIX, output, llm=llm, concurrency=1, retry_delay=0.01))
+
+    records = sorted((json.loads(line) for line in output.getvalue().splitlines()), key=lambda r: r['index'])
+    assert summary['ok'] == 2 and summary['error'] == 0
+    assert [record['threat_group'] for record in records] == ['APT28', 'FIN7']
+    assert all(record['status'] == 'ok' and 'Incident Response' in record['scenario'] for record in records)
+    assert records[0]['techniques'] == scenario_batch.incident_response_templates['Phishing Attack']
+    assert (records[0]['attempts'], records[0]['retried']) == (1, False)
+    assert (records[1]['attempts'], records[1]['retried']) == (2, True)
+    assert llm.calls == 3
+    assert llm.max_in_flight == 1
+
+
+def test_run_batch_gives_up_after_max_retries():
+    class FailingLLM:
+        async def ainvoke(self, messages):
+            raise RuntimeError("503 Service unavailable")
+
+    output = io.StringIO()
+    summary = asyncio.run(scenario_batch.run_batch(MATRIX[:1], output, llm=FailingLLM(), max_retries=2,
+                                                   retry_delay=0.001))
+    record = json.loads(output.getvalue())
+    assert summary['error'] == 1
+    assert (record['status'], record['attempts'], record['retried']) == ('error', 3, True)
+    assert '503' in record['error']
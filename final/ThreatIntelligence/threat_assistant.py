@@ -1,8 +1,12 @@
+import os
+import sys
 from threat_test_operator import atomic_operator
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
 from langchain.prompts.chat import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_cache import get_llm_cache
 
-llm = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0, safety_settings={ HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,})  
+llm = GoogleGenerativeAI(model="gemini-1.5-pro-latest", temperature=0, safety_settings={ HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,}, cache=get_llm_cache())  
 
 def generate_summarised_context():
     try:
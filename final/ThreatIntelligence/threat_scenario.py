@@ -1,9 +1,12 @@
 import os
+import sys
 import json
+import time
 import argparse
-from langchain_google_genai import ChatGoogleGenerativeAI, GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
-from langchain.prompts.chat import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
-from mitreattack.stix20 import MitreAttackData
+from attack_index import open_attack_index
+# langchain and the Gemini client are imported in get_llm / build_scenario_messages,
+# so menus, --help and index builds start without them
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
 # Predefined incident response templates
 incident_response_templates = {
@@ -13,9 +16,13 @@ incident_response_templates = {
     "Insider Threat": ["Valid Accounts (T1078)", "Account Manipulation (T1098)", "Exploitation for Privilege Escalation (T1068)", "Data Staged (T1074)", "Scheduled Transfer (T1029)", "Account Access Removal (T1531)"],
 }
 
-# Helper function to load threat groups from a JSON file
-def load_threat_groups(json_file_path):
+# Helper function to load threat groups from the ATT&CK index, or from a JSON file
+def load_threat_groups(json_file_path, attack_index=None):
     try:
+        if attack_index is not None:
+            threat_groups = attack_index.group_names()
+            if threat_groups:
+                return threat_groups
         with open(json_file_path, 'r') as file:
             data = json.load(file)
             if not isinstance(data, list):
@@ -50,21 +57,10 @@ def load_threat_groups(json_file_path):
 #         print(f"An unexpected error occurred: {str(e)}")
 #         return None
 
-# Function to load techniques from MITRE ATT&CK data
+# Function to load techniques from the compiled MITRE ATT&CK index
 def load_techniques(attack_data):
     try:
-        techniques = attack_data.get_techniques()
-        techniques_list = []
-        for technique in techniques:
-            for reference in technique.external_references:
-                if "external_id" in reference:
-                    techniques_list.append({
-                        'id': technique.id,
-                        'Technique Name': technique.name,
-                        'External ID': reference['external_id'],
-                        'Display Name': f"{technique.name} ({reference['external_id']})"
-                    })
-        return techniques_list
+        return attack_data.techniques()
     except Exception as e:
         print(f"Error in load_techniques: {e}")
         return []  # Return an empty list instead of an empty DataFrame
@@ -94,8 +90,8 @@ def get_user_selections(threat_groups_file, attack_data):
         '5001-10,000 employees', '10,001+ employees'
     ]
 
-    # Load threat groups from the JSON file
-    threat_groups = load_threat_groups(threat_groups_file)
+    # Load threat groups from the ATT&CK index (falls back to the JSON file)
+    threat_groups = load_threat_groups(threat_groups_file, attack_data)
 
     def prompt_selection(options, prompt_message):
         print(prompt_message)
@@ -127,11 +123,6 @@ def get_user_selections(threat_groups_file, attack_data):
     threat_group_prompt = "Please select a threat group with associated Enterprise ATT&CK techniques from the list below:"
     selected_threat_group = prompt_selection(threat_groups, threat_group_prompt)
 
-    # Load techniques from the attack data
-    techniques_list = load_techniques(attack_data)
-
-    techniques_options = [tech['Display Name'] for tech in techniques_list]
-
     # Get the user's choice of template or manual selection
     template_prompt = "Select an incident response template or choose 'Manual Selection' to select techniques yourself:"
     template_options = ["Manual Selection"] + list(incident_response_templates.keys())
@@ -141,6 +132,10 @@ def get_user_selections(threat_groups_file, attack_data):
     if selected_template != "Manual Selection":
         selected_techniques = incident_response_templates[selected_template]
     else:
+        # Techniques are only read from the index when they are actually needed
+        techniques_list = load_techniques(attack_data)
+        techniques_options = [tech['Display Name'] for tech in techniques_list]
+
         # Get the user's ATT&CK techniques selection
         print("Select ATT&CK techniques for the scenario (you can choose multiple, separated by commas):")
         for idx, option in enumerate(techniques_options, start=1):
@@ -177,33 +172,43 @@ def get_user_selections(threat_groups_file, attack_data):
 
     return selections
 
-# Function to generate a scenario using Google Generative AI
-def generate_scenario_google(selections):
-    try:
-        # Initialize the Google Generative AI model
-        llm = GoogleGenerativeAI(
+# Shared Google Generative AI client, created on first use and reused for every scenario
+_llm = None
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
+        from llm_cache import get_llm_cache
+        _llm = GoogleGenerativeAI(
             model="gemini-1.5-pro-latest",
             temperature=0,
             safety_settings={
                 HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-            }
+            },
+            cache=get_llm_cache()
         )
-
-        # Construct the prompt using selections
-        industry = selections["industry"]
-        company_size = selections["company_size"]
-        threat_group = selections["threat_group"]
-        techniques = selections["techniques"]
-        template_info = f"This is a '{selections['template']}' scenario." if selections["template"] else ""
-
-        selected_techniques_string = '\n'.join(techniques)
-        
-        # System Message Template
-        system_template = "You are a cybersecurity expert. Your task is to produce a comprehensive incident response testing scenario based on the information provided."
-        system_message_prompt = SystemMessagePromptTemplate.from_template(system_template)
-
-        # Human Message Template
-        human_template = f"""
+    return _llm
+
+# Function to build the scenario prompt messages from the user's selections
+def build_scenario_messages(selections):
+    from langchain.prompts.chat import ChatPromptTemplate, HumanMessagePromptTemplate, SystemMessagePromptTemplate
+
+    # Construct the prompt using selections
+    industry = selections["industry"]
+    company_size = selections["company_size"]
+    threat_group = selections["threat_group"]
+    techniques = selections["techniques"]
+    template_info = f"This is a '{selections['template']}' scenario." if selections["template"] else ""
+
+    selected_techniques_string = '\n'.join(techniques)
+    
+    # System Message Template
+    system_template = "You are a cybersecurity expert. Your task is to produce a comprehensive incident response testing scenario based on the information provided."
+    system_message_prompt = SystemMessagePromptTemplate.from_template(system_template)
+
+    # Human Message Template
+    human_template = f"""
 **Background information:**
 The company operates in the '{industry}' industry and is of size '{company_size}'.
 
@@ -220,19 +225,28 @@ Create an incident response testing scenario based on the information provided.
 
 Your response should be well-structured and formatted using Markdown. Write in British English.
 """
-        human_message_prompt = HumanMessagePromptTemplate.from_template(human_template)
+    human_message_prompt = HumanMessagePromptTemplate.from_template(human_template)
+
+    # Construct the ChatPromptTemplate
+    chat_prompt = ChatPromptTemplate.from_messages([system_message_prompt, human_message_prompt])
+
+    # Format the prompt
+    return chat_prompt.format_prompt(
+        selected_group_alias=threat_group,
+        industry=industry,
+        company_size=company_size,
+        selected_techniques_string=selected_techniques_string,
+        template_info=template_info
+    ).to_messages()
 
-        # Construct the ChatPromptTemplate
-        chat_prompt = ChatPromptTemplate.from_messages([system_message_prompt, human_message_prompt])
+# Function to generate a scenario using Google Generative AI
+def generate_scenario_google(selections, llm=None, stream=False):
+    try:
+        llm = llm or get_llm()
+        messages = build_scenario_messages(selections)
 
-        # Format the prompt
-        messages = chat_prompt.format_prompt(
-            selected_group_alias=threat_group,
-            industry=industry,
-            company_size=company_size,
-            selected_techniques_string=selected_techniques_string,
-            template_info=template_info
-        ).to_messages()
+        if stream:
+            return stream_scenario(llm, messages)
 
         # Generate the scenario
         print("Generating scenario, please wait...")
@@ -249,23 +263,42 @@ Your response should be well-structured and formatted using Markdown. Write in B
         print(f"An error occurred while generating the scenario: {str(e)}")
         return None
 
+# Function to print the scenario as the model writes it, reporting the time to first output
+def stream_scenario(llm, messages):
+    start = time.perf_counter()
+    first_token = None
+    chunks = []
+    for chunk in llm.stream(messages):
+        text = getattr(chunk, "content", chunk)
+        if first_token is None:
+            first_token = time.perf_counter() - start
+        chunks.append(text)
+        print(text, end="", flush=True)
+    total = time.perf_counter() - start
+    first_token = total if first_token is None else first_token
+    print(f"\n\n[stream] first token {first_token:.2f}s, total {total:.2f}s")
+    return "".join(chunks)
+
 # Main script execution
 if __name__ == "__main__":
     # Specify the paths to the JSON files
     threat_groups_file = 'groups.json'
-    attack_json_file = 'enterprise-attack.json'
+    attack_json_file = './enterprise-attack.json'
 
     # Parse command line arguments for API key and model name
     parser = argparse.ArgumentParser(description="Generate a custom scenario using Google Generative AI")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print the scenario as it is generated and report time to first output")
     args = parser.parse_args()
 
-    # Load the attack data
-    attack_data = MitreAttackData("./enterprise-attack.json")
-    if attack_data is None:
-        print("Failed to load attack data. Exiting...")
+    # Load the attack data from the compiled index (rebuilt when the bundle changes)
+    try:
+        attack_data = open_attack_index(attack_json_file)
+    except (OSError, ValueError) as e:
+        print(f"Failed to load attack data: {e}. Exiting...")
         exit(1)
     # Get user selections
     selections = get_user_selections(threat_groups_file, attack_data)
 
     # Generate the scenario using Google Generative AI
-    generate_scenario_google(selections)
+    generate_scenario_google(selections, stream=args.stream)
@@ -0,0 +1,327 @@
+# Structured output parsing for the threat model JSON.  The response is a
+# single object,
+#
+#     {"threat_model": [{...}, {...}, ...], "improvement_suggestions": [...]}
+#
+# ThreatStreamParser reads it incrementally: every threat object is complete
+# long before the response is, so the table row for a threat can be rendered
+# as soon as its closing brace arrives.
+#
+# parse_threat_model is the tolerant, validating parser for a complete
+# response.  It accepts fenced or unfenced JSON surrounded by prose, `//`
+# comments and trailing commas (as in the prompt's own example).  When the
+# response is still broken it keeps every threat object that parses and asks
+# the LLM to repair only the broken or cut-off objects, rather than
+# regenerating the whole threat model.
+import re
+import json
+
+# Array whose objects are emitted as they complete
+STREAMED_KEY = "threat_model"
+THREAT_KEYS = ("Threat Type", "Scenario", "Potential Impact")
+FENCE = re.compile(r"```(?:json|JSON)?\s*\n(.*?)```", re.DOTALL)
+
+REPAIR_PROMPT = """The following fragment of a JSON document is malformed or was cut off.
+Return only the corrected fragment: {description}.
+Keep every value that is present, complete any value that was cut off, and do not add entries.
+Do not add any explanation or a Markdown code fence.
+
+{fragment}
+"""
+THREAT_DESCRIPTION = 'one JSON object with the string keys "Threat Type", "Scenario" and "Potential Impact"'
+SUGGESTIONS_DESCRIPTION = "one JSON array of strings"
+
+
+class ThreatModelParseError(ValueError):
+    """
+    Raised when no valid threat model could be recovered from a response.
+    `errors` lists what was wrong with it.
+    """
+
+    def __init__(self, message, errors=()):
+        super().__init__(message if not errors else f"{message}: {'; '.join(errors)}")
+        self.errors = list(errors)
+
+
+class ThreatStreamParser:
+    """
+    Feed the response text chunk by chunk; `feed` returns the threat objects
+    that were completed by that chunk.  Text around the JSON (a Markdown fence,
+    prose) and `//` comments are skipped.
+
+    Example:
+        parser = ThreatStreamParser()
+        for chunk in llm.stream(prompt):
+            for threat in parser.feed(chunk):
+                print(threat_row(threat), end="")
+        data = parser.result()
+    """
+
+    def __init__(self, key=STREAMED_KEY):
+        self.key = key
+        self.text = ""
+        self.position = 0
+        self.start = None        # index of the outermost '{'
+        self.end = None          # index after the matching '}'
+        self.stack = []          # open containers: [type, key they were opened under]
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.last_string = None  # the most recent complete string, i.e. a key when ':' follows
+        self.pending_key = None
+        self.item_start = None
+        self.value_start = None
+        self.threats = []
+        self.broken = []         # text of threat objects that did not parse or validate
+        self.items = []          # (threat, None) or (None, broken text), in response order
+        self.values = {}         # top-level key -> text of its array / object value
+
+    def feed(self, chunk):
+        self.text += chunk
+        completed = []
+        text = self.text
+        while self.position < len(text) and self.end is None:
+            character = text[self.position]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif character == '\\':
+                    self.escape = True
+                elif character == '"':
+                    self.in_string = False
+                    self.last_string = text[self.string_start:self.position + 1]
+            elif self.start is None:
+                # Before the JSON: wait for the outermost '{'
+                if character == '{':
+                    self.start = self.position
+                    self.stack.append(['{', None])
+            elif character == '/':
+                if self.position + 1 >= len(text):
+                    break  # need the next chunk to tell whether this is a comment
+                if text[self.position + 1] == '/':
+                    newline = text.find('\n', self.position)
+                    if newline == -1:
+                        break
+                    self.position = newline
+            elif character == '"':
+                self.in_string = True
+                self.string_start = self.position
+            elif character == ':':
+                self.pending_key = json.loads(self.last_string) if self.last_string else None
+            elif character in '{[':
+                key = self.pending_key if self.stack[-1][0] == '{' else None
+                if character == '{' and self._in_streamed_array():
+                    self.item_start = self.position
+                if len(self.stack) == 1:
+                    self.value_start = self.position
+                self.stack.append([character, key])
+                self.pending_key = None
+            elif character in '}]':
+                closed = self.stack.pop()
+                if character == '}' and self.item_start is not None and self._in_streamed_array():
+                    item_text = text[self.item_start:self.position + 1]
+                    threat = self._load_item(item_text)
+                    if threat is not None and not validate_threat(threat):
+                        self.threats.append(threat)
+                        self.items.append((threat, None))
+                        completed.append(threat)
+                    else:
+                        self.broken.append(item_text)
+                        self.items.append((None, item_text))
+                    self.item_start = None
+                if len(self.stack) == 1 and self.value_start is not None:
+                    if closed[1] is not None:
+                        self.values[closed[1]] = text[self.value_start:self.position + 1]
+                    self.value_start = None
+                if not self.stack:
+                    self.end = self.position + 1
+            elif character == ',':
+                self.pending_key = None
+            self.position += 1
+        return completed
+
+    def _in_streamed_array(self):
+        return len(self.stack) == 2 and self.stack[-1] == ['[', self.key]
+
+    @staticmethod
+    def _load_item(item_text):
+        try:
+            return json.loads(strip_comments(item_text))
+        except json.JSONDecodeError:
+            return None
+
+    @property
+    def complete(self):
+        return self.end is not None
+
+    def cut_off_item(self):
+        """
+        The text of a threat object the response ended in the middle of, or None.
+        """
+        if self.item_start is None or self.complete:
+            return None
+        return self.text[self.item_start:]
+
+    def result(self):
+        """
+        Parses the complete JSON object.  Raises ValueError if the response
+        ended before the object was closed.
+        """
+        if not self.complete:
+            raise ValueError("The model response ended before the JSON object was complete")
+        return json.loads(strip_comments(self.text[self.start:self.end]))
+
+
+def strip_comments(text):
+    """
+    Removes `//` line comments outside strings, and the trailing commas they
+    usually leave behind (as in the prompt's own example response).
+    """
+    output = []
+    in_string = False
+    escape = False
+    i = 0
+    while i < len(text):
+        character = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif character == '\\':
+                escape = True
+            elif character == '"':
+                in_string = False
+        elif character == '"':
+            in_string = True
+        elif character == '/' and text.startswith('//', i):
+            newline = text.find('\n', i)
+            i = len(text) if newline == -1 else newline
+            continue
+        elif character in '}]':
+            # Drop a trailing comma before the closing bracket
+            j = len(output) - 1
+            while j >= 0 and output[j].isspace():
+                j -= 1
+            if j >= 0 and output[j] == ',':
+                del output[j]
+        output.append(character)
+        i += 1
+    return "".join(output)
+
+
+def validate_threat(threat):
+    """
+    Returns the schema errors of one threat object (an empty list when it is valid).
+    """
+    if not isinstance(threat, dict):
+        return [f"threat is a {type(threat).__name__}, not an object"]
+    return [f'threat is missing "{key}"' if key not in threat else f'"{key}" is not a string'
+            for key in THREAT_KEYS if not isinstance(threat.get(key), str)]
+
+
+def validate_threat_model(data, allow_empty=False):
+    """
+    Returns the schema errors of a parsed threat model response.  An empty
+    "threat_model" array is only valid with allow_empty (seeded prompts).
+    """
+    if not isinstance(data, dict):
+        return ["the response is not a JSON object"]
+    threats = data.get("threat_model")
+    if not isinstance(threats, list) or not (threats or allow_empty):
+        return ['"threat_model" is missing or not a non-empty array']
+    errors = [f"threat {i}: {error}" for i, threat in enumerate(threats, 1) for error in validate_threat(threat)]
+    suggestions = data.get("improvement_suggestions", [])
+    if not isinstance(suggestions, list) or not all(isinstance(item, str) for item in suggestions):
+        errors.append('"improvement_suggestions" is not an array of strings')
+    return errors
+
+
+def extract_json(text):
+    """
+    Returns the JSON text of a response: the contents of its ```json fence if it
+    has one, otherwise everything from the first '{' to the last '}'.
+    """
+    fenced = FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        raise ThreatModelParseError("No JSON object found in the model response")
+    return text[start:end + 1]
+
+
+def loads_lenient(text):
+    """
+    json.loads for LLM output: tolerates fences, surrounding prose, `//` comments and trailing commas.
+    """
+    return json.loads(strip_comments(extract_json(text)))
+
+
+def repair_fragment(llm, fragment, description):
+    """
+    Asks the LLM to fix one broken fragment and parses its answer.
+
+    Returns:
+        The parsed value, or None if the repaired fragment still does not parse.
+    """
+    response = llm.invoke(REPAIR_PROMPT.format(description=description, fragment=fragment))
+    response = getattr(response, "content", response)
+    try:
+        fenced = FENCE.search(response)
+        return json.loads(strip_comments(fenced.group(1) if fenced else response.strip()))
+    except json.JSONDecodeError:
+        return None
+
+
+def parse_threat_model(text, llm=None, allow_empty=False):
+    """
+    Parses and validates a threat model response.  When the whole response does
+    not parse or validate, the threat objects that do are kept and only the
+    broken or cut-off ones are sent to `llm` for repair (skipped when llm is None).
+
+    Returns:
+        tuple: (data, repairs) where data has "threat_model" and
+               "improvement_suggestions", and repairs is the number of fragments the LLM fixed.
+
+    Raises:
+        ThreatModelParseError: If no valid threat could be recovered.
+    """
+    errors = []
+    try:
+        data = loads_lenient(text)
+        errors = validate_threat_model(data, allow_empty)
+        if not errors:
+            data.setdefault("improvement_suggestions", [])
+            return data, 0
+    except ValueError as e:
+        errors = [str(e)]
+
+    # Salvage: keep the threats that parse, repair only the broken fragments
+    parser = ThreatStreamParser()
+    parser.feed(text)
+    items = parser.items + ([(None, parser.cut_off_item())] if parser.cut_off_item() else [])
+    threats = []
+    repairs = 0
+    for threat, fragment in items:
+        if fragment is not None and llm is not None:
+            threat = repair_fragment(llm, fragment, THREAT_DESCRIPTION)
+            if threat is None or validate_threat(threat):
+                continue
+            repairs += 1
+        if threat is not None:
+            threats.append(threat)
+
+    suggestions = []
+    if "improvement_suggestions" in parser.values:
+        try:
+            suggestions = json.loads(strip_comments(parser.values["improvement_suggestions"]))
+        except json.JSONDecodeError:
+            if llm is not None:
+                suggestions = repair_fragment(llm, parser.values["improvement_suggestions"], SUGGESTIONS_DESCRIPTION)
+                repairs += suggestions is not None
+        if not isinstance(suggestions, list):
+            suggestions = []
+        suggestions = [item for item in suggestions if isinstance(item, str)]
+
+    if not threats:
+        raise ThreatModelParseError("No valid threats in the model response", errors)
+    return {"threat_model": threats, "improvement_suggestions": suggestions}, repairs
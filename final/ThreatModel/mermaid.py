@@ -0,0 +1,455 @@
+# Mermaid post-processing for the attack trees the model draws.  The model's
+# Mermaid is parsed into a graph, checked, cleaned up and written back out in
+# a canonical form:
+#   - labels the model left unquoted (round brackets, quotes) are quoted and
+#     escaped, edges without a target are dropped, cycles are reported,
+#   - nodes with the same label under different ids are merged,
+#   - optionally, linear chains are collapsed into one node: a node with
+#     exactly one child absorbs it when that child has no other parent and
+#     the edge between them has no label, repeatedly down the chain,
+#   - node ids are derived from the labels and nodes and edges are written in
+#     breadth-first order, so two runs of the same tree diff cleanly.
+# Besides Mermaid, the graph can be written as DOT or JSON.  Every step is
+# linear in the number of nodes and edges.
+#
+#     tree = parse_mermaid(llm_output)
+#     tree.merge_duplicates()
+#     print(tree.to_mermaid())
+#
+# `python mermaid.py tree.mmd -f dot --collapse` does the same from the command line.
+import re
+import sys
+import json
+import hashlib
+import argparse
+from collections import deque
+
+# Shape -> (opening, closing) brackets, longest openers first so '((' is not read as '('
+SHAPES = {
+    "circle": ("((", "))"),
+    "stadium": ("([", "])"),
+    "subroutine": ("[[", "]]"),
+    "cylinder": ("[(", ")]"),
+    "hexagon": ("{{", "}}"),
+    "rect": ("[", "]"),
+    "round": ("(", ")"),
+    "diamond": ("{", "}"),
+    "flag": (">", "]"),
+}
+OPENERS = sorted(((opening, shape) for shape, (opening, _) in SHAPES.items()), key=lambda item: -len(item[0]))
+DOT_SHAPES = {"rect": "box", "round": "box", "stadium": "box", "subroutine": "box", "cylinder": "cylinder",
+              "circle": "circle", "diamond": "diamond", "hexagon": "hexagon", "flag": "box"}
+
+HEADER = re.compile(r"^(?:graph|flowchart)\s*(TD|TB|BT|LR|RL)?\s*;?$", re.IGNORECASE)
+IGNORED = re.compile(r"^(?:%%|classDef\s|class\s|style\s|linkStyle\s|click\s|subgraph\b|end\s*$|direction\s)")
+NODE_ID = re.compile(r"\s*([A-Za-z0-9_]+(?:-(?![-.>])[A-Za-z0-9_]+)*)")
+# "-->", "---", "==>", "-.->", with an optional "-- text -->" or "-->|text|" label
+EDGE = re.compile(r"\s*(?:(?:--|==|-\.)\s*([^\-=.>|&\s][^>|]*?)\s*)?(-->|---|==>|===|-\.->|-\.-|\.->)\s*(?:\|([^|]*)\|)?")
+AMPERSAND = re.compile(r"\s*&")
+
+
+class MermaidError(ValueError):
+    pass
+
+
+def normalize_label(label):
+    return " ".join(label.lower().split()).strip(" .")
+
+
+class Node:
+    __slots__ = ("id", "label", "shape", "labelled")
+
+    def __init__(self, node_id, label=None, shape="rect"):
+        self.id = node_id
+        self.label = label if label is not None else node_id
+        self.shape = shape
+        self.labelled = label is not None
+
+
+class AttackTree:
+    """
+    A Mermaid flowchart as nodes (in first-seen order) and edges, plus the
+    issues found while parsing and cleaning it.
+    """
+
+    def __init__(self, direction="TD"):
+        self.direction = direction
+        self.nodes = {}
+        self.edges = {}          # (source, target) -> edge label
+        self.issues = []
+
+    # Building
+
+    def add_node(self, node_id, label=None, shape="rect"):
+        node = self.nodes.get(node_id)
+        if node is None:
+            node = self.nodes[node_id] = Node(node_id, label, shape)
+        elif label is not None:
+            if node.labelled and normalize_label(node.label) != normalize_label(label):
+                self.issues.append(f'node {node_id} is defined as both "{node.label}" and "{label}"; kept the first')
+            elif not node.labelled:
+                node.label, node.shape, node.labelled = label, shape, True
+        return node
+
+    def add_edge(self, source, target, label=""):
+        if source == target:
+            self.issues.append(f"dropped self-loop on {source}")
+            return
+        key = (source, target)
+        if key in self.edges:
+            if label and not self.edges[key]:
+                self.edges[key] = label
+            return
+        self.edges[key] = label or ""
+
+    # Analysis
+
+    def adjacency(self):
+        children = {node_id: [] for node_id in self.nodes}
+        parents = {node_id: [] for node_id in self.nodes}
+        for source, target in self.edges:
+            children[source].append(target)
+            parents[target].append(source)
+        return children, parents
+
+    def roots(self):
+        _, parents = self.adjacency()
+        return [node_id for node_id in self.nodes if not parents[node_id]]
+
+    def validate(self):
+        """
+        Returns the problems with the graph: parse issues, unlabelled nodes,
+        missing roots and cycles (found with Kahn's algorithm).
+        """
+        problems = list(self.issues)
+        problems += [f"node {node.id} has no label" for node in self.nodes.values() if not node.labelled]
+        if not self.nodes:
+            return problems + ["the attack tree has no nodes"]
+        children, parents = self.adjacency()
+        in_degree = {node_id: len(parents[node_id]) for node_id in self.nodes}
+        queue = deque(node_id for node_id, degree in in_degree.items() if degree == 0)
+        if not queue:
+            problems.append("the attack tree has no root node")
+        visited = 0
+        while queue:
+            node_id = queue.popleft()
+            visited += 1
+            for child in children[node_id]:
+                in_degree[child] -= 1
+                if in_degree[child] == 0:
+                    queue.append(child)
+        if visited < len(self.nodes):
+            cyclic = [node_id for node_id, degree in in_degree.items() if degree > 0]
+            problems.append(f"cycle through {len(cyclic)} nodes: {', '.join(cyclic[:10])}")
+        return problems
+
+    # Compaction
+
+    def merge_duplicates(self):
+        """
+        Merges nodes with the same (normalized) label into the first of them.
+
+        Returns:
+            int: The number of nodes merged away.
+        """
+        canonical = {}
+        replacement = {}
+        for node in self.nodes.values():
+            key = normalize_label(node.label)
+            if key in canonical:
+                replacement[node.id] = canonical[key]
+            else:
+                canonical[key] = node.id
+        if replacement:
+            self._rewrite(replacement)
+        return len(replacement)
+
+    def collapse_chains(self, separator=" → "):
+        """
+        Collapses linear chains: a node whose only child has no other parent
+        (and whose edge carries no label) absorbs that child, its label
+        joined with `separator`.
+
+        Returns:
+            int: The number of nodes collapsed away.
+        """
+        children, parents = self.adjacency()
+        replacement = {}
+        for node_id in list(self.nodes):
+            if node_id in replacement:
+                continue
+            head = self.nodes[node_id]
+            current = node_id
+            while len(children[current]) == 1:
+                child = children[current][0]
+                if (len(parents[child]) != 1 or child in replacement or child == node_id
+                        or self.edges.get((current, child))):
+                    break
+                head.label = f"{head.label}{separator}{self.nodes[child].label}"
+                replacement[child] = node_id
+                current = child
+            if current != node_id:
+                # The head takes over the outgoing edges of the last node in the chain
+                children[node_id] = children[current]
+        if replacement:
+            edges = {}
+            for (source, target), label in self.edges.items():
+                if target in replacement and replacement[target] == replacement.get(source, source):
+                    continue  # an edge inside a collapsed chain
+                source = replacement.get(source, source)
+                if source != target:
+                    edges.setdefault((source, target), label)
+            self.edges = edges
+            for node_id in replacement:
+                del self.nodes[node_id]
+        return len(replacement)
+
+    def _rewrite(self, replacement):
+        edges = {}
+        for (source, target), label in self.edges.items():
+            source, target = replacement.get(source, source), replacement.get(target, target)
+            if source != target and (source, target) not in edges:
+                edges[(source, target)] = label
+            elif source != target and label and not edges[(source, target)]:
+                edges[(source, target)] = label
+        self.edges = edges
+        for node_id in replacement:
+            del self.nodes[node_id]
+
+    # Output
+
+    def ordered(self):
+        """
+        Nodes in breadth-first order from the roots (then any left in a cycle),
+        and edges in the order of their source and target nodes.
+        """
+        children, _ = self.adjacency()
+        order = {}
+        queue = deque(self.roots())
+        for start in list(queue) + list(self.nodes):
+            if start not in order:
+                queue.append(start)
+            while queue:
+                node_id = queue.popleft()
+                if node_id in order:
+                    continue
+                order[node_id] = len(order)
+                queue.extend(child for child in children[node_id] if child not in order)
+        nodes = sorted(self.nodes.values(), key=lambda node: order[node.id])
+        edges = sorted(self.edges.items(), key=lambda item: (order[item[0][0]], order[item[0][1]]))
+        return nodes, edges
+
+    def canonical_ids(self):
+        """
+        Label-derived ids, stable across runs that produce the same labels.
+        """
+        ids, used = {}, set()
+        for node in self.nodes.values():
+            base = "n" + hashlib.sha1(normalize_label(node.label).encode()).hexdigest()[:8]
+            node_id, suffix = base, 1
+            while node_id in used:
+                suffix += 1
+                node_id = f"{base}_{suffix}"
+            used.add(node_id)
+            ids[node.id] = node_id
+        return ids
+
+    def to_mermaid(self, canonical_ids=True):
+        ids = self.canonical_ids() if canonical_ids else {node_id: node_id for node_id in self.nodes}
+        nodes, edges = self.ordered()
+        lines = [f"graph {self.direction}"]
+        for node in nodes:
+            opening, closing = SHAPES[node.shape]
+            lines.append(f'    {ids[node.id]}{opening}"{escape_label(node.label)}"{closing}')
+        for (source, target), label in edges:
+            link = f'-->|"{escape_label(label)}"|' if label else "-->"
+            lines.append(f"    {ids[source]} {link} {ids[target]}")
+        return "\n".join(lines) + "\n"
+
+    def to_dot(self):
+        nodes, edges = self.ordered()
+        rankdir = {"TD": "TB"}.get(self.direction, self.direction)
+        lines = ["digraph attack_tree {", f"    rankdir={rankdir};"]
+        for node in nodes:
+            lines.append(f'    "{dot_escape(node.id)}" [label="{dot_escape(node.label)}", shape={DOT_SHAPES[node.shape]}];')
+        for (source, target), label in edges:
+            attributes = f' [label="{dot_escape(label)}"]' if label else ""
+            lines.append(f'    "{dot_escape(source)}" -> "{dot_escape(target)}"{attributes};')
+        lines.append("}")
+        return "\n".join(lines) + "\n"
+
+    def to_json(self):
+        nodes, edges = self.ordered()
+        return json.dumps({
+            "direction": self.direction,
+            "nodes": [{"id": node.id, "label": node.label, "shape": node.shape} for node in nodes],
+            "edges": [{"source": source, "target": target, "label": label} for (source, target), label in edges],
+            "issues": self.validate(),
+        }, indent=2)
+
+
+def escape_label(label):
+    return label.replace('"', "#quot;")
+
+
+def dot_escape(text):
+    return text.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def strip_fence(text):
+    """
+    Returns the diagram inside a ```mermaid fence (or the text itself when there is none).
+    """
+    match = re.search(r"```(?:mermaid)?\s*\n(.*?)```", text, re.DOTALL)
+    if match:
+        return match.group(1)
+    text = text.strip()
+    return text[len("mermaid"):] if text.startswith("mermaid") else text
+
+
+def _find_closing(statement, start, opening, closing):
+    # Brackets of the same kind inside an unquoted label, "B(Phishing (email))", are balanced first
+    depth = 0
+    for i in range(start, len(statement)):
+        if depth == 0 and statement.startswith(closing, i):
+            return i
+        if statement[i] == opening[-1]:
+            depth += 1
+        elif statement[i] == closing[0] and depth:
+            depth -= 1
+    return -1
+
+
+def _read_node(statement, position, tree, line_number):
+    """
+    Reads one node reference (`A`, `A[label]`, `A(("label"))`, ...) at position.
+
+    Returns:
+        tuple: (node id, new position), or (None, position) when there is no node.
+    """
+    match = NODE_ID.match(statement, position)
+    if not match:
+        return None, position
+    node_id = match.group(1)
+    position = match.end()
+    for opening, shape in OPENERS:
+        if statement.startswith(opening, position):
+            closing = SHAPES[shape][1]
+            start = position + len(opening)
+            quoted = statement[start:].lstrip().startswith('"')
+            if quoted:
+                quote_start = statement.index('"', start)
+                quote_end = statement.find('"', quote_start + 1)
+                end = statement.find(closing, quote_end + 1) if quote_end != -1 else -1
+                label = statement[quote_start + 1:quote_end] if quote_end != -1 else None
+            else:
+                end = _find_closing(statement, start, opening, closing)
+                label = statement[start:end].strip() if end != -1 else None
+            if end == -1 or label is None:
+                tree.issues.append(f"line {line_number}: unterminated label for node {node_id}")
+                label = statement[start:].strip().strip('"').rstrip(closing)
+                end = len(statement) - len(closing)
+            elif not quoted and any(character in label for character in '()[]{}"'):
+                tree.issues.append(f"line {line_number}: quoted the label of node {node_id}")
+            tree.add_node(node_id, label.replace("#quot;", '"'), shape)
+            return node_id, end + len(closing)
+    tree.add_node(node_id)
+    return node_id, position
+
+
+def _read_group(statement, position, tree, line_number):
+    # One or more nodes joined with '&'
+    node_ids = []
+    while True:
+        node_id, position = _read_node(statement, position, tree, line_number)
+        if node_id is None:
+            return node_ids, position
+        node_ids.append(node_id)
+        ampersand = AMPERSAND.match(statement, position)
+        if not ampersand:
+            return node_ids, position
+        position = ampersand.end()
+
+
+def parse_mermaid(text):
+    """
+    Parses a Mermaid flowchart (optionally inside a ```mermaid fence) into an AttackTree.
+
+    Raises:
+        MermaidError: If no node could be read at all.
+    """
+    tree = AttackTree()
+    for line_number, line in enumerate(strip_fence(text).splitlines(), 1):
+        for statement in line.split(";"):
+            statement = statement.strip()
+            if not statement:
+                continue
+            header = HEADER.match(statement)
+            if header:
+                tree.direction = (header.group(1) or "TD").upper()
+                continue
+            if IGNORED.match(statement):
+                continue
+            sources, position = _read_group(statement, 0, tree, line_number)
+            if not sources:
+                tree.issues.append(f"line {line_number}: could not parse {statement!r}")
+                continue
+            while position < len(statement):
+                edge = EDGE.match(statement, position)
+                if not edge:
+                    tree.issues.append(f"line {line_number}: ignored {statement[position:].strip()!r}")
+                    break
+                label = (edge.group(3) or edge.group(1) or "").strip().strip('"')
+                targets, position = _read_group(statement, edge.end(), tree, line_number)
+                if not targets:
+                    tree.issues.append(f"line {line_number}: dropped an edge from {', '.join(sources)} with no target")
+                    break
+                for source in sources:
+                    for target in targets:
+                        tree.add_edge(source, target, label)
+                sources = targets
+    if not tree.nodes:
+        raise MermaidError("No Mermaid nodes found in the attack tree")
+    return tree
+
+
+def clean_attack_tree(text, collapse=False):
+    """
+    Parses, merges duplicate nodes (and optionally collapses chains) and
+    returns the canonical Mermaid with the problems found.
+
+    Returns:
+        tuple: (mermaid text, list of problems).
+    """
+    tree = parse_mermaid(text)
+    merged = tree.merge_duplicates()
+    if merged:
+        tree.issues.append(f"merged {merged} duplicate nodes")
+    if collapse:
+        collapsed = tree.collapse_chains()
+        if collapsed:
+            tree.issues.append(f"collapsed {collapsed} nodes in linear chains")
+    return tree.to_mermaid(), tree.validate()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate and canonicalise a Mermaid attack tree.")
+    parser.add_argument("input", nargs="?", default="-", help="Mermaid file (default: stdin)")
+    parser.add_argument("-f", "--format", choices=["mermaid", "dot", "json"], default="mermaid")
+    parser.add_argument("--collapse", action="store_true", help="Collapse linear chains into single nodes")
+    parser.add_argument("--keep-ids", action="store_true", help="Keep the model's node ids in Mermaid output")
+    args = parser.parse_args()
+
+    source = sys.stdin.read() if args.input == "-" else open(args.input, 'r').read()
+    tree = parse_mermaid(source)
+    tree.merge_duplicates()
+    if args.collapse:
+        tree.collapse_chains()
+    if args.format == "dot":
+        print(tree.to_dot(), end="")
+    elif args.format == "json":
+        print(tree.to_json())
+    else:
+        print(tree.to_mermaid(canonical_ids=not args.keep_ids), end="")
+    for problem in tree.validate():
+        print(f"warning: {problem}", file=sys.stderr)
@@ -0,0 +1,243 @@
+# Non-interactive threat modelling pipeline.  threat_model.py,
+# threat_mitigations.py and threat_attack_tree.py are interactive tools; this
+# module drives the same prompts from an AppProfile instead of stdin, so
+# application profiles can be modelled in batches (e.g. in CI):
+#
+#     pipeline = ThreatModelPipeline()
+#     result = pipeline.run(AppProfile("Web Application", "Confidential", "Yes", "OAuth2", "..."))
+#
+# The stages run as a small dependency graph: the threat model and the attack
+# tree only need the profile and run concurrently, the mitigations need the
+# threats and run once the threat model is done.
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+from threat_model import threat_prompt, get_llm
+from threat_mitigations import create_mitigations_prompt
+from threat_attack_tree import attack_tree_prompt
+from mermaid import clean_attack_tree
+from json_output import parse_threat_model
+from threat_register import ThreatRegister, seed_prompt
+from profile_cache import ProfileCache
+
+
+@dataclass
+class AppProfile:
+    """
+    The answers threat_questions collects, plus the application description.
+    """
+    app_type: str
+    sensitivity: str
+    internet_facing: str
+    authentication: str
+    description: str
+
+    def answers(self):
+        # Same order threat_questions returns them in, so prompts are identical
+        return [self.app_type, self.sensitivity, self.internet_facing, self.authentication, self.description]
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**{name: data[name] for name in cls.__dataclass_fields__})
+
+
+@dataclass
+class Threat:
+    threat_type: str
+    scenario: str
+    potential_impact: str
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("Threat Type", ""), data.get("Scenario", ""), data.get("Potential Impact", ""))
+
+    def to_dict(self):
+        return {"Threat Type": self.threat_type, "Scenario": self.scenario, "Potential Impact": self.potential_impact}
+
+
+@dataclass
+class Mitigation:
+    threat_type: str
+    scenario: str
+    mitigation: str
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("Threat_type", data.get("Threat Type", "")), data.get("Scenario", ""),
+                   data.get("Suggested Mitigation", ""))
+
+
+@dataclass
+class ThreatModelResult:
+    profile: AppProfile
+    threats: list = field(default_factory=list)
+    improvement_suggestions: list = field(default_factory=list)
+    mitigations: list = field(default_factory=list)
+    attack_tree: str = ""
+    attack_tree_issues: list = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def parse_json_objects(text):
+    """
+    Parses a JSON document out of an LLM response, tolerating a surrounding
+    Markdown code fence and a sequence of objects that is not wrapped in an array.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip('`')
+        if text.startswith("json"):
+            text = text[4:]
+    decoder = json.JSONDecoder()
+    values = []
+    position = 0
+    while True:
+        start = min((i for i in (text.find('{', position), text.find('[', position)) if i != -1), default=-1)
+        if start == -1:
+            break
+        try:
+            value, position = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            # Trailing prose after the JSON we already have
+            if values:
+                break
+            raise
+        values.append(value)
+    if not values:
+        raise ValueError("No JSON found in the model response")
+    return values[0] if len(values) == 1 else values
+
+
+class ThreatModelPipeline:
+    """
+    Runs threat model -> mitigations, and the attack tree alongside, for an AppProfile.
+
+    Args:
+        llm: LLM used for every stage (default: the cached Gemini client from
+             threat_model.get_llm, created only when no llm is given).
+        register: Optional threat_register.ThreatRegister that every generated threat is recorded in.
+        seed: With a register, give the model the threats already recorded for
+              similar profiles and only ask it for additional ones.
+        profile_cache: Optional profile_cache.ProfileCache serving threat models
+                       of near-identical profiles without a full generation.
+    """
+
+    def __init__(self, llm=None, register=None, seed=False, profile_cache=None):
+        self.llm = llm or get_llm()
+        self.register = register
+        self.seed = seed
+        self.profile_cache = profile_cache
+
+    def _timed(self, result, stage, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except Exception as e:
+            result.errors[stage] = str(e)
+            return None
+        finally:
+            result.timings[stage] = round(time.perf_counter() - start, 3)
+
+    def threat_model(self, profile):
+        answers = profile.answers()
+        if self.profile_cache:
+            data = self.profile_cache.threat_model(answers, self._generate_threat_model, self.llm)
+            if self.register:
+                # Hits and diff updates skip generation; link their threats to this profile too
+                self.register.add_threats(answers, [], seeded=data["threat_model"])
+        else:
+            data = self._generate_threat_model(answers)
+        threats = [Threat.from_dict(threat) for threat in data["threat_model"]]
+        return threats, data["improvement_suggestions"]
+
+    def _generate_threat_model(self, answers):
+        existing = self.register.similar_profile_threats(answers) if self.register and self.seed else []
+        prompt = seed_prompt(threat_prompt(answers), existing)
+        data, _ = parse_threat_model(self.llm.invoke(prompt), self.llm, allow_empty=bool(existing))
+        if self.register:
+            self.register.add_threats(answers, data["threat_model"], seeded=existing)
+        return {"threat_model": existing + data["threat_model"],
+                "improvement_suggestions": data["improvement_suggestions"]}
+
+    def mitigations(self, threats):
+        threat_list = json.dumps([threat.to_dict() for threat in threats], indent=2)
+        data = parse_json_objects(self.llm.invoke(create_mitigations_prompt(threat_list)))
+        if isinstance(data, dict):
+            data = data.get("mitigations", [data])
+        return [Mitigation.from_dict(item) for item in data if isinstance(item, dict)]
+
+    def attack_tree(self, profile):
+        """
+        Returns:
+            tuple: (canonical Mermaid with duplicate nodes merged, list of problems found in the model's tree).
+        """
+        return clean_attack_tree(self.llm.invoke(attack_tree_prompt(profile.answers())))
+
+    def run(self, profile):
+        """
+        Returns:
+            ThreatModelResult: Structured threats, suggestions, mitigations and the
+            attack tree, with per-stage timings; failed stages are listed in `errors`.
+        """
+        result = ThreatModelResult(profile=profile)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            attack_tree = executor.submit(self._timed, result, "attack_tree", self.attack_tree, profile)
+            threat_model = self._timed(result, "threat_model", self.threat_model, profile)
+            if threat_model:
+                result.threats, result.improvement_suggestions = threat_model
+                result.mitigations = self._timed(result, "mitigations", self.mitigations, result.threats) or []
+            result.attack_tree, result.attack_tree_issues = attack_tree.result() or ("", [])
+        result.timings["total"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run_many(self, profiles, max_workers=4):
+        """
+        Runs several profiles concurrently, yielding results in input order.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(self.run, profiles)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the threat model pipeline over application profiles.")
+    parser.add_argument("profiles", help="JSON file with a list of profiles (app_type, sensitivity, "
+                                         "internet_facing, authentication, description)")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Profiles modelled concurrently")
+    parser.add_argument("--register", action="store_true", help="Record the threats in the threat register")
+    parser.add_argument("--seed", action="store_true",
+                        help="With --register, seed prompts with the register's threats for similar profiles")
+    parser.add_argument("--profile-cache", action="store_true",
+                        help="Serve near-identical profiles from the semantic profile cache")
+    args = parser.parse_args()
+
+    with open(args.profiles, 'r') as file:
+        profiles = [AppProfile.from_dict(item) for item in json.load(file)]
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+    failures = 0
+    try:
+        register = ThreatRegister() if args.register else None
+        profile_cache = ProfileCache() if args.profile_cache else None
+        pipeline = ThreatModelPipeline(register=register, seed=args.seed, profile_cache=profile_cache)
+        for result in pipeline.run_many(profiles, max_workers=args.jobs):
+            failures += not result.ok
+            output.write(json.dumps(result.to_dict()) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{len(profiles) - failures}/{len(profiles)} profiles modelled", file=sys.stderr)
+    sys.exit(1 if failures else 0)
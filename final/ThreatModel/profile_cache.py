@@ -0,0 +1,247 @@
+# Semantic cache in front of threat model generation.  Most requests share
+# their categorical answers (application type, sensitivity, internet facing,
+# authentication) with an earlier one and differ only trivially in the free
+# text description.  The cache embeds the description and compares it with
+# the descriptions cached for the same categorical answers:
+#   - similarity >= threshold: the cached threat model is returned as is (hit),
+#   - similarity >= update threshold: the model gets a short diff-update
+#     prompt with the cached threats and both descriptions, and answers only
+#     with the threats to drop and to add (update),
+#   - otherwise the threat model is generated in full (miss).
+# Every lookup is appended to a JSONL run log; `python profile_cache.py`
+# summarises hit rate and latency from it.
+#
+# Configuration (environment variables):
+#   PROFILE_CACHE_PATH               SQLite file (default: final/ThreatModel/.profile_cache.db)
+#   PROFILE_CACHE_LOG                run log (default: final/ThreatModel/.profile_cache_log.jsonl)
+#   PROFILE_CACHE_THRESHOLD          similarity for a hit (default: 0.97)
+#   PROFILE_CACHE_UPDATE_THRESHOLD   similarity for a diff update (default: 0.90)
+import os
+import sys
+import math
+import json
+import time
+import array
+import sqlite3
+import hashlib
+import argparse
+import threading
+from json_output import FENCE, strip_comments, validate_threat
+
+DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE_PATH = os.path.join(DIRECTORY, ".profile_cache.db")
+DEFAULT_LOG_PATH = os.path.join(DIRECTORY, ".profile_cache_log.jsonl")
+
+DIFF_UPDATE_PROMPT = """
+              Act as a cyber security expert using the STRIDE threat modelling methodology. A threat model was produced
+              for the application described under PREVIOUS DESCRIPTION. The application is now described as under
+              NEW DESCRIPTION; everything else about it is unchanged.
+
+              Update the threat model for the new description. Do not repeat threats that still apply. Respond with
+              JSON only, with the keys "remove" (the numbers of the existing threats that no longer apply), "add" (an
+              array of new threat objects with the keys "Threat Type", "Scenario" and "Potential Impact") and
+              "improvement_suggestions" (an array of strings). Use empty arrays when nothing changes.
+
+              PREVIOUS DESCRIPTION: {previous}
+              NEW DESCRIPTION: {current}
+
+              EXISTING THREATS:
+              {threats}
+              """
+
+
+def profile_key(answers):
+    """
+    The categorical answers; only profiles with identical answers are compared.
+    """
+    return hashlib.sha256("\x00".join(str(answer) for answer in answers[:4]).encode()).hexdigest()[:16]
+
+
+def cosine(vector, other):
+    dot = sum(x * y for x, y in zip(vector, other))
+    norm = math.sqrt(sum(x * x for x in vector)) * math.sqrt(sum(y * y for y in other))
+    return dot / norm if norm else 0.0
+
+
+def default_embeddings():
+    # The red-team embedding client: Gemini (or EMBEDDINGS_BACKEND=local) with a persistent cache
+    sys.path.append(os.path.join(DIRECTORY, "..", "ThreatIntelligence", "red-team"))
+    from embedding_service import get_embedding_function
+    return get_embedding_function(task_type="semantic_similarity")
+
+
+def diff_update_prompt(previous_answers, current_answers, threats):
+    numbered = json.dumps([{"Number": i, **threat} for i, threat in enumerate(threats, 1)], indent=2)
+    return DIFF_UPDATE_PROMPT.format(previous=previous_answers[4], current=current_answers[4], threats=numbered)
+
+
+def apply_diff(threats, response):
+    """
+    Applies a diff-update response to the cached threats.
+
+    Returns:
+        dict: The updated threat model ("threat_model", "improvement_suggestions").
+
+    Raises:
+        ValueError: If the response is not a valid diff.
+    """
+    fenced = FENCE.search(response)
+    text = fenced.group(1) if fenced else response
+    start, end = text.find('{'), text.rfind('}')
+    diff = json.loads(strip_comments(text[start:end + 1]))
+    if not isinstance(diff, dict):
+        raise ValueError("The diff update is not a JSON object")
+    remove = diff.get("remove", [])
+    if not isinstance(remove, list) or any(type(number) is not int for number in remove):
+        raise ValueError("The diff update has invalid threat numbers to remove")
+    added = diff.get("add", [])
+    if not isinstance(added, list) or any(validate_threat(threat) for threat in added):
+        raise ValueError("The diff update has invalid threats")
+    suggestions = diff.get("improvement_suggestions", [])
+    if not isinstance(suggestions, list):
+        raise ValueError("The diff update has invalid improvement suggestions")
+    remove = set(remove)
+    kept = [threat for i, threat in enumerate(threats, 1) if i not in remove]
+    return {"threat_model": kept + added, "improvement_suggestions": suggestions}
+
+
+class ProfileCache:
+    """
+    Embedding-similarity cache of threat models by application profile.
+
+    Args:
+        embeddings: LangChain Embeddings for the descriptions (default: the red-team embedding client).
+    """
+
+    def __init__(self, path=None, embeddings=None, threshold=None, update_threshold=None, log_path=None):
+        self.path = path or os.getenv("PROFILE_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self.log_path = log_path or os.getenv("PROFILE_CACHE_LOG", DEFAULT_LOG_PATH)
+        self.threshold = threshold if threshold is not None else float(os.getenv("PROFILE_CACHE_THRESHOLD", 0.97))
+        self.update_threshold = (update_threshold if update_threshold is not None
+                                 else float(os.getenv("PROFILE_CACHE_UPDATE_THRESHOLD", 0.90)))
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                id INTEGER PRIMARY KEY,
+                profile_key TEXT NOT NULL,
+                answers TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS profiles_key ON profiles (profile_key)")
+        self._connection.commit()
+
+    def _embed(self, answers):
+        if self.embeddings is None:
+            self.embeddings = default_embeddings()
+        return self.embeddings.embed_query(answers[4])
+
+    def lookup(self, answers, vector=None):
+        """
+        Returns:
+            tuple: (cached answers, cached result, similarity) of the most similar
+            cached profile with the same categorical answers, or (None, None, 0.0).
+        """
+        vector = vector if vector is not None else self._embed(answers)
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT answers, vector, result FROM profiles WHERE profile_key = ?", (profile_key(answers),)).fetchall()
+        best, best_score = None, 0.0
+        for row in rows:
+            score = cosine(vector, array.array('f', row[1]))
+            if score > best_score:
+                best, best_score = row, score
+        if best is None:
+            return None, None, 0.0
+        return json.loads(best[0]), json.loads(best[2]), best_score
+
+    def store(self, answers, result, vector=None):
+        vector = vector if vector is not None else self._embed(answers)
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO profiles (profile_key, answers, vector, result, created_at) VALUES (?, ?, ?, ?, ?)",
+                (profile_key(answers), json.dumps(answers), array.array('f', vector).tobytes(),
+                 json.dumps(result), time.time()))
+            self._connection.commit()
+
+    def threat_model(self, answers, generate, llm):
+        """
+        Returns the threat model for a profile from the cache, a diff update of a
+        cached one, or `generate(answers)`.  Updated and generated threat models
+        are cached; every call is appended to the run log.
+
+        Parameters:
+            answers (list): The answers from `threat_questions`.
+            generate: Function of the answers returning {"threat_model", "improvement_suggestions"}.
+            llm: LLM for diff updates.
+        """
+        start = time.perf_counter()
+        vector = self._embed(answers)
+        cached_answers, cached, score = self.lookup(answers, vector)
+        outcome = "miss"
+        if cached is not None and score >= self.threshold:
+            outcome, result = "hit", cached
+        else:
+            result = None
+            if cached is not None and score >= self.update_threshold:
+                try:
+                    response = llm.invoke(diff_update_prompt(cached_answers, answers, cached["threat_model"]))
+                    result = apply_diff(cached["threat_model"], getattr(response, "content", response))
+                    outcome = "update"
+                except ValueError:
+                    result = None
+            if result is None:
+                result = generate(answers)
+            self.store(answers, result, vector)
+        self.log(outcome, score, time.perf_counter() - start, answers)
+        return result
+
+    def log(self, outcome, score, seconds, answers):
+        entry = {"time": time.time(), "outcome": outcome, "similarity": round(score, 4),
+                 "seconds": round(seconds, 3), "profile_key": profile_key(answers)}
+        with self._lock, open(self.log_path, 'a') as file:
+            file.write(json.dumps(entry) + "\n")
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def dashboard(log_path=None):
+    """
+    Summarises the run log: lookups, hit/update/miss rates and latency per outcome.
+
+    Returns:
+        str: The dashboard as text.
+    """
+    log_path = log_path or os.getenv("PROFILE_CACHE_LOG", DEFAULT_LOG_PATH)
+    latencies = {"hit": [], "update": [], "miss": []}
+    if os.path.exists(log_path):
+        with open(log_path, 'r') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    latencies.setdefault(entry["outcome"], []).append(entry["seconds"])
+    total = sum(len(values) for values in latencies.values())
+    lines = [f"Profile cache: {total} lookups",
+             f"  {'outcome':<8} {'count':>7} {'rate':>7} {'p50 s':>8} {'p95 s':>8} {'mean s':>8}"]
+    for outcome, values in latencies.items():
+        mean = sum(values) / len(values) if values else 0.0
+        rate = len(values) / total if total else 0.0
+        lines.append(f"  {outcome:<8} {len(values):>7} {rate:>7.1%} {percentile(values, 0.5):>8.3f} "
+                     f"{percentile(values, 0.95):>8.3f} {mean:>8.3f}")
+    served = len(latencies["hit"]) + len(latencies["update"])
+    lines.append(f"  served without a full generation: {served / total if total else 0.0:.1%}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile cache run log dashboard.")
+    parser.add_argument("--log", help="Run log (default: PROFILE_CACHE_LOG or .profile_cache_log.jsonl)")
+    args = parser.parse_args()
+    print(dashboard(args.log))
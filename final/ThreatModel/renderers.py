@@ -0,0 +1,207 @@
+# Streaming renderers for threat models and consolidated threat registers.
+# Each writer writes rows straight to a text stream (a file, sys.stdout or an
+# io.StringIO) as they are given, so a register with thousands of threats
+# across many applications never has to be built as one string.  Cell values
+# are escaped for the output format: pipes and newlines in Markdown tables,
+# quoting in CSV, HTML entities in HTML.
+#
+#     with open("register.html", "w") as file:
+#         write_register(threats, suggestions, file, "html", columns=REGISTER_COLUMNS)
+#
+# `python renderers.py results.jsonl -f csv -o register.csv` turns the JSONL
+# output of pipeline.py into one register, reading it a line at a time.
+import io
+import sys
+import csv
+import html
+import json
+import argparse
+
+THREAT_COLUMNS = ("Threat Type", "Scenario", "Potential Impact")
+# Consolidated registers add the application each threat belongs to
+REGISTER_COLUMNS = ("Application",) + THREAT_COLUMNS
+
+
+def escape_markdown_cell(value):
+    """
+    Escapes a value for a Markdown table cell: pipes would end the cell and
+    newlines the row.
+    """
+    text = str(value).replace("\\", "\\\\").replace("|", "\\|")
+    return "<br>".join(line.strip() for line in text.strip().splitlines())
+
+
+class ThreatWriter:
+    """
+    Base class of the writers.  Call begin(), then write_threat() per threat,
+    then end(suggestions); or use the writer as a context manager and call
+    write_suggestions() before it closes.
+    """
+
+    def __init__(self, out, columns=THREAT_COLUMNS):
+        self.out = out
+        self.columns = columns
+        self.rows = 0
+        self.suggestions = []
+
+    def begin(self):
+        pass
+
+    def write_threat(self, threat):
+        raise NotImplementedError
+
+    def write_suggestions(self, suggestions):
+        self.suggestions.extend(suggestions)
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, *exc_info):
+        if exc_info[0] is None:
+            self.end()
+        return False
+
+    def _cells(self, threat):
+        return [threat.get(column, "") for column in self.columns]
+
+
+class MarkdownWriter(ThreatWriter):
+
+    def begin(self):
+        self.out.write("## Threat Model\n\n")
+        self.out.write("| " + " | ".join(self.columns) + " |\n")
+        self.out.write("|" + "|".join("-" * (len(column) + 2) for column in self.columns) + "|\n")
+
+    def write_threat(self, threat):
+        self.out.write(markdown_row(threat, self.columns))
+        self.rows += 1
+
+    def end(self):
+        self.out.write("\n\n## Improvement Suggestions\n\n")
+        for suggestion in self.suggestions:
+            self.out.write(f"- {escape_markdown_cell(suggestion)}\n")
+
+
+class CSVWriter(ThreatWriter):
+
+    def begin(self):
+        self._writer = csv.writer(self.out)
+        self._writer.writerow(self.columns)
+
+    def write_threat(self, threat):
+        self._writer.writerow(self._cells(threat))
+        self.rows += 1
+
+
+class JSONLWriter(ThreatWriter):
+    """
+    One JSON object per threat; improvement suggestions follow as
+    {"improvement_suggestion": ...} lines.
+    """
+
+    def write_threat(self, threat):
+        self.out.write(json.dumps(dict(zip(self.columns, self._cells(threat)))) + "\n")
+        self.rows += 1
+
+    def end(self):
+        for suggestion in self.suggestions:
+            self.out.write(json.dumps({"improvement_suggestion": suggestion}) + "\n")
+
+
+class HTMLWriter(ThreatWriter):
+
+    def begin(self):
+        self.out.write("<!DOCTYPE html>\n<html>\n<head><meta charset=\"utf-8\"><title>Threat Model</title></head>\n"
+                       "<body>\n<h2>Threat Model</h2>\n<table>\n<thead><tr>")
+        self.out.write("".join(f"<th>{html.escape(column)}</th>" for column in self.columns))
+        self.out.write("</tr></thead>\n<tbody>\n")
+
+    def write_threat(self, threat):
+        cells = "".join(f"<td>{html.escape(str(value)).replace(chr(10), '<br>')}</td>" for value in self._cells(threat))
+        self.out.write(f"<tr>{cells}</tr>\n")
+        self.rows += 1
+
+    def end(self):
+        self.out.write("</tbody>\n</table>\n")
+        if self.suggestions:
+            self.out.write("<h2>Improvement Suggestions</h2>\n<ul>\n")
+            for suggestion in self.suggestions:
+                self.out.write(f"<li>{html.escape(str(suggestion))}</li>\n")
+            self.out.write("</ul>\n")
+        self.out.write("</body>\n</html>\n")
+
+
+WRITERS = {
+    "markdown": MarkdownWriter,
+    "csv": CSVWriter,
+    "jsonl": JSONLWriter,
+    "html": HTMLWriter,
+}
+
+
+def markdown_row(threat, columns=THREAT_COLUMNS):
+    return "| " + " | ".join(escape_markdown_cell(threat.get(column, "")) for column in columns) + " |\n"
+
+
+def write_register(threats, improvement_suggestions, out, output_format="markdown", columns=THREAT_COLUMNS):
+    """
+    Writes threats (any iterable, consumed one at a time) and improvement
+    suggestions to `out` in the given format.
+
+    Returns:
+        int: The number of threats written.
+    """
+    with WRITERS[output_format](out, columns) as writer:
+        for threat in threats:
+            writer.write_threat(threat)
+        writer.write_suggestions(improvement_suggestions)
+    return writer.rows
+
+
+def render(threats, improvement_suggestions, output_format="markdown", columns=THREAT_COLUMNS):
+    """
+    Renders to a string; for large registers write to a file with write_register instead.
+    """
+    out = io.StringIO()
+    write_register(threats, improvement_suggestions, out, output_format, columns)
+    return out.getvalue()
+
+
+def pipeline_threats(lines):
+    """
+    Yields register rows from pipeline.py JSONL results, one line at a time.
+    """
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        result = json.loads(line)
+        profile = result.get("profile", {})
+        application = f"{number}. {profile.get('app_type', '')}: {profile.get('description', '')[:80]}"
+        for threat in result.get("threats", []):
+            yield {
+                "Application": application,
+                "Threat Type": threat.get("threat_type", ""),
+                "Scenario": threat.get("scenario", ""),
+                "Potential Impact": threat.get("potential_impact", ""),
+            }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render pipeline.py results as one consolidated threat register.")
+    parser.add_argument("results", help="JSONL file written by pipeline.py")
+    parser.add_argument("-f", "--format", choices=sorted(WRITERS), default="markdown", help="Output format")
+    parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    args = parser.parse_args()
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'w', newline='' if args.format == "csv" else None)
+    try:
+        with open(args.results, 'r') as file:
+            rows = write_register(pipeline_threats(file), [], output, args.format, REGISTER_COLUMNS)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{rows} threats written", file=sys.stderr)
@@ -1,16 +1,13 @@
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain import hub
 from langchain.tools import tool
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
-import re
-# Define the LLM
-llm = GoogleGenerativeAI(
-    model="gemini-1.5-pro-latest",
-    temperature=0,
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-)
+import os
+import sys
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_cache import get_llm_cache
+from prompt_hub import pull_prompt
+from mermaid import parse_mermaid
 
 def attack_questions(description):
     """
@@ -98,29 +95,56 @@ def attack_tree_prompt(threat_model):
               """
     return prompt
 
-# Integrate the tools with the LLM
-tools = []
+if __name__ == "__main__":
+    # Define the LLM (here rather than at import, so pipeline.py can import the prompts without an API key)
+    llm = GoogleGenerativeAI(
+        model="gemini-1.5-pro-latest",
+        temperature=0,
+        safety_settings={
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        },
+        cache=get_llm_cache()
+    )
 
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 8 tool calls")
+    parser = argparse.ArgumentParser(description="Interactive attack tree generator.")
+    parser.add_argument("-f", "--format", choices=["mermaid", "dot", "json"], default="mermaid",
+                        help="Output format of the attack tree")
+    parser.add_argument("--collapse", action="store_true", help="Collapse linear chains into single nodes")
+    args = parser.parse_args()
 
-agent = create_react_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    # Integrate the tools with the LLM
+    tools = []
 
-print("Welcome to Threat attack tree application.")
-for tool in agent_executor.tools:
-    print(f'  Tool: {tool.name} = {tool.description}')
+    base_prompt = pull_prompt("langchain-ai/react-agent-template")
+    prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 8 tool calls")
 
-while True:
-    line = input("Describe the application to show the attack tree: ")
-    try:
-        if line:
-            new_prompt = attack_tree_prompt(attack_questions(line))
-            result = agent_executor.invoke({"input": new_prompt})
-            resp = result['output']
-            attack_tree_resp = re.sub(r'mermaid\s*graph TD\n|\n$', '', resp, flags=re.MULTILINE)
-            print(attack_tree_resp)
-        else:
-            break
-    except Exception as e:
-        print(e)
\ No newline at end of file
+    agent = create_react_agent(llm, tools, prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+    print("Welcome to Threat attack tree application.")
+    for tool in agent_executor.tools:
+        print(f'  Tool: {tool.name} = {tool.description}')
+
+    while True:
+        line = input("Describe the application to show the attack tree: ")
+        try:
+            if line:
+                new_prompt = attack_tree_prompt(attack_questions(line))
+                result = agent_executor.invoke({"input": new_prompt})
+                # Parse and validate the model's Mermaid, merge duplicate nodes and print it canonically
+                attack_tree = parse_mermaid(result['output'])
+                attack_tree.merge_duplicates()
+                if args.collapse:
+                    attack_tree.collapse_chains()
+                if args.format == "dot":
+                    print(attack_tree.to_dot())
+                elif args.format == "json":
+                    print(attack_tree.to_json())
+                else:
+                    print(attack_tree.to_mermaid())
+                for problem in attack_tree.validate():
+                    print(f"warning: {problem}")
+            else:
+                break
+        except Exception as e:
+            print(e)
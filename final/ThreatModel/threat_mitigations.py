@@ -1,16 +1,11 @@
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain import hub
 from langchain.tools import tool
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
-
-# Define the LLM
-llm = GoogleGenerativeAI(
-    model="gemini-1.5-pro-latest",
-    temperature=0,
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-)
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_cache import get_llm_cache
+from prompt_hub import pull_prompt
 
 def threat_questions(description):
     """
@@ -103,27 +98,38 @@ YOUR RESPONSE (do not wrap in a code block):
     return prompt
 
 
-# Integrate the tools with the LLM
-tools = []
-
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-prompt = base_prompt.partial(instructions="You are a helpful assistant that provides threat mitigation strategies in Markdown format.")
-
-agent = create_react_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True,handle_parsing_errors=True)
-
-print("Welcome to Threat Mitigation application.")
-for tool in agent_executor.tools:
-    print(f'  Tool: {tool.name} = {tool.description}')
-
-while True:
-    line = input("Describe the application to show the mitigation: ")
-    try:
-        if line:
-            new_prompt = create_mitigations_prompt(threat_questions(line))
-            result = agent_executor.invoke({"input": new_prompt})
-            print(result['output'])
-        else:
-            break
-    except Exception as e:
-        print(e)
\ No newline at end of file
+if __name__ == "__main__":
+    # Define the LLM (here rather than at import, so pipeline.py can import the prompts without an API key)
+    llm = GoogleGenerativeAI(
+        model="gemini-1.5-pro-latest",
+        temperature=0,
+        safety_settings={
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        },
+        cache=get_llm_cache()
+    )
+
+    # Integrate the tools with the LLM
+    tools = []
+
+    base_prompt = pull_prompt("langchain-ai/react-agent-template")
+    prompt = base_prompt.partial(instructions="You are a helpful assistant that provides threat mitigation strategies in Markdown format.")
+
+    agent = create_react_agent(llm, tools, prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True,handle_parsing_errors=True)
+
+    print("Welcome to Threat Mitigation application.")
+    for tool in agent_executor.tools:
+        print(f'  Tool: {tool.name} = {tool.description}')
+
+    while True:
+        line = input("Describe the application to show the mitigation: ")
+        try:
+            if line:
+                new_prompt = create_mitigations_prompt(threat_questions(line))
+                result = agent_executor.invoke({"input": new_prompt})
+                print(result['output'])
+            else:
+                break
+        except Exception as e:
+            print(e)
@@ -1,17 +1,35 @@
 from langchain.agents import AgentExecutor, create_react_agent
-from langchain import hub
 from langchain.tools import tool
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
 import json
+import os
+import sys
+import time
+import argparse
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from llm_cache import get_llm_cache
+from prompt_hub import pull_prompt
+from json_output import ThreatStreamParser, parse_threat_model
+from renderers import MarkdownWriter, render
+from threat_register import ThreatRegister, seed_prompt
+from profile_cache import ProfileCache
 
-# Define the LLM
-llm = GoogleGenerativeAI(
-    model="gemini-1.5-pro-latest",
-    temperature=0,
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-    }
-)
+# Shared LLM, created on first use so that importing this module (pipeline.py
+# does) needs no API key
+_llm = None
+
+def get_llm():
+    global _llm
+    if _llm is None:
+        _llm = GoogleGenerativeAI(
+            model="gemini-1.5-pro-latest",
+            temperature=0,
+            safety_settings={
+                HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+            },
+            cache=get_llm_cache()
+        )
+    return _llm
 
 def threat_questions(description):
     """
@@ -173,49 +191,120 @@ def json_to_markdown(threat_model, improvement_suggestions):
     This function ensures that the output is well-organized, making it suitable for presentations, reports, or 
     documentation that requires a clear and professional appearance.
     """
-    markdown_output = "## Threat Model\n\n"
-    
-    # Start the markdown table with headers
-    markdown_output += "| Threat Type | Scenario | Potential Impact |\n"
-    markdown_output += "|-------------|----------|------------------|\n"
-    
-    # Fill the table rows with the threat model data
-    for threat in threat_model:
-        markdown_output += f"| {threat['Threat Type']} | {threat['Scenario']} | {threat['Potential Impact']} |\n"
-    
-    markdown_output += "\n\n## Improvement Suggestions\n\n"
-    for suggestion in improvement_suggestions:
-        markdown_output += f"- {suggestion}\n"
-    
-    return markdown_output
+    # Rendered by renderers.MarkdownWriter, which escapes pipes and newlines in the cells;
+    # use renderers.write_register to write large registers straight to a file
+    return render(threat_model, improvement_suggestions, "markdown")
+
+def stream_threat_model(prompt, model=None, out=sys.stdout, existing=()):
+    """
+    Streams the threat model from the LLM and writes each Markdown table row as
+    soon as its threat object is complete, instead of after the whole response.
+
+    Parameters:
+        prompt (str): The prompt from `threat_prompt`, or from `seed_prompt` with `existing`.
+        model: LLM to stream from (default: the shared Gemini client from get_llm).
+        out: Text stream the Markdown is written to.
+        existing (list): Threats the prompt was seeded with.  They are written
+                         first, and a response with no new threats is accepted.
+
+    Returns:
+        tuple: (threat_model, improvement_suggestions, timings), where threat_model is
+               `existing` followed by the new threats and timings holds the seconds to the
+               first token, to the first table row and to the end of the response.
+    """
+    model = model or get_llm()
+    existing = list(existing)
+    parser = ThreatStreamParser()
+    timings = {}
+    start = time.perf_counter()
+    writer = MarkdownWriter(out)
+    writer.begin()
+    for threat in existing:
+        writer.write_threat(threat)
+    out.flush()
+    for chunk in model.stream(prompt):
+        timings.setdefault("first_token", time.perf_counter() - start)
+        for threat in parser.feed(getattr(chunk, "content", chunk)):
+            timings.setdefault("first_row", time.perf_counter() - start)
+            writer.write_threat(threat)
+            out.flush()
+    timings["total"] = time.perf_counter() - start
+    json_data, _ = parse_threat_model(parser.text, model, allow_empty=bool(existing))
+    # Threats the repair step recovered after the stream ended
+    for threat in json_data["threat_model"]:
+        if threat not in parser.threats:
+            writer.write_threat(threat)
+    improvement_suggestions = json_data["improvement_suggestions"]
+    writer.write_suggestions(improvement_suggestions)
+    writer.end()
+    return existing + json_data["threat_model"], improvement_suggestions, timings
+
+def format_timings(timings):
+    return ", ".join(f"{name.replace('_', ' ')} {seconds:.2f}s" for name, seconds in timings.items())
     
 
-# Integrate the tools with the LLM
-tools = []
-
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 8 tool calls")
-
-agent = create_react_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-
-print("Welcome to my threat model application")
-for tool in agent_executor.tools:
-    print(f'  Tool: {tool.name} = {tool.description}')
-
-while True:
-    line = input("Describe the application to be modelled? ")
-    try:
-        if line:
-            new_prompt = threat_prompt(threat_questions(line))
-            result = agent_executor.invoke({"input": new_prompt})
-            cleaned_string = result["output"].strip('`')[5:].strip()
-            json_data = json.loads(cleaned_string)
-            threat_model = json_data["threat_model"]
-            improvement_suggestions = json_data["improvement_suggestions"]
-            final_res = json_to_markdown(threat_model, improvement_suggestions)
-            print(final_res)
-        else:
-            break
-    except Exception as e:
-        print(e)
\ No newline at end of file
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Interactive STRIDE threat model generator.")
+    parser.add_argument("--stream", action="store_true",
+                        help="Print table rows as the model writes them and report time to first output")
+    parser.add_argument("--no-register", action="store_true",
+                        help="Do not record the generated threats in the threat register")
+    parser.add_argument("--seed", action="store_true",
+                        help="Give the model the register's threats for similar applications and only ask for new ones")
+    parser.add_argument("--profile-cache", action="store_true",
+                        help="Serve near-identical applications from the semantic profile cache")
+    args = parser.parse_args()
+    register = None if args.no_register else ThreatRegister()
+    profile_cache = ProfileCache() if args.profile_cache else None
+    llm = get_llm()
+
+    # Integrate the tools with the LLM
+    tools = []
+
+    base_prompt = pull_prompt("langchain-ai/react-agent-template")
+    prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 8 tool calls")
+
+    agent = create_react_agent(llm, tools, prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+    def generate(answers):
+        existing = register.similar_profile_threats(answers) if register and args.seed else []
+        result = agent_executor.invoke({"input": seed_prompt(threat_prompt(answers), existing)})
+        json_data, repairs = parse_threat_model(result["output"], llm, allow_empty=bool(existing))
+        if repairs:
+            print(f"Repaired {repairs} broken fragment(s) of the model response")
+        if register:
+            register.add_threats(answers, json_data["threat_model"], seeded=existing)
+        return {"threat_model": existing + json_data["threat_model"],
+                "improvement_suggestions": json_data["improvement_suggestions"]}
+
+    print("Welcome to my threat model application")
+    for tool in agent_executor.tools:
+        print(f'  Tool: {tool.name} = {tool.description}')
+
+    while True:
+        line = input("Describe the application to be modelled? ")
+        try:
+            if line:
+                answers = threat_questions(line)
+                if args.stream:
+                    existing = register.similar_profile_threats(answers) if register and args.seed else []
+                    threat_model, _, timings = stream_threat_model(seed_prompt(threat_prompt(answers), existing),
+                                                                   existing=existing)
+                    print(f"\n[stream] {format_timings(timings)}")
+                    if register:
+                        register.add_threats(answers, threat_model[len(existing):], seeded=existing)
+                    continue
+                if profile_cache:
+                    json_data = profile_cache.threat_model(answers, generate, llm)
+                    if register:
+                        # Hits and diff updates skip generation; link their threats to this profile too
+                        register.add_threats(answers, [], seeded=json_data["threat_model"])
+                else:
+                    json_data = generate(answers)
+                final_res = json_to_markdown(json_data["threat_model"], json_data["improvement_suggestions"])
+                print(final_res)
+            else:
+                break
+        except Exception as e:
+            print(e)
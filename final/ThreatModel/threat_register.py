@@ -0,0 +1,322 @@
+# Persistent threat register.  Every threat a threat model run produces is
+# stored in SQLite together with the fingerprint of the application profile it
+# was generated for, so threats accumulate across runs instead of being thrown
+# away.  Modelling many similar applications produces the same STRIDE
+# scenarios over and over with small wording changes; those are folded into
+# one register entry:
+#   - exact duplicates by a hash of the normalized text,
+#   - near duplicates by MinHash similarity of the scenario's word shingles,
+#     with LSH buckets so only a handful of candidates are ever compared.
+# Scenarios and application descriptions are indexed with FTS5, so queries
+# such as "Information Disclosure threats for internet-facing finance web
+# applications" are answered from indexes:
+#
+#     register.query(threat_type="Information Disclosure", app_type="Web Application",
+#                    internet_facing="Yes", description="finance")
+#
+# The register can also seed a new threat model prompt with the threats already
+# recorded for similar profiles, so the model only adds what is missing.
+#
+# Configuration (environment variables):
+#   THREAT_REGISTER_PATH   SQLite file (default: final/ThreatModel/threat_register.db)
+import os
+import re
+import sys
+import json
+import time
+import struct
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+DEFAULT_REGISTER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "threat_register.db")
+PROFILE_FIELDS = ("app_type", "sensitivity", "internet_facing", "authentication", "description")
+THREAT_KEYS = ("Threat Type", "Scenario", "Potential Impact")
+
+# MinHash signature of NUM_PERM values, split into LSH_BANDS bands of equal size
+NUM_PERM = 64
+LSH_BANDS = 16
+SHINGLE_SIZE = 3
+NEAR_DUPLICATE_THRESHOLD = 0.8
+_PRIME = (1 << 61) - 1
+_PERMUTATIONS = [(int.from_bytes(hashlib.sha256(f"a{i}".encode()).digest()[:8], 'big') % (_PRIME - 1) + 1,
+                  int.from_bytes(hashlib.sha256(f"b{i}".encode()).digest()[:8], 'big') % _PRIME)
+                 for i in range(NUM_PERM)]
+
+SEED_PROMPT = """
+              The threat register already holds the threats below for similar applications. Do not repeat them or
+              reword them; under "threat_model" list only additional threats that are specific to this application
+              (an empty array if there are none).
+
+              EXISTING THREATS:
+              {threats}
+              """
+
+
+def normalize(text):
+    return " ".join(re.findall(r"[a-z0-9]+", str(text).lower()))
+
+
+def text_hash(threat):
+    return hashlib.sha256(f"{normalize(threat['Threat Type'])}\x00{normalize(threat['Scenario'])}".encode()).hexdigest()
+
+
+def fts_query(text):
+    """
+    Turns free text into an FTS5 query matching all of its words.  Each word is
+    quoted as an FTS5 string, so "internet-facing" or "OAuth2:" are searched
+    for rather than parsed as column filters or operators.
+    """
+    return " ".join('"' + term.replace('"', '""') + '"' for term in text.split())
+
+
+def profile_fingerprint(answers):
+    """
+    Fingerprint of an application profile (the answers of threat_questions):
+    the categorical answers plus the normalized description.
+    """
+    return hashlib.sha256("\x00".join(normalize(answer) for answer in answers).encode()).hexdigest()[:16]
+
+
+def minhash(text):
+    """
+    MinHash signature of the word shingles of a text.
+    """
+    words = normalize(text).split()
+    shingles = {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(max(1, len(words) - SHINGLE_SIZE + 1))}
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big') for shingle in shingles]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature, other):
+    return sum(x == y for x, y in zip(signature, other)) / NUM_PERM
+
+
+def lsh_buckets(signature):
+    rows = NUM_PERM // LSH_BANDS
+    return [(band, hashlib.blake2b(struct.pack(f">{rows}Q", *signature[band * rows:(band + 1) * rows]),
+                                   digest_size=8).hexdigest())
+            for band in range(LSH_BANDS)]
+
+
+class ThreatRegister:
+    """
+    SQLite threat register with FTS5 search and duplicate folding.
+    """
+
+    def __init__(self, path=None, threshold=NEAR_DUPLICATE_THRESHOLD):
+        self.path = path or os.getenv("THREAT_REGISTER_PATH", DEFAULT_REGISTER_PATH)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS profiles (
+                fingerprint TEXT PRIMARY KEY,
+                app_type TEXT, sensitivity TEXT, internet_facing TEXT, authentication TEXT, description TEXT,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS profiles_attributes ON profiles (app_type, internet_facing, sensitivity);
+            CREATE VIRTUAL TABLE IF NOT EXISTS profiles_fts USING fts5(fingerprint UNINDEXED, description);
+            CREATE TABLE IF NOT EXISTS threats (
+                id INTEGER PRIMARY KEY,
+                threat_type TEXT NOT NULL,
+                scenario TEXT NOT NULL,
+                potential_impact TEXT NOT NULL,
+                text_hash TEXT NOT NULL UNIQUE,
+                signature BLOB NOT NULL,
+                occurrences INTEGER NOT NULL DEFAULT 1,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS threats_type ON threats (threat_type);
+            CREATE VIRTUAL TABLE IF NOT EXISTS threats_fts USING fts5(
+                scenario, potential_impact, content='threats', content_rowid='id');
+            CREATE TABLE IF NOT EXISTS threat_profiles (
+                threat_id INTEGER NOT NULL,
+                fingerprint TEXT NOT NULL,
+                PRIMARY KEY (threat_id, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS threat_profiles_fingerprint ON threat_profiles (fingerprint);
+            CREATE TABLE IF NOT EXISTS lsh_buckets (
+                band INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                threat_id INTEGER NOT NULL,
+                PRIMARY KEY (band, bucket, threat_id)
+            ) WITHOUT ROWID;
+        """)
+        self._connection.commit()
+
+    def add_profile(self, answers):
+        fingerprint = profile_fingerprint(answers)
+        with self._lock:
+            if self._connection.execute("SELECT 1 FROM profiles WHERE fingerprint = ?", (fingerprint,)).fetchone():
+                return fingerprint
+            self._connection.execute("INSERT INTO profiles VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                     (fingerprint, *answers[:len(PROFILE_FIELDS)], time.time()))
+            self._connection.execute("INSERT INTO profiles_fts VALUES (?, ?)", (fingerprint, answers[4]))
+            self._connection.commit()
+        return fingerprint
+
+    def add_threats(self, answers, threats, seeded=()):
+        """
+        Records the threats generated for a profile, folding duplicates into the
+        existing entries.  `seeded` are threats that were not generated for this
+        profile: the register threats its prompt was seeded with, or a threat
+        model the profile cache served.  They are linked to the profile, so
+        profile filtered queries find them, without counting as another
+        occurrence; any the register does not hold yet are recorded.
+
+        Returns:
+            list: (threat id, "new" | "duplicate" | "near-duplicate") per threat.
+        """
+        fingerprint = self.add_profile(answers)
+        statuses = []
+        with self._lock:
+            for threat in threats:
+                threat_id, status = self._add_threat(threat)
+                self._connection.execute("INSERT OR IGNORE INTO threat_profiles VALUES (?, ?)", (threat_id, fingerprint))
+                statuses.append((threat_id, status))
+            for threat in seeded:
+                row = self._connection.execute("SELECT id FROM threats WHERE text_hash = ?",
+                                               (text_hash(threat),)).fetchone()
+                threat_id = row[0] if row else self._add_threat(threat)[0]
+                self._connection.execute("INSERT OR IGNORE INTO threat_profiles VALUES (?, ?)", (threat_id, fingerprint))
+            self._connection.commit()
+        return statuses
+
+    def _add_threat(self, threat):
+        digest = text_hash(threat)
+        row = self._connection.execute("SELECT id FROM threats WHERE text_hash = ?", (digest,)).fetchone()
+        if row:
+            self._connection.execute("UPDATE threats SET occurrences = occurrences + 1 WHERE id = ?", (row[0],))
+            return row[0], "duplicate"
+
+        signature = minhash(threat["Scenario"])
+        buckets = lsh_buckets(signature)
+        match = self._near_duplicate(threat["Threat Type"], signature, buckets)
+        if match is not None:
+            self._connection.execute("UPDATE threats SET occurrences = occurrences + 1 WHERE id = ?", (match,))
+            return match, "near-duplicate"
+
+        cursor = self._connection.execute(
+            "INSERT INTO threats (threat_type, scenario, potential_impact, text_hash, signature, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (threat["Threat Type"], threat["Scenario"], threat["Potential Impact"], digest,
+             struct.pack(f">{NUM_PERM}Q", *signature), time.time()))
+        threat_id = cursor.lastrowid
+        self._connection.execute("INSERT INTO threats_fts (rowid, scenario, potential_impact) VALUES (?, ?, ?)",
+                                 (threat_id, threat["Scenario"], threat["Potential Impact"]))
+        self._connection.executemany("INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)",
+                                     [(band, bucket, threat_id) for band, bucket in buckets])
+        return threat_id, "new"
+
+    def _near_duplicate(self, threat_type, signature, buckets):
+        # Candidates share at least one LSH band with the signature
+        candidates = set()
+        for band, bucket in buckets:
+            candidates.update(row[0] for row in self._connection.execute(
+                "SELECT threat_id FROM lsh_buckets WHERE band = ? AND bucket = ?", (band, bucket)))
+        best, best_similarity = None, self.threshold
+        for candidate in candidates:
+            row = self._connection.execute(
+                "SELECT threat_type, signature FROM threats WHERE id = ?", (candidate,)).fetchone()
+            if normalize(row[0]) != normalize(threat_type):
+                continue
+            score = similarity(signature, struct.unpack(f">{NUM_PERM}Q", row[1]))
+            if score >= best_similarity:
+                best, best_similarity = candidate, score
+        return best
+
+    def query(self, threat_type=None, app_type=None, sensitivity=None, internet_facing=None,
+              authentication=None, description=None, text=None, limit=100):
+        """
+        Threats matching every given filter.  `description` is a full-text
+        query over the application descriptions, `text` over the scenarios and
+        impacts; both match threats containing all of their words.
+
+        Returns:
+            list: Threat dicts with "Threat Type", "Scenario", "Potential Impact" and "Occurrences".
+        """
+        sql = ["SELECT t.threat_type, t.scenario, t.potential_impact, t.occurrences FROM threats t"]
+        where, parameters = [], []
+        if text:
+            sql.append("JOIN threats_fts ON threats_fts.rowid = t.id")
+            where.append("threats_fts MATCH ?")
+            parameters.append(fts_query(text))
+        if threat_type:
+            where.append("t.threat_type = ?")
+            parameters.append(threat_type)
+        profile_filters = {"app_type": app_type, "sensitivity": sensitivity,
+                           "internet_facing": internet_facing, "authentication": authentication}
+        profile_where, profile_parameters = [], []
+        for column, value in profile_filters.items():
+            if value:
+                profile_where.append(f"p.{column} = ?")
+                profile_parameters.append(value)
+        if description:
+            profile_where.append("p.fingerprint IN (SELECT fingerprint FROM profiles_fts WHERE profiles_fts MATCH ?)")
+            profile_parameters.append(fts_query(description))
+        if profile_where:
+            where.append("t.id IN (SELECT tp.threat_id FROM threat_profiles tp JOIN profiles p "
+                         "ON p.fingerprint = tp.fingerprint WHERE " + " AND ".join(profile_where) + ")")
+            parameters += profile_parameters
+        if where:
+            sql.append("WHERE " + " AND ".join(where))
+        sql.append("ORDER BY t.occurrences DESC, t.id LIMIT ?")
+        parameters.append(limit)
+        with self._lock:
+            rows = self._connection.execute(" ".join(sql), parameters).fetchall()
+        return [dict(zip(THREAT_KEYS + ("Occurrences",), row)) for row in rows]
+
+    def similar_profile_threats(self, answers, limit=30):
+        """
+        Threats recorded for profiles with the same application type and
+        internet exposure, most frequently seen first.
+        """
+        return self.query(app_type=answers[0], internet_facing=answers[2], limit=limit)
+
+    def stats(self):
+        with self._lock:
+            (profiles,) = self._connection.execute("SELECT COUNT(*) FROM profiles").fetchone()
+            threats, occurrences = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(occurrences), 0) FROM threats").fetchone()
+        return {"profiles": profiles, "threats": threats, "generated": occurrences,
+                "duplicates_folded": occurrences - threats}
+
+
+def seed_prompt(prompt, existing_threats):
+    """
+    Appends the register's existing threats to a threat_prompt, asking the model for additional threats only.
+    """
+    if not existing_threats:
+        return prompt
+    threats = json.dumps([{key: threat[key] for key in THREAT_KEYS} for threat in existing_threats], indent=2)
+    return prompt + SEED_PROMPT.format(threats=threats)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the threat register.")
+    parser.add_argument("--register", help="Register file (default: THREAT_REGISTER_PATH or threat_register.db)")
+    parser.add_argument("--type", dest="threat_type", help='STRIDE category, e.g. "Information Disclosure"')
+    parser.add_argument("--app-type", help='e.g. "Web Application"')
+    parser.add_argument("--sensitivity")
+    parser.add_argument("--internet-facing", choices=["Yes", "No"])
+    parser.add_argument("--authentication")
+    parser.add_argument("--description", help="Full-text query over application descriptions, e.g. finance")
+    parser.add_argument("--text", help="Full-text query over scenarios and impacts")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--stats", action="store_true", help="Print register statistics and exit")
+    args = parser.parse_args()
+
+    register = ThreatRegister(args.register)
+    if args.stats:
+        print(json.dumps(register.stats(), indent=2))
+        sys.exit(0)
+    start = time.perf_counter()
+    threats = register.query(args.threat_type, args.app_type, args.sensitivity, args.internet_facing,
+                             args.authentication, args.description, args.text, args.limit)
+    elapsed = (time.perf_counter() - start) * 1000
+    for threat in threats:
+        print(json.dumps(threat))
+    print(f"{len(threats)} threats in {elapsed:.1f} ms", file=sys.stderr)
@@ -0,0 +1,142 @@
+# Persistent state for orchestrator runs, so that a run which fails partway
+# (an LLM timeout, a rejected human-in-the-loop step) can be resumed instead of
+# started again.  Everything lives in one SQLite file:
+#   - LangGraph's own checkpoint tables, written by SqliteSaver after every
+#     node; resuming a thread continues from its last completed node,
+#   - `runs`: one row per thread id with its input and status, for listing and
+#     garbage collection,
+#   - `tool_results`: completed tool outputs keyed by tool name and input, so a
+#     tool that already ran with the same input is not billed again.
+#
+# Configuration (environment variables):
+#   ORCHESTRATOR_CHECKPOINT_PATH   SQLite file (default: final/.checkpoints.db)
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import threading
+
+DEFAULT_CHECKPOINT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".checkpoints.db")
+# Tables SqliteSaver keeps per thread id
+CHECKPOINT_TABLES = ("checkpoints", "writes")
+
+
+def checkpoint_path():
+    return os.getenv("ORCHESTRATOR_CHECKPOINT_PATH", DEFAULT_CHECKPOINT_PATH)
+
+
+def new_thread_id():
+    return uuid.uuid4().hex[:12]
+
+
+def get_checkpointer(path=None):
+    """
+    Returns a LangGraph SqliteSaver on the checkpoint file.
+    """
+    from langgraph.checkpoint.sqlite import SqliteSaver
+    return SqliteSaver(sqlite3.connect(path or checkpoint_path(), check_same_thread=False))
+
+
+class RunStore:
+    """
+    Run registry and tool output memo next to the LangGraph checkpoints.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or checkpoint_path()
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS runs (
+                thread_id TEXT PRIMARY KEY,
+                input TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )""")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS tool_results (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                output TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    def start_run(self, thread_id, request):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO runs VALUES (?, ?, 'running', NULL, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET status = 'running', error = NULL, updated_at = ?",
+                (thread_id, request, now, now, now))
+            self._connection.commit()
+
+    def finish_run(self, thread_id, status, error=None):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE runs SET status = ?, error = ?, updated_at = ? WHERE thread_id = ?",
+                (status, error, time.time(), thread_id))
+            self._connection.commit()
+
+    def get_run(self, thread_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT thread_id, input, status, error, created_at, updated_at FROM runs WHERE thread_id = ?",
+                (thread_id,)).fetchone()
+        return dict(zip(("thread_id", "input", "status", "error", "created_at", "updated_at"), row)) if row else None
+
+    def list_runs(self):
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT thread_id, input, status, error, created_at, updated_at FROM runs "
+                "ORDER BY updated_at DESC").fetchall()
+        return [dict(zip(("thread_id", "input", "status", "error", "created_at", "updated_at"), row)) for row in rows]
+
+    @staticmethod
+    def tool_key(tool_name, tool_input):
+        payload = json.dumps(tool_input, sort_keys=True, default=str)
+        return hashlib.sha256(f"{tool_name}\x00{payload}".encode('utf-8')).hexdigest()
+
+    def tool_output(self, tool_name, tool_input):
+        """
+        Returns the stored output of tool_name for this input, or None.
+        """
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT output FROM tool_results WHERE key = ?", (self.tool_key(tool_name, tool_input),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_tool_output(self, tool_name, tool_input, output):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO tool_results VALUES (?, ?, ?, ?)",
+                (self.tool_key(tool_name, tool_input), tool_name, json.dumps(output), time.time()))
+            self._connection.commit()
+
+    def gc(self, max_age):
+        """
+        Deletes runs (with their LangGraph checkpoints) and tool outputs not
+        touched in the last max_age seconds.
+
+        Returns:
+            dict: Number of runs and tool outputs deleted.
+        """
+        cutoff = time.time() - max_age
+        with self._lock:
+            thread_ids = [row[0] for row in self._connection.execute(
+                "SELECT thread_id FROM runs WHERE updated_at < ?", (cutoff,))]
+            tables = {row[0] for row in self._connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            for table in CHECKPOINT_TABLES:
+                if table in tables:
+                    self._connection.executemany(
+                        f"DELETE FROM {table} WHERE thread_id = ?", [(thread_id,) for thread_id in thread_ids])
+            self._connection.executemany("DELETE FROM runs WHERE thread_id = ?", [(thread_id,) for thread_id in thread_ids])
+            tool_results = self._connection.execute(
+                "DELETE FROM tool_results WHERE created_at < ?", (cutoff,)).rowcount
+            self._connection.commit()
+        return {"runs": len(thread_ids), "tool_results": tool_results}
@@ -0,0 +1,32 @@
+# Import-time profile for the CLI entry points (--profile-imports).  Imports
+# the given modules one after another and reports how many milliseconds each
+# added, i.e. the cost of that module and whatever it pulled in that was not
+# already loaded.
+import sys
+import time
+import importlib
+
+
+def profile_imports(module_names, out=sys.stdout):
+    """
+    Imports each module in order and prints a per-module millisecond report.
+
+    Returns:
+        dict: Module name -> milliseconds (None if the import failed).
+    """
+    timings = {}
+    for name in module_names:
+        already_loaded = name in sys.modules
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+            timings[name] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            timings[name] = None
+            print(f"  {name:<45} failed: {e}", file=out)
+            continue
+        note = " (already loaded)" if already_loaded else ""
+        print(f"  {name:<45} {timings[name]:>9.1f} ms{note}", file=out)
+    total = sum(ms for ms in timings.values() if ms is not None)
+    print(f"  {'total':<45} {total:>9.1f} ms", file=out)
+    return timings
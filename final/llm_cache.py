@@ -0,0 +1,144 @@
+# Content-addressed cache for Gemini responses shared by the ThreatModel and
+# ThreatIntelligence tools.  All of them call the model at temperature 0, so an
+# identical (model, temperature, safety settings, prompt) always gets the same
+# answer back and can be served from disk instead of the API.
+#
+# The cache plugs into LangChain's own LLM caching hook: pass `cache=get_llm_cache()`
+# when constructing GoogleGenerativeAI / ChatGoogleGenerativeAI.  LangChain hands
+# the cache the prompt together with an "llm_string" describing the model and
+# its parameters (model name, temperature, safety settings, stop words), and
+# both are hashed into the cache key.
+#
+# Configuration (environment variables):
+#   LLM_CACHE=0                 disable the cache
+#   LLM_CACHE_PATH              SQLite file (default: final/.llm_cache.db)
+#   LLM_CACHE_TTL               seconds an entry stays valid (default: 7 days, 0 = forever)
+#   LLM_CACHE_MAX_ENTRIES       entries kept before least recently used ones are evicted (default: 10000)
+#   LLM_CACHE_STATS=1           print hit/miss statistics to stderr on exit
+import os
+import sys
+import time
+import atexit
+import sqlite3
+import hashlib
+import threading
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_cache.db")
+
+
+class SQLiteResponseCache(BaseCache):
+    """
+    LangChain cache backed by SQLite with a time-to-live per entry and a cap on
+    the number of entries, evicting the least recently used ones first.
+    Hit and miss counts for the current process are kept in `hits`/`misses`.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=7 * 24 * 3600, max_entries=10000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+
+    @staticmethod
+    def key(prompt, llm_string):
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode('utf-8')).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._connection.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return loads(row[0])
+
+    def update(self, prompt, llm_string, return_val):
+        key = self.key(prompt, llm_string)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, dumps(return_val), now, now))
+            self._evict()
+            self._connection.commit()
+
+    def _evict(self):
+        if self.ttl:
+            self._connection.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl,))
+        (count,) = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,))
+
+    def clear(self, **kwargs):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+
+    def stats(self):
+        """
+        Returns the hit/miss counters for this process and the number of stored entries.
+        """
+        with self._lock:
+            (entries,) = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_cache = None
+
+
+def get_llm_cache():
+    """
+    Returns the process wide response cache configured from the environment,
+    or None when caching is disabled with LLM_CACHE=0.
+    """
+    global _cache
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    if _cache is None:
+        _cache = SQLiteResponseCache(
+            path=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH),
+            ttl=float(os.getenv("LLM_CACHE_TTL", 7 * 24 * 3600)),
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", 10000)),
+        )
+        if os.getenv("LLM_CACHE_STATS", "0") != "0":
+            atexit.register(print_cache_stats)
+    return _cache
+
+
+def print_cache_stats(file=None):
+    # stderr, since several CLIs write JSON or JSONL to stdout
+    if _cache is not None:
+        stats = _cache.stats()
+        print(f"[llm cache] {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate']:.0%} hit rate), {stats['entries']} entries stored", file=file or sys.stderr)
@@ -0,0 +1,388 @@
+# LangGraph orchestrator behind app.py.  app.py only imports this module once
+# it actually has a request to run, so `app.py --help` never pays for
+# langchain/langgraph imports.  The threat model and threat intelligence tools
+# import their modules on first use.
+from langchain.agents import Tool, create_react_agent
+from langchain_google_genai import ChatGoogleGenerativeAI, HarmCategory, HarmBlockThreshold
+# from langchain_community.utilities import GoogleSerperAPIWrapper
+import os
+import re
+import sys
+import time
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypedDict, Annotated, Union
+from langchain_core.agents import AgentAction, AgentFinish
+from langchain_core.messages import BaseMessage, get_buffer_string
+import operator
+from typing import TypedDict, Annotated
+from langchain_core.agents import AgentFinish
+from langgraph.prebuilt.tool_executor import ToolExecutor
+from langgraph.prebuilt import ToolInvocation
+from langgraph.graph import END, StateGraph
+from langchain_core.agents import AgentActionMessageLog
+# from ThreatIntelligence import get_user_selections, generate_scenario_google
+# from ThreatModel import generate_threat_model_google, threat_questions
+from langchain_core.messages import HumanMessage, SystemMessage
+import json
+from langchain.agents import AgentExecutor
+from langchain.agents.output_parsers import ReActSingleInputOutputParser
+from llm_cache import get_llm_cache
+from prompt_hub import pull_prompt
+from checkpoints import RunStore, get_checkpointer, new_thread_id
+
+FINAL_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_tool_module(subdirectory, module_name):
+    """
+    Imports one of the ThreatModel / ThreatIntelligence modules on first use.
+    Those modules import their siblings by bare name, so their directory goes on sys.path.
+    """
+    directory = os.path.join(FINAL_DIRECTORY, subdirectory)
+    if directory not in sys.path:
+        sys.path.append(directory)
+    return importlib.import_module(module_name)
+
+
+# Both tools ask the user questions before calling the LLM.  Each is split into
+# a prepare step (the questions, run on the main thread) and a generate step
+# (the LLM call), so that several tools can run their LLM calls in parallel.
+def prepare_intelligence(tool_input=""):
+    threat_scenario = import_tool_module("ThreatIntelligence", "threat_scenario")
+    directory = os.path.join(FINAL_DIRECTORY, "ThreatIntelligence")
+    attack_data = threat_scenario.open_attack_index(os.path.join(directory, "enterprise-attack.json"))
+    return threat_scenario.get_user_selections(os.path.join(directory, "groups.json"), attack_data)
+
+
+def generate_intelligence(selections):
+    threat_scenario = import_tool_module("ThreatIntelligence", "threat_scenario")
+    return threat_scenario.generate_scenario_google(selections)
+
+
+def run_intelligence(tool_input=""):
+    """
+    Main function to run when asked for creating threat scenarios
+
+    Returns:
+        str: The final generated scenario, or None if an error prevents scenario generation.
+    """
+    return generate_intelligence(prepare_intelligence(tool_input))
+
+
+def prepare_threat_model(tool_input=""):
+    ques = " Develop highly secure web application for a finance company to manage customer portfolios, handle transactions, and provide real-time financial analytics. This application must offer a responsive user interface, ensure seamless performance, and incorporate advanced security measures to safeguard sensitive financial data. The application will utilize ReactJS on the frontend to deliver a dynamic and responsive experience. The backend will be powered by Node.js to handle server-side logic, API integrations, and interactions with our MongoDB database, which will store user profiles, transaction records, and financial data. All stored data will be encrypted using AES, and SSL/TLS will be used to secure data transmission. The system will feature different access levels for administrators, financial advisors, and customers to ensure data security. The system will support initiating, processing, and reviewing transactions with comprehensive logging and auditing."
+    threat_model_module = import_tool_module("ThreatModel", "threat_model")
+    return threat_model_module.threat_questions(ques)
+
+
+def generate_threat_model(selections):
+    threat_model_module = import_tool_module("ThreatModel", "threat_model")
+    pipeline = import_tool_module("ThreatModel", "pipeline")
+    threats, improvement_suggestions = pipeline.ThreatModelPipeline().threat_model(pipeline.AppProfile(*selections))
+    response = threat_model_module.json_to_markdown([threat.to_dict() for threat in threats], improvement_suggestions)
+    return response
+
+
+def threat_model(tool_input=""):
+    """
+    Main function to run when asked for creating threat model
+    """
+    return generate_threat_model(prepare_threat_model(tool_input))
+
+
+# Tool name -> (prepare, generate) for the parallel action node
+TOOL_STAGES = {
+    "Model": (prepare_threat_model, generate_threat_model),
+    "Intelligence": (prepare_intelligence, generate_intelligence),
+}
+
+
+tools = [
+  Tool(
+        name="Model",
+        func=threat_model,
+        description="use to create threat models",
+    ),
+    Tool(
+        name="Intelligence",
+        func=run_intelligence,
+        description="Use to create threat scenarios",
+    )
+]
+
+base_prompt = pull_prompt("langchain-ai/react-agent-template")
+prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 4 tool calls. "
+                                          "When the request needs several independent tools (for example a threat "
+                                          "model and a threat scenario), give one Action / Action Input pair per "
+                                          "tool, one after another, before the Observation; they run in parallel.")
+
+llm = ChatGoogleGenerativeAI(
+    model="gemini-1.5-pro-latest",
+    temperature=0,
+    safety_settings={
+        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+    },
+    cache=get_llm_cache()
+)
+
+# Built once per process.  The graph below is the agent loop, so each "agent"
+# step calls the runnable directly (one LLM call that plans the next action
+# from the steps so far) instead of starting a fresh AgentExecutor loop.
+ACTION_BLOCK = re.compile(r"Action\s*\d*\s*:[\s]*(.*?)[\s]*Action\s*\d*\s*Input\s*\d*\s*:[\s]*(.*?)"
+                          r"(?=\n\s*(?:Thought|Action\s*\d*\s*:)|\Z)", re.DOTALL)
+
+
+class MultiActionOutputParser(ReActSingleInputOutputParser):
+    """
+    ReAct output parser that returns a list of AgentActions when the model
+    gives several Action / Action Input pairs in one response.  Each action's
+    log holds only its own block, so the scratchpad does not repeat the response.
+    """
+
+    def parse(self, text):
+        matches = list(ACTION_BLOCK.finditer(text))
+        if len(matches) < 2:
+            return super().parse(text)
+        actions = []
+        start = 0
+        for match in matches:
+            tool_input = match.group(2).strip().strip('"')
+            actions.append(AgentAction(match.group(1).strip(), tool_input, text[start:match.end()]))
+            start = match.end()
+        return actions
+
+
+agent_runnable = create_react_agent(llm, tools, prompt, output_parser=MultiActionOutputParser())
+
+# Number of most recent (action, observation) pairs shown to the agent
+MAX_INTERMEDIATE_STEPS = 5
+
+
+class AgentState(TypedDict):
+    input: str
+    chat_history: list[BaseMessage]
+    agent_outcome: Union[AgentAction, list[AgentAction], AgentFinish, None]
+    return_direct: bool
+    intermediate_steps: Annotated[list[tuple[AgentAction, str]], operator.add]
+
+
+tool_executor = ToolExecutor(tools)
+
+
+# Per-node timing / trace hooks.  Every hook is called as
+# hook(node_name, seconds, update) after a node returns; node_timings keeps
+# (node_name, seconds) for the current process.
+node_timings = []
+
+
+def print_node_timing(node_name, seconds, update):
+    print(f"[{node_name}] {seconds * 1000:.0f} ms")
+
+
+node_hooks = [print_node_timing]
+
+
+def timed_node(node_name, function):
+    """
+    Wraps a graph node so that its duration is recorded and passed to node_hooks.
+    """
+    def node(state):
+        start = time.perf_counter()
+        update = function(state)
+        seconds = time.perf_counter() - start
+        node_timings.append((node_name, seconds))
+        for hook in node_hooks:
+            hook(node_name, seconds, update)
+        return update
+    return node
+
+
+def run_agent(state):
+    """
+    Plans the next step: one call of the agent runnable with the input, the
+    chat history and the last MAX_INTERMEDIATE_STEPS intermediate steps.
+    """
+    inputs = {
+        "input": state["input"],
+        "chat_history": get_buffer_string(state.get("chat_history") or []),
+        "intermediate_steps": state.get("intermediate_steps", [])[-MAX_INTERMEDIATE_STEPS:],
+    }
+    agent_outcome = agent_runnable.invoke(inputs)
+    return {"agent_outcome": agent_outcome}
+
+
+run_store = RunStore()
+
+
+def plan_tool_call(action):
+    """
+    Runs the interactive prepare step of a tool, if it has one.
+
+    Returns:
+        tuple: (tool name, input the output is memoized by, function, argument).
+    """
+    if action.tool in TOOL_STAGES:
+        prepare, generate = TOOL_STAGES[action.tool]
+        selections = prepare(action.tool_input)
+        return action.tool, selections, generate, selections
+    invocation = ToolInvocation(tool=action.tool, tool_input=action.tool_input)
+    return action.tool, action.tool_input, tool_executor.invoke, invocation
+
+
+def memoized_tool_call(tool_name, key_input, function, argument):
+    """
+    Returns the stored output when this tool already completed with the same
+    input (in this run or an earlier one), otherwise runs it and stores the output.
+    """
+    output = run_store.tool_output(tool_name, key_input)
+    if output is not None:
+        print(f"[{tool_name}] reusing stored output")
+        return output
+    output = function(argument)
+    if output is not None:
+        run_store.save_tool_output(tool_name, key_input, output)
+    return output
+
+
+def execute_tools(state):
+    messages = [state['agent_outcome']]
+    last_message = messages[-1]
+    ######### human in the loop ###########
+    # human input y/n
+    # Get the most recent agent_outcome - this is the key added in the `agent` above
+    state_action = state['agent_outcome']
+    human_key = input(f"[y/n] continue with: {state_action}?")
+    if human_key == "n":
+        raise ValueError
+
+    tool_name, key_input, function, argument = plan_tool_call(last_message)
+    response = memoized_tool_call(tool_name, key_input, function, argument)
+    return {"intermediate_steps": [(state['agent_outcome'], response)]}
+
+
+def execute_tools_parallel(state):
+    """
+    Fan-out / fan-in for several independent actions from one agent step.
+    The tools' questions are asked one tool at a time on the main thread, then
+    every LLM call runs concurrently; the observations are merged back into
+    intermediate_steps in the order the agent gave the actions.
+    """
+    actions = state['agent_outcome']
+    human_key = input(f"[y/n] continue with: {[action.tool for action in actions]}?")
+    if human_key == "n":
+        raise ValueError
+
+    calls = [plan_tool_call(action) for action in actions]
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [executor.submit(memoized_tool_call, *call) for call in calls]
+        responses = [future.result() for future in futures]
+    return {"intermediate_steps": list(zip(actions, responses))}
+
+
+def should_continue(state):
+    last_message = state['agent_outcome']
+
+    if isinstance(last_message, AgentFinish):
+        return "end"
+    elif isinstance(last_message, list):
+        return "parallel"
+    else:
+        arguments = state["return_direct"]
+        if arguments is True:
+            return "final"
+        else:
+            return "continue"
+
+
+# def first_agent(inputs):
+#     action = AgentActionMessageLog(
+#         tool="Search",
+#         tool_input=inputs["input"],
+#         log="",
+#         message_log=[]
+#     )
+#     return {"agent_outcome": action}
+
+
+workflow = StateGraph(AgentState)
+
+workflow.add_node("agent", timed_node("agent", run_agent))
+workflow.add_node("action", timed_node("action", execute_tools))
+workflow.add_node("parallel_action", timed_node("parallel_action", execute_tools_parallel))
+workflow.add_node("final", timed_node("final", execute_tools))
+# uncomment if you want to always calls a certain tool first
+# workflow.add_node("first_agent", first_agent)
+
+
+workflow.set_entry_point("agent")
+# uncomment if you want to always calls a certain tool first
+# workflow.set_entry_point("first_agent")
+
+workflow.add_conditional_edges(
+    "agent", should_continue,
+    {"continue": "action", "parallel": "parallel_action", "final": "final", "end": END})
+
+
+workflow.add_edge('action', 'agent')
+workflow.add_edge('parallel_action', 'agent')
+workflow.add_edge('final', END)
+# uncomment if you want to always calls a certain tool first
+# workflow.add_edge('first_agent', 'action')
+# Every node's output is checkpointed per thread id, see checkpoints.py
+chain = workflow.compile(checkpointer=get_checkpointer())
+
+
+def run(request, thread_id=None):
+    """
+    Runs the graph for a request under a thread id (a new one by default), so
+    that it can be resumed if it fails.
+
+    Returns:
+        tuple: (thread id, final state).
+    """
+    thread_id = thread_id or new_thread_id()
+    run_store.start_run(thread_id, request)
+    print(f"[run {thread_id}]")
+    return thread_id, _invoke(thread_id, {"input": request, "chat_history": [], "return_direct": False})
+
+
+def resume(thread_id):
+    """
+    Continues a run from its last completed node.
+    """
+    if run_store.get_run(thread_id) is None:
+        raise ValueError(f"Unknown run: {thread_id}")
+    run_store.start_run(thread_id, run_store.get_run(thread_id)["input"])
+    return thread_id, _invoke(thread_id, None)
+
+
+def _invoke(thread_id, inputs):
+    try:
+        result = chain.invoke(inputs, {"configurable": {"thread_id": thread_id}})
+    except BaseException as e:
+        run_store.finish_run(thread_id, "failed", repr(e))
+        raise
+    run_store.finish_run(thread_id, "completed")
+    return result
+
+
+# The following functions interoperate between the top level graph state
+# and the state of the research sub-graph
+# this makes it so that the states of each graph don't get intermixed
+# def enter_chain(message: str):
+
+#   results = {
+#         "messages": [HumanMessage(content=message)],
+#     }
+#   return results
+
+# research_chain = enter_chain | chain
+
+# for s in research_chain.stream(
+#     {"input": "create a threat model using threat modelling tool"}, {"recursion_limit": 100}
+# ):
+#     if "__end__" not in s:
+#         print(s)
+#         print("---")
@@ -0,0 +1,43 @@
+# Local stand-in for langchain's hub.pull.  Pulling a prompt from the hub costs
+# a network round trip (and importing langchain.hub) on every start, before a
+# tool can do anything.  pull_prompt looks in three places, in order:
+#   1. prompts vendored in final/prompts/ (the react agent template),
+#   2. a local cache of prompts pulled earlier (PROMPT_CACHE_DIR,
+#      default ~/.cache/gen-security/prompts),
+#   3. the hub itself; the result is then written to the cache.
+import os
+import json
+
+VENDORED_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+VENDORED_PROMPTS = {
+    "langchain-ai/react-agent-template": "react-agent-template.json",
+}
+CACHE_DIRECTORY = os.getenv("PROMPT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "gen-security", "prompts"))
+
+
+def _cache_path(name):
+    return os.path.join(CACHE_DIRECTORY, name.replace("/", "__") + ".json")
+
+
+def pull_prompt(name):
+    """
+    Returns the named hub prompt, from the vendored copy or local cache when possible.
+    """
+    if name in VENDORED_PROMPTS:
+        from langchain_core.prompts import PromptTemplate
+        with open(os.path.join(VENDORED_DIRECTORY, VENDORED_PROMPTS[name]), 'r') as file:
+            vendored = json.load(file)
+        return PromptTemplate.from_template(vendored["template"], partial_variables=vendored.get("partial_variables", {}))
+
+    from langchain_core.load import dumps, loads
+    cache_path = _cache_path(name)
+    if os.path.exists(cache_path):
+        with open(cache_path, 'r') as file:
+            return loads(file.read())
+
+    from langchain import hub
+    prompt = hub.pull(name)
+    os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+    with open(cache_path, 'w') as file:
+        file.write(dumps(prompt))
+    return prompt
@@ -1,6 +1,5 @@
 from langchain_google_genai import GoogleGenerativeAI
 from langchain.agents import load_tools, AgentType
-from langchain import hub
 from langchain.agents import tool
 from langchain.agents import initialize_agent
 from langchain_community.tools import E2BDataAnalysisTool
@@ -63,8 +62,6 @@ e2b_data_analysis_tool = E2BDataAnalysisTool(
 os.environ["E2B_API_KEY"] = os.getenv('E2B_API_KEY')
 
 llm = GoogleGenerativeAI(model="gemini-pro",temperature=0)
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-prompt = base_prompt.partial(instructions="Answer the user's request utilizing at most 8 tool calls")
 
 
 class E2BDataAnalysisToolArguments(BaseModel):
@@ -0,0 +1,359 @@
+# Content-addressed cache of downloaded package archives.  Release files on a
+# package index never change once uploaded, so an archive is downloaded once
+# per (name, version, sha256) and every later scan of that version is served
+# from disk: a pinned version that was fetched before needs no request to the
+# index at all.
+#
+#   - Downloads stream in 1 MB chunks and are hashed as they are written; the
+#     archive is only kept if its sha256 matches the digest the index publishes.
+#   - Archives are stored as <root>/<sha256[:2]>/<sha256>/<filename> and
+#     recorded in an SQLite index by name, version, filename and URL.
+#   - Extraction is lazy: Artifact.extract only unpacks the members it is asked
+#     for (the files guarddog flagged) into <root>/.../<sha256>/files/, and
+#     members already there are not extracted again.
+#
+# `python artifact_cache.py serve DIRECTORY` serves a directory of sdists as a
+# stand-in package index (the PyPI JSON API and the files), for testing:
+#
+#     python artifact_cache.py serve ./sdists --port 8765 &
+#     PACKAGE_INDEX_URL=http://127.0.0.1:8765/pypi python batch_scan.py requirements.txt --review
+#
+# Configuration (environment variables):
+#   ARTIFACT_CACHE_DIR   cache directory (default: hw4/.artifact_cache)
+#   PACKAGE_INDEX_URL    JSON API of the package index (default: https://pypi.org/pypi)
+import os
+import sys
+import json
+import time
+import shutil
+import sqlite3
+import hashlib
+import zipfile
+import tarfile
+import argparse
+import tempfile
+import threading
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+import package_scan
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".artifact_cache")
+CHUNK_SIZE = 1024 * 1024
+
+
+def safe_member_path(name):
+    """
+    Returns the normalised relative path of an archive member, or None if it
+    would be written outside the extraction directory.
+    """
+    path = os.path.normpath(name.replace("\\", "/"))
+    if os.path.isabs(path) or path == ".." or path.startswith("../") or path == ".":
+        return None
+    return path
+
+
+@dataclass
+class Artifact:
+    """
+    A verified archive in the cache.  `directory` is where its members are extracted.
+    """
+    name: str
+    version: str
+    filename: str
+    url: str
+    sha256: str
+    path: str
+
+    @property
+    def directory(self):
+        return os.path.join(os.path.dirname(self.path), "files")
+
+    def _open(self):
+        if zipfile.is_zipfile(self.path):
+            archive = zipfile.ZipFile(self.path)
+            return archive, ((info.filename, info) for info in archive.infolist() if not info.is_dir())
+        archive = tarfile.open(self.path, 'r:*')
+        return archive, ((member.name, member) for member in archive if member.isfile())
+
+    def members(self):
+        """
+        The names of the regular files in the archive.
+        """
+        archive, members = self._open()
+        with archive:
+            return [name for name, _ in members]
+
+    def extract(self, members=None):
+        """
+        Extracts the given members (all of them when None) into `directory`,
+        skipping those that are already there; the archive is not opened at all
+        when every member has been extracted before.
+
+        Returns:
+            list: The local paths of the requested members that exist in the archive.
+        """
+        # A full extraction leaves the member list behind, so it is not read from the archive again
+        complete = os.path.join(self.directory, ".complete")
+        if members is None and os.path.exists(complete):
+            with open(complete, 'r') as file:
+                return json.load(file)
+        wanted = None if members is None else {safe_member_path(member) for member in members} - {None}
+        if wanted is not None and all(os.path.exists(os.path.join(self.directory, member)) for member in wanted):
+            return [os.path.join(self.directory, member) for member in sorted(wanted)]
+
+        extracted = []
+        archive, entries = self._open()
+        with archive:
+            for name, entry in entries:
+                member = safe_member_path(name)
+                if member is None or (wanted is not None and member not in wanted):
+                    continue
+                target = os.path.join(self.directory, member)
+                extracted.append(target)
+                if os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                source = archive.open(entry) if isinstance(archive, zipfile.ZipFile) else archive.extractfile(entry)
+                # Write under a temporary name, so a concurrent or interrupted extraction never leaves half a file
+                with source, tempfile.NamedTemporaryFile(dir=os.path.dirname(target), delete=False) as file:
+                    shutil.copyfileobj(source, file, CHUNK_SIZE)
+                os.replace(file.name, target)
+        if members is None:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(complete, 'w') as file:
+                json.dump(sorted(extracted), file)
+        return sorted(extracted)
+
+    def read(self, member):
+        """
+        The text of one member, extracting it if needed.
+        """
+        paths = self.extract([member])
+        if not paths:
+            raise KeyError(f"{member} is not in {self.filename}")
+        with open(paths[0], 'r', errors='replace') as file:
+            return file.read()
+
+
+class ArtifactCache:
+    """
+    Downloads and verifies release archives once, by name, version and sha256.
+
+    Args:
+        root: Cache directory (default: ARTIFACT_CACHE_DIR or hw4/.artifact_cache).
+        index_url: Package index JSON API (default: package_scan.PYPI_URL, i.e. PACKAGE_INDEX_URL).
+    """
+
+    def __init__(self, root=None, index_url=None):
+        self.root = root or os.getenv("ARTIFACT_CACHE_DIR", DEFAULT_CACHE_DIR)
+        self.index_url = index_url or package_scan.PYPI_URL
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(os.path.join(self.root, "index.db"), check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS artifacts (
+                name TEXT NOT NULL,
+                version TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                url TEXT NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (name, version, filename)
+            )""")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS artifacts_url ON artifacts (url)")
+        self._connection.commit()
+
+    def _blob_path(self, sha256, filename):
+        return os.path.join(self.root, sha256[:2], sha256, filename)
+
+    def _artifact(self, row):
+        name, version, filename, url, sha256 = row[:5]
+        return Artifact(name, version, filename, url, sha256, self._blob_path(sha256, filename))
+
+    def _cached(self, query, parameters):
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT name, version, filename, url, sha256 FROM artifacts WHERE {query}", parameters).fetchall()
+        for row in rows:
+            artifact = self._artifact(row)
+            if os.path.exists(artifact.path):
+                return artifact
+        return None
+
+    def lookup(self, name, version, archive_directory=None):
+        """
+        The cached artifact of a release, or None.  With archive_directory, the
+        file named after it (as find_download_url picks it).
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT name, version, filename, url, sha256 FROM artifacts WHERE name = ? AND version = ?",
+                (package_scan.normalize_name(name), version)).fetchall()
+        files = [{"filename": row[2], "packagetype": "sdist" if row[2].endswith(".tar.gz") else "", "row": row}
+                 for row in rows
+                 if os.path.exists(self._blob_path(row[4], row[2]))]
+        file = package_scan.find_download_url(files, archive_directory)
+        return self._artifact(file["row"]) if file else None
+
+    def fetch(self, name, version=None, archive_directory=None):
+        """
+        Returns the verified artifact of a release, from the cache when a pinned
+        version was fetched before, otherwise looked up in the index and downloaded.
+
+        Raises:
+            package_scan.ScanError: If the release has no matching file, the
+            download fails or its hash does not match the index.
+        """
+        if version:
+            artifact = self.lookup(name, version, archive_directory)
+            if artifact:
+                self.hits += 1
+                return artifact
+        version, files = package_scan.release_files(name, version, self.index_url)
+        file = package_scan.find_download_url(files, archive_directory)
+        if file is None:
+            raise package_scan.ScanError(f"{name} {version} has no source distribution")
+        return self.fetch_file(name, version, file["filename"], file["url"], file.get("digests", {}).get("sha256"))
+
+    def fetch_url(self, url, sha256=None):
+        """
+        Returns the artifact of a release file URL, downloading it only if the URL was never fetched.
+        """
+        artifact = self._cached("url = ?", (url,))
+        if artifact and (sha256 is None or artifact.sha256 == sha256):
+            self.hits += 1
+            return artifact
+        filename = url.split("/")[-1].split("#")[0]
+        return self.fetch_file(*sdist_release(filename), filename, url, sha256)
+
+    def fetch_file(self, name, version, filename, url, sha256=None):
+        """
+        Downloads one release file unless the blob with its hash is already cached.
+        """
+        name = package_scan.normalize_name(name)
+        if sha256 and os.path.exists(self._blob_path(sha256, filename)):
+            self.hits += 1
+            self._record(name, version, filename, url, sha256, os.path.getsize(self._blob_path(sha256, filename)))
+            return Artifact(name, version, filename, url, sha256, self._blob_path(sha256, filename))
+
+        self.misses += 1
+        digest = hashlib.sha256()
+        size = 0
+        file = tempfile.NamedTemporaryFile(dir=self.root, delete=False)
+        try:
+            with file, requests.get(url, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            if sha256 and digest.hexdigest() != sha256:
+                raise package_scan.ScanError(
+                    f"{filename}: sha256 {digest.hexdigest()} does not match the index ({sha256})")
+            sha256 = digest.hexdigest()
+            path = self._blob_path(sha256, filename)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(file.name, path)
+        except requests.exceptions.RequestException as e:
+            raise package_scan.ScanError(f"Error downloading {filename}: {e}") from e
+        finally:
+            if os.path.exists(file.name):
+                os.remove(file.name)
+        self._record(name, version, filename, url, sha256, size)
+        return Artifact(name, version, filename, url, sha256, path)
+
+    def _record(self, name, version, filename, url, sha256, size):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO artifacts (name, version, filename, url, sha256, size, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", (name, version, filename, url, sha256, size, time.time()))
+            self._connection.commit()
+
+
+def sdist_release(filename):
+    # "some_package-1.0.tar.gz" -> ("some-package", "1.0")
+    stem = filename[:-len(".tar.gz")] if filename.endswith(".tar.gz") else os.path.splitext(filename)[0]
+    name, _, version = stem.rpartition("-")
+    return package_scan.normalize_name(name), version
+
+
+def index_handler(directory):
+    """
+    A request handler serving the sdists in `directory` like PyPI: /pypi/<name>/json,
+    /pypi/<name>/<version>/json and the files under /files/.
+    """
+    releases = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith((".tar.gz", ".zip")):
+            with open(os.path.join(directory, filename), 'rb') as file:
+                sha256 = hashlib.file_digest(file, "sha256").hexdigest()
+            name, version = sdist_release(filename)
+            releases.setdefault(name, {}).setdefault(version, []).append((filename, sha256))
+
+    class IndexHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            parts = self.path.strip("/").split("/")
+            if parts[0] == "files" and len(parts) == 2 and os.path.exists(os.path.join(directory, parts[1])):
+                with open(os.path.join(directory, parts[1]), 'rb') as file:
+                    body = file.read()
+                return self._send(body, "application/octet-stream")
+            if parts[0] == "pypi" and parts[-1] == "json" and len(parts) in (3, 4):
+                name = package_scan.normalize_name(parts[1])
+                versions = releases.get(name, {})
+                version = parts[2] if len(parts) == 4 else max(versions, default=None, key=version_key)
+                if version in versions:
+                    host = f"http://{self.headers.get('Host', '127.0.0.1')}"
+                    urls = [{"filename": filename, "url": f"{host}/files/{filename}", "digests": {"sha256": sha256},
+                             "packagetype": "sdist" if filename.endswith(".tar.gz") else "bdist_wheel"}
+                            for filename, sha256 in versions[version]]
+                    body = json.dumps({"info": {"name": name, "version": version}, "urls": urls}).encode()
+                    return self._send(body, "application/json")
+            self.send_error(404)
+
+        def _send(self, body, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return IndexHandler
+
+
+def version_key(version):
+    return [int(part) if part.isdigit() else -1 for part in version.split(".")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Package artifact cache.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    fetch = commands.add_parser("fetch", help="Fetch a release into the cache and extract members")
+    fetch.add_argument("name")
+    fetch.add_argument("version", nargs="?")
+    fetch.add_argument("-m", "--member", action="append", help="Member to extract (default: all)")
+    serve = commands.add_parser("serve", help="Serve a directory of sdists as a stand-in package index")
+    serve.add_argument("directory")
+    serve.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        server = ThreadingHTTPServer(("127.0.0.1", args.port), index_handler(args.directory))
+        print(f"Serving {args.directory} at http://127.0.0.1:{args.port}/pypi", file=sys.stderr)
+        server.serve_forever()
+    else:
+        cache = ArtifactCache()
+        start = time.perf_counter()
+        artifact = cache.fetch(args.name, args.version)
+        for path in artifact.extract(args.member):
+            print(path)
+        print(f"{artifact.filename} sha256 {artifact.sha256} ({'cached' if cache.hits else 'downloaded'}, "
+              f"{time.perf_counter() - start:.3f}s)", file=sys.stderr)
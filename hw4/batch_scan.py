@@ -0,0 +1,357 @@
+# Batch mode of the malware analyzer: vets every dependency of a project in one
+# run, without the agent.  The agent in app.py decides step by step what to do
+# with one package; for a dependency list the steps are always the same, so
+# they run directly from package_scan:
+#
+#     guarddog scan -> (if flagged) PyPI JSON API -> download -> LLM review
+#
+# Packages are scanned by a bounded pool of worker threads (the steps wait on
+# guarddog, the network or the LLM), releases are fetched through the
+# artifact cache (artifact_cache.py), and LLM reviews are limited separately
+# since they are the slowest and most rate limited step.  The results are
+# collected into one JSON or SARIF report with per-package, per-step timings:
+#
+#     python batch_scan.py requirements.txt -j 8 --review -f sarif -o report.sarif
+#
+# Requirements files (pinned with ==, -r includes are followed), poetry.lock,
+# uv.lock, pdm.lock and Pipfile.lock are accepted.  Unpinned requirements (and
+# wildcard pins such as ==1.*) are scanned at their latest version.
+import os
+import re
+import sys
+import json
+import time
+import tomllib
+import argparse
+import threading
+from dataclasses import dataclass, field, asdict
+from concurrent.futures import ThreadPoolExecutor
+import package_scan
+from artifact_cache import ArtifactCache
+from code_review import ReviewEngine
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+# Reviews scoring at least this are reported as errors in SARIF, lower ones as notes
+MALWARE_THRESHOLD = 0.5
+
+
+@dataclass
+class Requirement:
+    name: str
+    version: str = None
+
+    def __str__(self):
+        return f"{self.name}=={self.version}" if self.version else self.name
+
+
+@dataclass
+class PackageResult:
+    name: str
+    version: str = None
+    issues: int = 0
+    findings: list = field(default_factory=list)
+    metadata: dict = field(default_factory=dict)
+    download_url: str = None
+    review: dict = None
+    timings: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    @property
+    def flagged(self):
+        return bool(self.findings or self.metadata)
+
+    def to_dict(self):
+        return asdict(self)
+
+
+def parse_requirement_line(line):
+    """
+    Returns the Requirement of one requirements file line, or None for lines
+    that do not name a package from the index (options, URLs, local paths).
+    """
+    line = line.split(" #")[0].split(";")[0].strip()
+    match = re.match(r"([A-Za-z0-9][A-Za-z0-9._-]*)\s*(\[[^\]]*\])?\s*(.*)", line)
+    if not match or "://" in line or line.startswith((".", "/")):
+        return None
+    pinned = re.match(r"===?\s*([^\s,*]+)$", match.group(3).strip())
+    # A wildcard (numpy==1.*) is a range, not a pin; it is scanned at the latest version
+    return Requirement(match.group(1), pinned.group(1) if pinned else None)
+
+
+def parse_requirements_file(path, seen=None):
+    seen = seen if seen is not None else set()
+    if os.path.abspath(path) in seen:
+        return []
+    seen.add(os.path.abspath(path))
+    with open(path, 'r') as file:
+        # Join continuation lines (long --hash lists)
+        lines = file.read().replace("\\\n", " ").splitlines()
+    requirements = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        option = re.match(r"(-r|--requirement)[\s=]+(\S+)", line)
+        if option:
+            included = os.path.join(os.path.dirname(path), option.group(2))
+            requirements.extend(parse_requirements_file(included, seen))
+        elif not line.startswith("-"):
+            requirement = parse_requirement_line(re.sub(r"\s--hash[=\s]\S+", "", line))
+            if requirement:
+                requirements.append(requirement)
+    return requirements
+
+
+def parse_lockfile(path):
+    name = os.path.basename(path)
+    if name == "Pipfile.lock":
+        with open(path, 'r') as file:
+            data = json.load(file)
+        return [Requirement(package, spec.get("version", "").lstrip("=") or None)
+                for section in ("default", "develop") for package, spec in data.get(section, {}).items()
+                if "version" in spec]
+    with open(path, 'rb') as file:
+        data = tomllib.load(file)
+    requirements = []
+    for package in data.get("package", []):
+        source = package.get("source") or {}
+        # Skip the project itself and git / path / URL dependencies, guarddog scans index releases
+        if (source.get("type") in ("git", "directory", "file", "url")
+                or (source and "registry" not in source and "type" not in source)):
+            continue
+        requirements.append(Requirement(package["name"], package.get("version")))
+    return requirements
+
+
+def parse_requirements(path):
+    """
+    Reads the packages to scan from a requirements file or lockfile, once per project.
+
+    Returns:
+        list: Requirement per package, in file order.
+    """
+    if os.path.basename(path) in ("poetry.lock", "uv.lock", "pdm.lock", "Pipfile.lock"):
+        requirements = parse_lockfile(path)
+    else:
+        requirements = parse_requirements_file(path)
+    unique = {}
+    for requirement in requirements:
+        unique.setdefault(package_scan.normalize_name(requirement.name), requirement)
+    return list(unique.values())
+
+
+class BatchScanner:
+    """
+    Scans packages with guarddog and, for the flagged ones, downloads the
+    release and optionally has the LLM review the flagged files.
+
+    Args:
+        review: Download flagged releases and review the files guarddog flagged with the LLM.
+        llm: LLM for the reviews (default: package_scan.get_review_llm()).
+        llm_jobs: Packages under LLM review at the same time, across all workers
+                  (each reviews up to REVIEW_MAX_CONCURRENCY chunks at once).
+        cache: artifact_cache.ArtifactCache the releases are fetched through (default: ARTIFACT_CACHE_DIR).
+    """
+
+    def __init__(self, review=False, llm=None, llm_jobs=2, cache=None):
+        self.review = review
+        self.llm = llm
+        self.cache = cache or ArtifactCache()
+        self._engine = None
+        self._llm_slots = threading.Semaphore(llm_jobs)
+        self._llm_lock = threading.Lock()
+
+    def _timed(self, result, stage, function, *args):
+        start = time.perf_counter()
+        try:
+            return function(*args)
+        except Exception as e:
+            result.errors[stage] = str(e)
+            return None
+        finally:
+            result.timings[stage] = round(time.perf_counter() - start, 3)
+
+    def _review_engine(self):
+        with self._llm_lock:
+            if self._engine is None:
+                self._engine = ReviewEngine(self.llm)
+            return self._engine
+
+    def review_files(self, artifact, members, findings):
+        """
+        Reviews the flagged files of a release with the chunked review engine,
+        most suspicious chunks (those guarddog flagged) first.
+        """
+        files = {member: os.path.join(artifact.directory, member) for member in sorted(set(members))
+                 if os.path.exists(os.path.join(artifact.directory, member))}
+        engine = self._review_engine()
+        with self._llm_slots:
+            return engine.review_files(files, findings)
+
+    def scan(self, requirement):
+        """
+        Returns:
+            PackageResult: The findings of one package, with per-step timings;
+            failed steps are listed in `errors`.
+        """
+        result = PackageResult(name=requirement.name, version=requirement.version)
+        start = time.perf_counter()
+        report = self._timed(result, "guarddog", package_scan.guarddog_scan, requirement.name, requirement.version)
+        if report is not None:
+            result.issues = report.get("issues", 0)
+            result.findings = package_scan.guarddog_findings(report)
+            result.metadata = package_scan.metadata_findings(report)
+        archive = result.findings[0]["path"].split("/")[0] if result.findings else None
+        if result.findings and self.review:
+            # Served from the artifact cache when this version was fetched before
+            artifact = self._timed(result, "download", self.cache.fetch, requirement.name, requirement.version, archive)
+            if artifact:
+                result.version, result.download_url = artifact.version, artifact.url
+                members = [finding["path"] for finding in result.findings]
+                if self._timed(result, "extract", artifact.extract, members):
+                    result.review = self._timed(result, "review", self.review_files, artifact, members, result.findings)
+        elif result.flagged:
+            release = self._timed(result, "metadata", package_scan.release_files,
+                                  requirement.name, requirement.version, self.cache.index_url)
+            if release:
+                result.version, files = release
+                file = package_scan.find_download_url(files, archive)
+                if file is None:
+                    result.errors["metadata"] = "The release has no source distribution"
+                else:
+                    result.download_url = file["url"]
+        result.timings["total"] = round(time.perf_counter() - start, 3)
+        return result
+
+    def run_many(self, requirements, max_workers=8):
+        """
+        Scans several packages concurrently, yielding results in input order.
+        """
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            yield from executor.map(self.scan, requirements)
+
+
+def json_report(results, source, seconds):
+    return {
+        "source": source,
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "summary": {
+            "packages": len(results),
+            "flagged": sum(result.flagged for result in results),
+            "failed": sum(not result.ok for result in results),
+            "seconds": round(seconds, 3),
+        },
+        "packages": [result.to_dict() for result in results],
+    }
+
+
+def sarif_report(results, source, seconds):
+    """
+    The results as a SARIF 2.1.0 log: a result per guarddog finding, metadata
+    finding and LLM review; per-package timings and errors go in the run's properties.
+    """
+    rules = {}
+    sarif_results = []
+    for result in results:
+        package = {"package": result.name, "version": result.version}
+        for finding in result.findings:
+            rules.setdefault(finding["rule"], finding["message"])
+            sarif_results.append({
+                "ruleId": finding["rule"],
+                "level": "warning",
+                "message": {"text": f"{result.name}: {finding['message']}"},
+                "locations": [{"physicalLocation": {
+                    "artifactLocation": {"uri": finding["path"]},
+                    "region": {"startLine": max(finding["line"], 1), "snippet": {"text": finding["code"]}},
+                }}],
+                "properties": package,
+            })
+        for rule, message in result.metadata.items():
+            rules.setdefault(rule, rule)
+            sarif_results.append({
+                "ruleId": rule,
+                "level": "warning",
+                "message": {"text": f"{result.name}: {message}"},
+                "locations": [{"logicalLocations": [{"name": str(Requirement(result.name, result.version)),
+                                                     "kind": "package"}]}],
+                "properties": package,
+            })
+        if result.review:
+            rules.setdefault("llm-review", "LLM review of the files guarddog flagged")
+            malware = result.review.get("malware") or 0.0
+            sarif_results.append({
+                "ruleId": "llm-review",
+                "level": "error" if malware >= MALWARE_THRESHOLD else "note",
+                "message": {"text": f"{result.name}: {result.review.get('conclusion', 'no conclusion')}"},
+                "locations": [{"logicalLocations": [{"name": str(Requirement(result.name, result.version)),
+                                                     "kind": "package"}]}],
+                "properties": {**package, **{key: result.review.get(key) for key in package_scan.SCORE_KEYS}},
+            })
+    return {
+        "$schema": SARIF_SCHEMA,
+        "version": "2.1.0",
+        "runs": [{
+            "tool": {"driver": {
+                "name": "guarddog",
+                "informationUri": "https://github.com/DataDog/guarddog",
+                "rules": [{"id": rule, "shortDescription": {"text": description}}
+                          for rule, description in rules.items()],
+            }},
+            "invocations": [{
+                "executionSuccessful": all(result.ok for result in results),
+                "toolExecutionNotifications": [
+                    {"level": "error", "message": {"text": f"{result.name} ({stage}): {error}"}}
+                    for result in results for stage, error in result.errors.items()],
+            }],
+            "results": sarif_results,
+            "properties": {
+                "source": source,
+                "seconds": round(seconds, 3),
+                "timings": {result.name: result.timings for result in results},
+            },
+        }],
+    }
+
+
+REPORTS = {
+    "json": json_report,
+    "sarif": sarif_report,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scan every package of a requirements file or lockfile.")
+    parser.add_argument("requirements", help="requirements.txt, poetry.lock, uv.lock, pdm.lock or Pipfile.lock")
+    parser.add_argument("-o", "--output", default="-", help="Report file (default: stdout)")
+    parser.add_argument("-f", "--format", choices=sorted(REPORTS), default="json", help="Report format")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="Packages scanned concurrently")
+    parser.add_argument("--review", action="store_true",
+                        help="Download flagged packages and have the LLM review the flagged files")
+    parser.add_argument("--llm-jobs", type=int, default=2, help="LLM reviews running concurrently")
+    args = parser.parse_args()
+
+    requirements = parse_requirements(args.requirements)
+    scanner = BatchScanner(review=args.review, llm_jobs=args.llm_jobs)
+    start = time.perf_counter()
+    results = []
+    for result in scanner.run_many(requirements, max_workers=args.jobs):
+        results.append(result)
+        status = "error" if not result.ok else "flagged" if result.flagged else "ok"
+        print(f"{Requirement(result.name, result.version)}: {status} ({result.timings['total']}s)", file=sys.stderr)
+    report = REPORTS[args.format](results, args.requirements, time.perf_counter() - start)
+
+    output = sys.stdout if args.output == "-" else open(args.output, 'w')
+    try:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    flagged = sum(result.flagged for result in results)
+    failed = sum(not result.ok for result in results)
+    print(f"{len(results)} packages scanned, {flagged} flagged, {failed} failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
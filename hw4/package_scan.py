@@ -0,0 +1,179 @@
+# The deterministic steps of a package scan, shared by the interactive agent
+# (app.py) and the batch scanner (batch_scan.py):
+#   - guarddog_scan runs `guarddog pypi scan` with JSON output,
+#   - release_files / find_download_url look the release up in the PyPI JSON
+#     API instead of scraping the project's HTML page,
+#   - fetching and extracting the release is artifact_cache.py's job,
+#   - review_chain sends code to the LLM with the secureGPT prompt and
+#     parse_review reads its scores (code_review.py splits large packages
+#     into chunks for it).
+# LangChain is only imported by the steps that need it, so a batch scan
+# without LLM review does not pay for it.
+import os
+import re
+import json
+import subprocess
+import requests
+
+# JSON API of the package index; point it at a mirror or `artifact_cache.py serve`
+PYPI_URL = os.getenv("PACKAGE_INDEX_URL", "https://pypi.org/pypi")
+REVIEW_MODEL = "gemini-1.5-pro-latest"
+SCORE_KEYS = ("confidence", "obfuscated", "malware", "securityRisk")
+
+#Prompt taken from https://arxiv.org/html/2403.12196v1#S5 : System Role Prompt of Initial Report
+REVIEW_PROMPT = """
+        Task: As secureGPT, a python cybersecurity analyst, your task is to review code for potentially malicious behavior or sabotage. This code review is specifically for python libraries that are part of larger projects and published on public package managers such as Pypi. Review this code for supply chain security attacks, malicious behavior, and other security risks. Keep in mind the following: Analyse code for python security issues such as code injection, data leakage, insecure use of environment variables, unsafe SQL, and random number generation. Do NOT alert on minified code that is result of standard minification process.Third party library usage is not by itself suspicious behavior. Here are some guidelines that you follow.
+
+        Guidelines: Spot anomalies: hard-coded credentials, backdoors, unusual behaviors, or malicious code. Watch out for malicious privacy violations, credential theft, and information leaks. Note observations about the code. Evaluate the provided file only. Indicate low confidence if more info is needed. Avoid false positives and unnecessary warnings. Keep signals and reports succinct and clear. Consider user intent and the threat model when reasoning about signals. Focus on suspicious parts of the code.
+
+        What is Malware? In the context of an python package, malware refers to any code intentionally included in the package that is designed to harm, disrupt, or perform unauthorized actions on the system where the package is installed. Example: Sending System Data Over the Network Connecting to suspicious domains, Damaging system files, Mining cryptocurrency without consent, Reverse shells, Data theft (clipboard, env vars, etc), Hidden backdoors.
+
+        Security risks to consider in the code are Hardcoded credentials, Security mistakes, SQL injection, DO NOT speculate about vulnerabilities outside this module. There might also be Obfuscated code like Uncommon language features, Unnecessary dynamic execution, Misleading variables, DO NOT report minified code as obfuscated.
+
+        Malware score: - 0: No malicious intent, 0 - 0.25: Low possibility of malicious intent, 0.25 - 0.5: Possibly malicious behavior, 0.5 - 0.75: Likely malicious behavior, e.g., tracking scripts, 0.75 - 1: High probability of malicious behavior; do not use.
+
+        Security Risk Score: 0 - 0.25: No significant threat; we can safely ignore, 0.25 - 0.5: Security warning, no immediate danger, 0.5 - 0.75: Security alert should be reviewed, 0.75 - 1: Extremely dangerous, package should not be used.
+
+        Confidence Score: Rate your confidence in your conclusion about whether the code is obfuscated, whether it contains malware and the overall security risk on a scale from 0 to 1.
+
+        Code review: Please consider both the content of the code as well as the structure and format when determining the risks.Your analysis should include the following steps:
+        Identify sources: These are places where the code reads input or data.
+        Identify sinks: These are places where untrusted data can lead to potential security vulnerabilities. Identify flows: These are source-to-sink paths.
+        Identify anomalies: These are places where there is unusual code, hardcoded secrets, etc.
+        Conclusion: Finally, form the conclusion of the code, provide a succinct explanation of your reasoning.
+
+        JSON Response: **Only respond in this format:** ["purpose": "Purpose of this source code", "sources": "Places where code reads input or data", "sinks": "Places where untrusted data can lead to potential data leak or effect", "flows": "Source- to-sink paths", "anomalies": "Places where code does anything unusual", "analysis": "Step-by-step analysis of the entire code fragment.", "conclusion": "Conclusions and short summary of your findings", "confidence": 0-1, "obfuscated": 0-1, "malware": 0-1, "securityRisk": 0-1]
+        ONLY RESPOND IN JSON. No non-JSON text responses. Work through this step-by-step to ensure accuracy in the evaluation process.
+
+        {text}
+        """
+
+
+class ScanError(RuntimeError):
+    """
+    Raised when a deterministic scan step fails (guarddog, the package index, a download).
+    """
+
+
+def normalize_name(name):
+    # PEP 503: names differing only in case and runs of -, _ and . are the same project
+    return re.sub(r"[-_.]+", "-", name).lower()
+
+
+def guarddog_scan(package, version=None, timeout=600):
+    """
+    Runs `guarddog pypi scan` on a package.
+
+    Returns:
+        dict: guarddog's JSON report ("issues", "errors", "results", ...).
+
+    Raises:
+        ScanError: If guarddog fails or its output is not JSON.
+    """
+    command = ["guarddog", "pypi", "scan", package, "--output-format", "json"]
+    if version:
+        command += ["--version", version]
+    try:
+        output = subprocess.run(command, check=True, capture_output=True, text=True, timeout=timeout)
+    except (OSError, subprocess.SubprocessError) as e:
+        raise ScanError(f"Error running guarddog on {package}: {e}") from e
+    try:
+        return json.loads(output.stdout[output.stdout.find('{'):])
+    except json.JSONDecodeError as e:
+        raise ScanError(f"guarddog output for {package} is not JSON: {e}") from e
+
+
+def guarddog_findings(report):
+    """
+    Flattens the source code rule results of a guarddog report.
+
+    Returns:
+        list: {"rule", "path", "line", "message", "code"} per finding, where
+              path is the archive member (it starts with the archive's top directory).
+    """
+    findings = []
+    for rule, matches in (report.get("results") or {}).items():
+        if not isinstance(matches, list):
+            continue  # metadata rules report a message, not code locations
+        for match in matches:
+            path, _, line = match.get("location", "").rpartition(":")
+            if not line.isdigit():
+                path, line = match.get("location", ""), "0"
+            findings.append({"rule": rule, "path": path, "line": int(line),
+                             "message": match.get("message", ""), "code": match.get("code", "")})
+    return findings
+
+
+def metadata_findings(report):
+    """
+    The metadata rule results of a guarddog report, {rule: message}.
+    """
+    return {rule: message for rule, message in (report.get("results") or {}).items()
+            if message and not isinstance(message, list)}
+
+
+def release_files(package, version=None, index_url=PYPI_URL, timeout=60):
+    """
+    Looks a release up in the PyPI JSON API.
+
+    Returns:
+        tuple: (version, list of the release's files as the API describes them:
+                "filename", "url", "packagetype", "digests", ...).
+    """
+    url = f"{index_url}/{package}/{version}/json" if version else f"{index_url}/{package}/json"
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+    except requests.exceptions.RequestException as e:
+        raise ScanError(f"Error fetching release metadata for {package}: {e}") from e
+    data = response.json()
+    return data["info"]["version"], data["urls"]
+
+
+def find_download_url(files, archive_directory=None):
+    """
+    Picks the file guarddog scanned: the one named after the archive directory
+    its findings are in, otherwise the sdist.
+    """
+    if archive_directory:
+        for file in files:
+            if archive_directory in file["filename"]:
+                return file
+    for file in files:
+        if file.get("packagetype") == "sdist":
+            return file
+    return None
+
+
+def get_review_llm():
+    from langchain_google_genai import GoogleGenerativeAI
+    return GoogleGenerativeAI(model=REVIEW_MODEL, temperature=0)
+
+
+def review_chain(llm=None):
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.runnables import RunnablePassthrough
+    from langchain_core.output_parsers import StrOutputParser
+    return (
+      {"text": RunnablePassthrough()}
+      | PromptTemplate.from_template(REVIEW_PROMPT)
+      | (llm or get_review_llm())
+      | StrOutputParser()
+    )
+
+
+def parse_review(text):
+    """
+    Reads a report of the review chain.  The prompt asks for a JSON object written
+    with square brackets, so the scores are read key by key rather than with json.loads.
+
+    Returns:
+        dict: The report's string fields and its scores (floats, missing ones are None).
+    """
+    review = {}
+    for key, value in re.findall(r'"(\w+)"\s*:\s*"((?:[^"\\]|\\.)*)"', text):
+        review[key] = value
+    for key in SCORE_KEYS:
+        match = re.search(rf'"{key}"\s*:\s*"?([0-9]*\.?[0-9]+)', text)
+        review[key] = float(match.group(1)) if match else None
+    return review
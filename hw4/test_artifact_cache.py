@@ -0,0 +1,47 @@
+import pytest
+import package_scan
+from artifact_cache import ArtifactCache, safe_member_path
+
+
+def test_fetch_downloads_once_and_serves_pinned_versions_from_disk(tmp_path, index):
+    cache = ArtifactCache(str(tmp_path / "cache"), index)
+    artifact = cache.fetch("evilpkg", "1.0")
+    assert (artifact.name, artifact.version, artifact.filename) == ("evilpkg", "1.0", "evilpkg-1.0.tar.gz")
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    again = cache.fetch("EvilPkg", "1.0")
+    assert again.path == artifact.path
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # A new cache on the same directory still finds the artifact
+    reopened = ArtifactCache(str(tmp_path / "cache"), "http://127.0.0.1:9/unreachable")
+    assert reopened.fetch("evilpkg", "1.0").sha256 == artifact.sha256
+
+
+def test_fetch_without_version_takes_the_latest_release(tmp_path, index):
+    cache = ArtifactCache(str(tmp_path / "cache"), index)
+    assert cache.fetch("evilpkg").version == "1.1"
+
+
+def test_fetch_rejects_a_hash_mismatch(tmp_path, index):
+    cache = ArtifactCache(str(tmp_path / "cache"), index)
+    _, files = package_scan.release_files("evilpkg", "1.0", index)
+    with pytest.raises(package_scan.ScanError, match="does not match"):
+        cache.fetch_file("evilpkg", "1.0", files[0]["filename"], files[0]["url"], "0" * 64)
+    assert cache.lookup("evilpkg", "1.0") is None
+
+
+def test_extract_only_the_requested_members(tmp_path, index):
+    artifact = ArtifactCache(str(tmp_path / "cache"), index).fetch("evilpkg", "1.0")
+    paths = artifact.extract(["evilpkg-1.0/evilpkg/__init__.py"])
+    assert [path.rsplit("/", 2)[-2:] for path in paths] == [["evilpkg", "__init__.py"]]
+    assert not list((tmp_path / "cache").glob("**/setup.py"))
+    assert sorted(artifact.members()) == ["evilpkg-1.0/evilpkg/__init__.py", "evilpkg-1.0/setup.py"]
+    assert "exec(" in artifact.read("evilpkg-1.0/evilpkg/__init__.py")
+    assert len(artifact.extract()) == 2
+
+
+def test_safe_member_path_rejects_paths_outside_the_directory():
+    assert safe_member_path("pkg/a.py") == "pkg/a.py"
+    assert safe_member_path("../etc/passwd") is None
+    assert safe_member_path("/etc/passwd") is None
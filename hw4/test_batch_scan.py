@@ -0,0 +1,85 @@
+import json
+from langchain_community.llms.fake import FakeListLLM
+import package_scan
+import batch_scan
+from artifact_cache import ArtifactCache
+from batch_scan import BatchScanner, PackageResult, Requirement, parse_requirement_line, parse_requirements
+from code_review import ReviewEngine
+
+MALICIOUS = ('"purpose": "runs a payload", "conclusion": "Downloads and runs a shell script", '
+             '"confidence": 0.9, "obfuscated": 0.4, "malware": 0.9, "securityRisk": 0.9')
+
+
+def test_parse_requirement_line():
+    assert parse_requirement_line("requests==2.31.0") == Requirement("requests", "2.31.0")
+    assert parse_requirement_line("Flask[async] === 3.0.0 ; python_version > '3.8'  # web") == \
+        Requirement("Flask", "3.0.0")
+    assert parse_requirement_line("numpy>=1.26") == Requirement("numpy")
+    assert parse_requirement_line("numpy==1.*") == Requirement("numpy")
+    assert parse_requirement_line("numpy==1.26,!=1.26.1") == Requirement("numpy")
+    assert parse_requirement_line("git+https://github.com/org/repo.git") is None
+    assert parse_requirement_line("./local/package") is None
+
+
+def test_parse_requirements_follows_includes_and_drops_duplicates(tmp_path):
+    (tmp_path / "base.txt").write_text("requests==2.31.0 \\\n    --hash=sha256:abc\nsix\n")
+    (tmp_path / "requirements.txt").write_text("# app\n-r base.txt\n--index-url https://example.invalid\n"
+                                               "Requests==2.0\nurllib3==2.2.1\n")
+    assert parse_requirements(str(tmp_path / "requirements.txt")) == [
+        Requirement("requests", "2.31.0"), Requirement("six"), Requirement("urllib3", "2.2.1")]
+
+
+def test_parse_lockfiles(tmp_path):
+    (tmp_path / "poetry.lock").write_text('[[package]]\nname = "requests"\nversion = "2.31.0"\n\n'
+                                          '[[package]]\nname = "mylib"\nversion = "0.1"\n'
+                                          '[package.source]\ntype = "git"\nurl = "https://example.invalid"\n')
+    assert parse_requirements(str(tmp_path / "poetry.lock")) == [Requirement("requests", "2.31.0")]
+
+    (tmp_path / "uv.lock").write_text('[[package]]\nname = "app"\nversion = "0.1.0"\nsource = { editable = "." }\n\n'
+                                      '[[package]]\nname = "idna"\nversion = "3.7"\n'
+                                      'source = { registry = "https://pypi.org/simple" }\n')
+    assert parse_requirements(str(tmp_path / "uv.lock")) == [Requirement("idna", "3.7")]
+
+    (tmp_path / "Pipfile.lock").write_text(json.dumps({"default": {"six": {"version": "==1.16.0"}},
+                                                       "develop": {"local": {"path": "."}}}))
+    assert parse_requirements(str(tmp_path / "Pipfile.lock")) == [Requirement("six", "1.16.0")]
+
+
+def test_sarif_report():
+    finding = {"rule": "exec-base64", "path": "evilpkg-1.0/evilpkg/__init__.py", "line": 10,
+               "message": "exec of base64 data", "code": "exec(...)"}
+    results = [
+        PackageResult("evilpkg", "1.0", issues=1, findings=[finding],
+                      review={"malware": 0.9, "confidence": 0.8, "conclusion": "malicious"}),
+        PackageResult("typo", "0.1", metadata={"typosquatting": "close to typing"}),
+        PackageResult("broken", errors={"guarddog": "timed out"}),
+    ]
+    run = batch_scan.sarif_report(results, "requirements.txt", 1.0)["runs"][0]
+    assert [(result["ruleId"], result["level"]) for result in run["results"]] == [
+        ("exec-base64", "warning"), ("llm-review", "error"), ("typosquatting", "warning")]
+    assert run["results"][0]["locations"][0]["physicalLocation"]["region"]["startLine"] == 10
+    assert {rule["id"] for rule in run["tool"]["driver"]["rules"]} == {"exec-base64", "llm-review", "typosquatting"}
+    assert run["invocations"][0]["executionSuccessful"] is False
+    assert "broken (guarddog): timed out" in run["invocations"][0]["toolExecutionNotifications"][0]["message"]["text"]
+
+
+def test_scan_downloads_and_reviews_a_flagged_package(tmp_path, index, monkeypatch):
+    report = {"issues": 1, "results": {"exec-base64": [{
+        "location": "evilpkg-1.0/evilpkg/__init__.py:10", "message": "exec of base64 data",
+        "code": 'exec(base64.b64decode("cHJpbnQoMSk="))'}]}}
+    monkeypatch.setattr(package_scan, "guarddog_scan", lambda name, version=None: report)
+    llm = FakeListLLM(responses=[MALICIOUS] * 10)
+    cache = ArtifactCache(str(tmp_path / "cache"), index)
+    scanner = BatchScanner(review=True, llm=llm, cache=cache)
+    scanner._engine = ReviewEngine(llm, cache=False)
+
+    result = scanner.scan(Requirement("evilpkg", "1.0"))
+    assert result.ok, result.errors
+    assert result.download_url.endswith("/files/evilpkg-1.0.tar.gz")
+    assert result.review["malware"] == 0.9
+    assert [chunk["path"] for chunk in result.review["chunks"]] == ["evilpkg-1.0/evilpkg/__init__.py"]
+    assert set(result.timings) >= {"guarddog", "download", "extract", "review", "total"}
+
+    # The second scan of the pinned version is served from the artifact cache
+    scanner.scan(Requirement("evilpkg", "1.0"))
+    assert (cache.hits, cache.misses) == (1, 1)
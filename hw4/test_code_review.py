@@ -0,0 +1,128 @@
+from langchain_community.llms.fake import FakeListLLM
+import triage
+from code_review import ReviewCache, ReviewEngine, aggregate, chunk_file, prioritise
+from conftest import EVIL
+
+BENIGN = ('"purpose": "helpers", "conclusion": "Nothing suspicious", '
+          '"confidence": 0.8, "obfuscated": 0.0, "malware": 0.0, "securityRisk": 0.1')
+MALICIOUS = ('"purpose": "runs a payload", "conclusion": "Downloads and runs a shell script", '
+             '"confidence": 0.9, "obfuscated": 0.4, "malware": 0.9, "securityRisk": 0.9')
+
+
+class CountingLLM(FakeListLLM):
+    calls: int = 0
+
+    def _call(self, prompt, stop=None, run_manager=None, **kwargs):
+        self.calls += 1
+        return MALICIOUS if "exec(" in prompt else BENIGN
+
+
+def test_chunk_file_splits_by_function_and_records_lines():
+    chunks = chunk_file("evil.py", EVIL, size=120)
+    assert [chunk.lines for chunk in chunks if not chunk.module] == [[[5, 6]], [[9, 11]]]
+    assert any(chunk.module and "import base64" in chunk.text for chunk in chunks)
+    assert all(len(chunk.text) <= 120 for chunk in chunks)
+    # A function longer than a chunk is cut at line boundaries
+    assert [chunk.lines for chunk in chunk_file("evil.py", EVIL, size=60) if not chunk.module] == \
+        [[[5, 6]], [[9, 10]], [[11, 11]]]
+    assert len({chunk.sha256 for chunk in chunks}) == 1
+
+
+def test_prioritise_puts_guarddog_findings_first():
+    chunks = chunk_file("evil.py", EVIL, size=120)
+    finding = {"rule": "shady-links", "path": "evil.py", "line": 6, "code": ""}
+    ranked = prioritise(chunks, [finding])
+    assert ranked[0].lines == [[5, 6]] and ranked[0].signals == ["guarddog:shady-links"]
+    assert "dynamic-execution" in ranked[1].signals
+
+
+def test_triage_flags_sinks_and_forwards_only_suspicious_chunks():
+    result = triage.triage_source(EVIL, threshold=3)
+    suspicious = {segment["name"] for segment in result["segments"] if segment["suspicious"]}
+    assert suspicious == {"steal"}
+    steal = next(segment for segment in result["segments"] if segment["name"] == "steal")
+    assert {signal for signal, _, _ in steal["signals"]} >= {"dynamic-execution", "decoding", "process-execution"}
+
+    chunks = chunk_file("evil.py", EVIL, size=120)
+    assert [chunk.lines for chunk in chunks if triage.forwards(chunk, result)] == [[[9, 11]]]
+    assert all(triage.forwards(chunk, triage.triage_source("def broken(:\n")) for chunk in chunks)
+
+
+def test_triage_ignores_docstrings_and_scores_each_signal_once():
+    source = 'def f():\n    """Calls eval() and exec() on purpose."""\n    return 1\n'
+    assert not triage.triage_source(source)["segments"][0]["suspicious"]
+    source = "def g():\n    exec('a')\n    exec('b')\n"
+    assert triage.triage_source(source)["segments"][0]["score"] == triage.WEIGHTS["dynamic-execution"]
+
+
+def test_review_files_reviews_forwarded_chunks_and_caches_the_file(tmp_path):
+    path = tmp_path / "evil.py"
+    path.write_text(EVIL)
+    llm = CountingLLM(responses=[])
+    engine = ReviewEngine(llm, cache=ReviewCache(str(tmp_path / "reviews.db")), chunk_chars=120)
+
+    report = engine.review_files({"evil.py": str(path)})
+    assert llm.calls == 1
+    assert report["malware"] == 0.9 and report["triaged_out"] == 2
+    assert "evil.py: Downloads and runs a shell script" in report["conclusion"]
+
+    report = engine.review_files({"evil.py": str(path)})
+    assert llm.calls == 1
+    assert report["cached_files"] == 1 and report["chunks"][0]["cached"]
+
+
+def test_review_files_without_triage_reviews_every_chunk(tmp_path):
+    path = tmp_path / "evil.py"
+    path.write_text(EVIL)
+    llm = CountingLLM(responses=[])
+    report = ReviewEngine(llm, cache=False, chunk_chars=120, triage=False).review_files({"evil.py": str(path)})
+    assert llm.calls == 3 and report["triaged_out"] == 0
+    assert report["malware"] == 0.9 and report["confidence"] == 0.9
+
+
+def test_aggregate_takes_the_highest_scores():
+    reviews = [{"chunk": {"path": "a.py"}, "review": {"malware": 0.1, "securityRisk": 0.6, "confidence": 0.5,
+                                                      "obfuscated": 0.0, "conclusion": "risky"}},
+               {"chunk": {"path": "b.py"}, "review": {"malware": 0.0, "securityRisk": 0.0, "confidence": 0.9,
+                                                      "obfuscated": 0.2, "conclusion": "fine"}}]
+    report = aggregate(reviews)
+    assert (report["malware"], report["securityRisk"], report["obfuscated"]) == (0.1, 0.6, 0.2)
+    assert report["confidence"] == 0.5 and report["conclusion"] == "a.py: risky"
+
+
+def test_triage_forwards_a_lone_network_sink():
+    source = "def report(data):\n    urllib.request.urlopen('http://example.invalid', data)\n"
+    assert triage.triage_source(source)["segments"][0]["suspicious"]
+
+
+def test_review_files_reports_a_fully_triaged_file_as_benign(tmp_path):
+    path = tmp_path / "helpers.py"
+    path.write_text("def add(a, b):\n    return a + b\n")
+    llm = CountingLLM(responses=[])
+    engine = ReviewEngine(llm, cache=ReviewCache(str(tmp_path / "reviews.db")))
+    report = engine.review_files({"helpers.py": str(path)})
+    assert llm.calls == 0 and report["triaged_out"] == 1
+    assert [report[key] for key in ("confidence", "obfuscated", "malware", "securityRisk")] == [0.0] * 4
+    assert report["conclusion"].startswith("Triaged as benign")
+
+    report = engine.review_files({"helpers.py": str(path)})
+    assert report["cached_files"] == 1 and report["malware"] == 0.0
+
+
+def test_cached_files_are_not_triaged_again(tmp_path, monkeypatch):
+    (tmp_path / "evil.py").write_text(EVIL)
+    (tmp_path / "helpers.py").write_text("def add(a, b):\n    return a + b\n")
+    files = {"evil.py": str(tmp_path / "evil.py"), "helpers.py": str(tmp_path / "helpers.py")}
+    triaged = []
+    triage_files = triage.triage_files
+    monkeypatch.setattr(triage, "triage_files", lambda files: triaged.append(sorted(files)) or triage_files(files))
+    engine = ReviewEngine(CountingLLM(responses=[]), cache=ReviewCache(str(tmp_path / "reviews.db")), chunk_chars=120)
+
+    engine.review_files(files)
+    report = engine.review_files(files)
+    assert triaged == [["evil.py", "helpers.py"]]
+    assert report["cached_files"] == 2 and report["malware"] == 0.9
+
+    # A guarddog finding in the file changes what is forwarded, so it is a different cache entry
+    engine.review_files(files, [{"rule": "shady-links", "path": "helpers.py", "line": 2, "code": ""}])
+    assert triaged[-1] == ["helpers.py"]
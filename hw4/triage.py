@@ -0,0 +1,380 @@
+# Static triage in front of the LLM code review.  Most files of a package are
+# plainly harmless, so before a chunk is sent to the model its file is parsed
+# with the ast module and every top-level function and class (and the
+# module-level code) is checked for the sources, sinks and anomalies the
+# review prompt asks about:
+#   - sinks: exec/eval/compile, subprocess and os.system/popen/exec*,
+#     sockets and HTTP clients, dynamic imports,
+#   - payloads: base64/zlib/marshal decoding, long high-entropy string literals,
+#   - sources: environment variables and credential files (~/.ssh, ~/.aws, ...),
+#   - anomalies: hardcoded secrets, setup.py install hooks, obfuscated
+#     identifiers (_0x1f, IlIlIl, random-looking names by character entropy).
+# A segment whose signal weights add up to TRIAGE_THRESHOLD is suspicious; a
+# single code execution, process or network sink is enough on its own.
+# ReviewEngine only reviews chunks that overlap a suspicious segment (or hold
+# a guarddog finding); files that do not parse are reviewed in full.  Files
+# are triaged in a process pool, since parsing is CPU bound.
+#
+# `python triage.py --benchmark CORPUS` measures the cost and the recall of
+# the triage on a directory of sdists: every chunk is reviewed by the LLM (the
+# full-LLM baseline, served from the review cache on later runs), and the
+# report gives the share of prompt tokens the triage saves and the share of
+# the chunks the baseline found risky that it still forwards.  With
+# --no-review the baseline is skipped (no LLM is needed) and only the tokens
+# saved are reported.
+#
+# Configuration (environment variables):
+#   TRIAGE_THRESHOLD   score of a suspicious segment (default: 3)
+#   TRIAGE_WORKERS     processes (default: the number of CPUs)
+import os
+import re
+import ast
+import sys
+import json
+import math
+import time
+import zipfile
+import tarfile
+import argparse
+import tempfile
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Weight of each signal; a signal counts once per segment however often it occurs.
+# Sinks weigh the default threshold, so a lone exec, subprocess or network call
+# (e.g. exfiltration with urlopen) is forwarded on its own
+WEIGHTS = {
+    "dynamic-execution": 3.0,
+    "process-execution": 3.0,
+    "network": 3.0,
+    "encoded-blob": 3.0,
+    "hardcoded-secret": 3.0,
+    "decoding": 2.0,
+    "dynamic-import": 2.0,
+    "sensitive-path": 2.0,
+    "install-hook": 2.0,
+    "obfuscated-identifier": 2.0,
+    "environment": 1.0,
+}
+# Below this many files, starting worker processes costs more than it saves
+MIN_POOL_FILES = 16
+CHARS_PER_TOKEN = 4
+
+NETWORK_MODULES = {"socket", "urllib", "urllib2", "urllib3", "http", "httplib", "ftplib", "smtplib", "telnetlib",
+                   "requests", "httpx", "aiohttp", "paramiko", "websocket", "websockets"}
+DECODERS = {"b64decode", "b32decode", "b16decode", "b85decode", "a85decode", "decodebytes", "decodestring",
+            "urlsafe_b64decode", "decompress", "fromhex", "unhexlify"}
+INSTALL_COMMANDS = {"install", "develop", "egg_info", "build_py", "sdist", "bdist_egg"}
+SENSITIVE_PATH = re.compile(r"\.ssh|\.aws|\.gnupg|\.netrc|\.pypirc|\.git-credentials|/etc/passwd|/etc/shadow"
+                            r"|Local Storage|Login Data|discord", re.IGNORECASE)
+SECRET_NAME = re.compile(r"pass(?:word|wd)?$|secret|token|api_?key|access_?key|private_?key|credential", re.IGNORECASE)
+SECRET_VALUE = re.compile(r"AKIA[0-9A-Z]{16}|ghp_[0-9A-Za-z]{36}|xox[abpr]-[0-9A-Za-z-]{10,}|sk_live_[0-9A-Za-z]{16,}"
+                          r"|-----BEGIN (?:RSA |EC |OPENSSH )?PRIVATE KEY-----")
+BLOB = re.compile(r"[A-Za-z0-9+/=_\-\\x]{120,}")
+OBFUSCATED_NAME = re.compile(r"_0x[0-9a-fA-F]+|[Il1]{6,}|[O0]{6,}|(?:[Il1][O0]|[O0][Il1]){3,}")
+
+
+def entropy(text):
+    """
+    Shannon entropy of the characters of a string, in bits per character.
+    """
+    counts = Counter(text)
+    return -sum(count / len(text) * math.log2(count / len(text)) for count in counts.values()) if text else 0.0
+
+
+def dotted_name(node):
+    # os.path.join(...) -> "os.path.join"; calls on expressions give ""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        prefix = dotted_name(node.value)
+        return f"{prefix}.{node.attr}" if prefix else node.attr
+    return ""
+
+
+def obfuscated(name):
+    if OBFUSCATED_NAME.fullmatch(name):
+        return True
+    # Long names that read like random strings rather than words
+    return len(name) >= 12 and entropy(name) >= 3.7 and sum(c.isdigit() for c in name) >= 3
+
+
+class SignalVisitor(ast.NodeVisitor):
+    """
+    Collects the triage signals of one segment as (signal, line, detail).
+    """
+
+    def __init__(self):
+        self.signals = []
+
+    def add(self, signal, node, detail):
+        self.signals.append((signal, getattr(node, "lineno", 0), detail[:120]))
+
+    def visit_Call(self, node):
+        name = dotted_name(node.func)
+        root, last = name.partition(".")[0], name.rsplit(".", 1)[-1]
+        if name in ("exec", "eval", "compile", "execfile", "builtins.exec", "builtins.eval"):
+            self.add("dynamic-execution", node, name)
+        elif (root == "subprocess" or name in ("os.system", "os.popen", "os.startfile", "pty.spawn", "commands.getoutput")
+              or name.startswith(("os.exec", "os.spawn", "os.posix_spawn"))):
+            self.add("process-execution", node, name)
+        elif root in NETWORK_MODULES or last in ("urlopen", "create_connection"):
+            self.add("network", node, name)
+        if last in DECODERS or name in ("marshal.loads", "pickle.loads", "codecs.decode"):
+            self.add("decoding", node, name)
+        if name in ("__import__", "importlib.import_module") or (
+                name == "getattr" and node.args and dotted_name(node.args[0]) in ("__builtins__", "builtins")):
+            self.add("dynamic-import", node, name)
+        if name in ("os.getenv", "os.environ.get", "getenv"):
+            self.add("environment", node, name)
+        if last == "setup" and any(keyword.arg == "cmdclass" for keyword in node.keywords):
+            self.add("install-hook", node, "setup(cmdclass=...)")
+        self.generic_visit(node)
+
+    def visit_Attribute(self, node):
+        if dotted_name(node) == "os.environ":
+            self.add("environment", node, "os.environ")
+        self.generic_visit(node)
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, (str, bytes)):
+            text = node.value if isinstance(node.value, str) else node.value.decode("latin-1")
+            if SECRET_VALUE.search(text):
+                self.add("hardcoded-secret", node, SECRET_VALUE.search(text).group(0)[:12] + "...")
+            if "\n" not in text and SENSITIVE_PATH.search(text):
+                self.add("sensitive-path", node, text)
+            blob = BLOB.search(text)
+            if blob and " " not in blob.group(0) and entropy(blob.group(0)) >= 4.0:
+                self.add("encoded-blob", node, f"{len(text)} character literal")
+
+    def visit_Expr(self, node):
+        # Docstrings and other bare string statements are documentation, not data
+        if not (isinstance(node.value, ast.Constant) and isinstance(node.value.value, str)):
+            self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        if isinstance(node.value, ast.Constant) and isinstance(node.value.value, str) and len(node.value.value) >= 8:
+            for target in node.targets:
+                name = dotted_name(target)
+                if name and SECRET_NAME.search(name.rsplit(".", 1)[-1]) and " " not in node.value.value:
+                    self.add("hardcoded-secret", node, name)
+        self.generic_visit(node)
+
+    def visit_ClassDef(self, node):
+        if any(dotted_name(base).rsplit(".", 1)[-1] in INSTALL_COMMANDS for base in node.bases):
+            self.add("install-hook", node, node.name)
+        self._check_name(node, node.name)
+        self.generic_visit(node)
+
+    def visit_FunctionDef(self, node):
+        self._check_name(node, node.name)
+        for argument in node.args.args:
+            self._check_name(argument, argument.arg)
+        self.generic_visit(node)
+
+    visit_AsyncFunctionDef = visit_FunctionDef
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Store):
+            self._check_name(node, node.id)
+
+    def _check_name(self, node, name):
+        if obfuscated(name):
+            self.add("obfuscated-identifier", node, name)
+
+
+def default_threshold():
+    return float(os.getenv("TRIAGE_THRESHOLD", 3))
+
+
+def score(signals):
+    return sum(WEIGHTS[signal] for signal in {signal for signal, _, _ in signals})
+
+
+def triage_source(text, threshold=None):
+    """
+    Triage of one Python source.
+
+    Returns:
+        dict: "segments", each with "name", "lines" ([first, last], None for the
+              module-level code), "signals", "score" and "suspicious"; and "error"
+              when the file does not parse.
+    """
+    threshold = threshold if threshold is not None else default_threshold()
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError) as e:
+        return {"segments": [], "error": f"{type(e).__name__}: {e}"}
+    segments = []
+    module = SignalVisitor()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            visitor = SignalVisitor()
+            visitor.visit(node)
+            first = min([node.lineno] + [decorator.lineno for decorator in node.decorator_list])
+            segments.append({"name": node.name, "lines": [first, node.end_lineno], "signals": visitor.signals})
+        else:
+            module.visit(node)
+    segments.append({"name": "<module>", "lines": None, "signals": module.signals})
+    for segment in segments:
+        segment["score"] = score(segment["signals"])
+        segment["suspicious"] = segment["score"] >= threshold
+    return {"segments": segments, "error": None}
+
+
+def triage_file(item):
+    name, path = item
+    with open(path, 'r', errors='replace') as file:
+        return name, triage_source(file.read())
+
+
+def triage_files(files, workers=None):
+    """
+    Triages files in a process pool (inline for a handful of files).
+
+    Parameters:
+        files (dict): Name -> local path.
+
+    Returns:
+        dict: Name -> triage_source result.
+    """
+    items = list(files.items())
+    workers = workers or int(os.getenv("TRIAGE_WORKERS", 0)) or os.cpu_count()
+    if len(items) < MIN_POOL_FILES or workers == 1:
+        return dict(map(triage_file, items))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(executor.map(triage_file, items, chunksize=max(1, len(items) // (workers * 4))))
+
+
+def forwards(chunk, result):
+    """
+    Whether a code_review.Chunk overlaps a suspicious segment (every chunk of a
+    file that did not parse is forwarded).
+    """
+    if result is None or result["error"]:
+        return True
+    for segment in result["segments"]:
+        if not segment["suspicious"]:
+            continue
+        if segment["lines"] is None:
+            if chunk.module:
+                return True
+        elif any(first <= segment["lines"][1] and segment["lines"][0] <= last for first, last in chunk.lines):
+            return True
+    return False
+
+
+def estimate_tokens(chunk):
+    from package_scan import REVIEW_PROMPT
+    return (len(REVIEW_PROMPT) + len(chunk.prompt_text())) // CHARS_PER_TOKEN
+
+
+def corpus_packages(corpus):
+    """
+    Yields (package name, {file name: local path}) for each sdist (.tar.gz or
+    .zip) or extracted directory in the corpus directory.
+    """
+    for entry in sorted(os.listdir(corpus)):
+        path = os.path.join(corpus, entry)
+        with tempfile.TemporaryDirectory() as directory:
+            if entry.endswith((".tar.gz", ".tgz")):
+                with tarfile.open(path, 'r:gz') as archive:
+                    archive.extractall(directory, filter="data")
+            elif entry.endswith(".zip"):
+                with zipfile.ZipFile(path) as archive:
+                    archive.extractall(directory)
+            elif os.path.isdir(path):
+                directory = path
+            else:
+                continue
+            files = {}
+            for root, _, names in os.walk(directory):
+                for name in names:
+                    if name.endswith(".py"):
+                        files[os.path.relpath(os.path.join(root, name), directory)] = os.path.join(root, name)
+            yield entry, files
+
+
+def benchmark(corpus, llm=None, workers=None, review=True):
+    """
+    Runs the full-LLM baseline and the triage on every package of the corpus.
+    With review=False only the triage runs: the tokens saved are measured, the
+    recall is not.
+
+    Returns:
+        dict: Per-package and total chunks, prompt tokens, the share of tokens
+              saved and the recall of the chunks the baseline scored as a risk.
+    """
+    import code_review
+    engine = code_review.ReviewEngine(llm, triage=False, max_chunks=sys.maxsize) if review else None
+    chunk_chars = engine.chunk_chars if engine else int(os.getenv("REVIEW_CHUNK_CHARS", 12000))
+    packages = []
+    totals = Counter()
+    for name, files in corpus_packages(corpus):
+        start = time.perf_counter()
+        results = triage_files(files, workers)
+        triage_seconds = time.perf_counter() - start
+        chunks = []
+        for file_name, path in files.items():
+            with open(path, 'r', errors='replace') as file:
+                text = file.read()
+            if text.strip():
+                chunks.extend(code_review.chunk_file(file_name, text, chunk_chars))
+        forwarded = {id(chunk) for chunk in chunks if forwards(chunk, results.get(chunk.path))}
+
+        report = engine.review_files(files) if engine else {"chunks": []}
+        risky = {(item["path"], json.dumps(item["lines"]), item["module"]) for item in report["chunks"]
+                 if max(item["malware"] or 0.0, item["securityRisk"] or 0.0) >= code_review.RISK_THRESHOLD}
+        kept = {(chunk.path, json.dumps(chunk.lines), chunk.module) for chunk in chunks if id(chunk) in forwarded}
+        counts = Counter({
+            "files": len(files),
+            "chunks": len(chunks),
+            "forwarded": len(forwarded),
+            "tokens": sum(estimate_tokens(chunk) for chunk in chunks),
+            "forwarded_tokens": sum(estimate_tokens(chunk) for chunk in chunks if id(chunk) in forwarded),
+            "risky": len(risky),
+            "risky_forwarded": len(risky & kept),
+        })
+        totals.update(counts)
+        packages.append({"package": name, **counts, "triage_seconds": round(triage_seconds, 3),
+                         "recall": counts["risky_forwarded"] / counts["risky"] if counts["risky"] else None})
+    return {
+        "packages": packages,
+        "total": dict(totals),
+        "tokens_saved": 1 - totals["forwarded_tokens"] / totals["tokens"] if totals["tokens"] else 0.0,
+        "recall": totals["risky_forwarded"] / totals["risky"] if totals["risky"] else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Static triage of Python files ahead of the LLM review.")
+    parser.add_argument("path", help="File or directory to triage; with --benchmark, a directory of sdists")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare with a full-LLM review: tokens saved and recall of the risky chunks")
+    parser.add_argument("--no-review", action="store_true",
+                        help="With --benchmark, skip the full-LLM baseline: tokens saved only, no recall")
+    parser.add_argument("-j", "--workers", type=int, help="Triage processes")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        result = benchmark(args.path, workers=args.workers, review=not args.no_review)
+        print(json.dumps(result, indent=2))
+        recall = "n/a" if result["recall"] is None else f"{result['recall']:.1%}"
+        print(f"{result['total'].get('chunks', 0)} chunks, {result['tokens_saved']:.1%} of prompt tokens saved, "
+              f"recall {recall}", file=sys.stderr)
+    else:
+        if os.path.isfile(args.path):
+            files = {args.path: args.path}
+        else:
+            files = {os.path.join(root, name): os.path.join(root, name)
+                     for root, _, names in os.walk(args.path) for name in names if name.endswith(".py")}
+        start = time.perf_counter()
+        results = triage_files(files, args.workers)
+        for name, result in sorted(results.items()):
+            if result["error"]:
+                print(f"{name}: does not parse ({result['error']})")
+            for segment in result["segments"]:
+                if segment["suspicious"]:
+                    signals = ", ".join(sorted({signal for signal, _, _ in segment["signals"]}))
+                    print(f"{name}:{segment['name']} score {segment['score']:g}: {signals}")
+        print(f"{len(files)} files triaged in {time.perf_counter() - start:.2f}s", file=sys.stderr)
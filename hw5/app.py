@@ -1,11 +1,12 @@
 from bs4 import BeautifulSoup
 import requests
-from langchain import hub
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.tools import tool
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
 import requests
 from urllib.parse import urlparse
+import os
+import sys
 from bs4 import BeautifulSoup
 
 
@@ -94,22 +95,27 @@ def send_cmd_injection(url):
 
 tools = [find_product_page_url, send_cmd_injection]
 
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-prompt = base_prompt.partial(
-    instructions="You are an expert in solving CTF levels. This is OS Command injection levels. Solve this using the url provided by user.")
-
-agent = create_react_agent(llm, tools, prompt)
-
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
-
-print("Welcome to my application. I am configured with these tools:")
-for tool in agent_executor.tools:
-    print(f'  Tool: {tool.name} = {tool.description}')
-
-line = input("llm>> ")
-try:
-    if line:
-        result = agent_executor.invoke({"input": line})
-        print(result)
-except Exception as e:
-    print(e)
+# The hub prompt and the agent are only needed when run as a script
+if __name__ == "__main__":
+    # The react agent template is vendored in final/prompts, so no hub fetch on start
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "final"))
+    from prompt_hub import pull_prompt
+    base_prompt = pull_prompt("langchain-ai/react-agent-template")
+    prompt = base_prompt.partial(
+        instructions="You are an expert in solving CTF levels. This is OS Command injection levels. Solve this using the url provided by user.")
+
+    agent = create_react_agent(llm, tools, prompt)
+
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+    print("Welcome to my application. I am configured with these tools:")
+    for tool in agent_executor.tools:
+        print(f'  Tool: {tool.name} = {tool.description}')
+
+    line = input("llm>> ")
+    try:
+        if line:
+            result = agent_executor.invoke({"input": line})
+            print(result)
+    except Exception as e:
+        print(e)
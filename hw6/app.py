@@ -1,24 +1,15 @@
 from langchain_google_genai import GoogleGenerativeAI, HarmCategory, HarmBlockThreshold
-from langchain import hub
 from langchain.agents import AgentExecutor, create_react_agent
 from langchain.tools import BaseTool, StructuredTool, tool
 from langchain.agents import load_tools
 from langchain.pydantic_v1 import BaseModel, Field
+from nmap_args import parse_command
+import os
 import readline
-import subprocess
 import pexpect
 import sys
 import select
 import threading
-import re
-
-llm = GoogleGenerativeAI(
-    model="gemini-1.5-pro-latest",
-    temperature=0,
-    safety_settings={
-        HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE, }
-)
-
 
 class Nmap(BaseModel):
     command: str = Field(
@@ -30,46 +21,22 @@ def nmap_validator(command):
     """
     Validate the given nmap command for correct syntax and usage.
     """
-    # Define a regular expression pattern for basic nmap command validation
-    nmap_pattern = re.compile(
-        r'^(?:sudo\s+)?nmap\s+')
-
-    # Check if the command matches the basic pattern
-    if not nmap_pattern.match(command):
-        print("Command does not match basic nmap pattern.")
-        return False
-
-    # Split the command into a list for subprocess call
-    command_list = command.split()
-
-    try:
-        # Run the command with subprocess to check its validity
-        result = subprocess.run(
-            command_list, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    # Checked offline against nmap's option grammar; the scan only runs once, in the terminal tool
+    parsed, errors = parse_command(command)
+    for warning in parsed.warnings:
+        print("Warning:", warning)
+    if errors:
+        print("Invalid nmap command:", "; ".join(errors))
+        return "Invalid nmap command: " + "; ".join(errors)
+    return True
 
-        # Check if there were any errors
-        if result.stderr:
-            print("Error in nmap command execution:", result.stderr)
-            return False
-
-        # If no errors, command is valid
-        return True
-
-    except Exception as e:
-        print("Exception occurred while validating command:", str(e))
-        return False
-    
 @tool("nmap_command")
 def nmap_tool(command: str):
     """This tool prints out the command"""
     print(f"this is the command: {command}")
     return command
 
-# tools = load_tools(["terminal"], llm=llm, allow_dangerous_tools=True)
-tools = load_tools(["terminal"], llm=llm, allow_dangerous_tools=True) +  [nmap_tool, nmap_validator]
-base_prompt = hub.pull("langchain-ai/react-agent-template")
-
-prompt = base_prompt.partial(instructions="""
+AGENT_INSTRUCTIONS = """
 You are an AI agent tasked with converting natural language queries into `nmap` commands. Your goal is to understand the user's request and generate a valid, safe `nmap` command that has to be executed in a terminal. Follow these requirements:
 1. **Translate the Query**: Convert the natural language query into an `nmap` command.
 2. **Validate the Command**:
@@ -77,21 +44,39 @@ You are an AI agent tasked with converting natural language queries into `nmap`
 3. **Command Requirements**:
    - Include appropriate `nmap` options and arguments based on the query.
    - Support common `nmap` scripts such as `http-enum` and `http-brute`.
-""")
-agent = create_react_agent(llm, tools, prompt)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+"""
+
+# The LLM, the hub prompt and the agent are only needed when run as a script;
+# importing the module (e.g. for nmap_validator) has no side effects
+if __name__ == "__main__":
+    llm = GoogleGenerativeAI(
+        model="gemini-1.5-pro-latest",
+        temperature=0,
+        safety_settings={
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE, }
+    )
+    # tools = load_tools(["terminal"], llm=llm, allow_dangerous_tools=True)
+    tools = load_tools(["terminal"], llm=llm, allow_dangerous_tools=True) +  [nmap_tool, nmap_validator]
+
+    # The react agent template is vendored in final/prompts, so no hub fetch on start
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "final"))
+    from prompt_hub import pull_prompt
+    base_prompt = pull_prompt("langchain-ai/react-agent-template")
+    prompt = base_prompt.partial(instructions=AGENT_INSTRUCTIONS)
+    agent = create_react_agent(llm, tools, prompt)
+    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
 
-print(f"Welcome to my application.  I am configured with these tools")
-for tool in tools:
-    print(f'  Tool: {tool.name} = {tool.description}')
+    print(f"Welcome to my application.  I am configured with these tools")
+    for tool in tools:
+        print(f'  Tool: {tool.name} = {tool.description}')
 
-while True:
-    try:
-        line = input("llm>> ")
-        if line:
-            result = agent_executor.invoke({"input": line})
-            print(result)
-        else:
-            break
-    except Exception as e:
-        print(e)
+    while True:
+        try:
+            line = input("llm>> ")
+            if line:
+                result = agent_executor.invoke({"input": line})
+                print(result)
+            else:
+                break
+        except Exception as e:
+            print(e)
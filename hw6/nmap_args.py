@@ -0,0 +1,502 @@
+# Offline validation of nmap commands.  nmap_validator used to "validate" a
+# command by running the scan and checking stderr, so every validation was a
+# full network scan, and the terminal tool then ran it a second time.  This
+# module checks a command against nmap's option grammar without running
+# anything:
+#   - the command is `nmap` (optionally after sudo) with no shell
+#     metacharacters, since the terminal tool hands it to a shell,
+#   - every option is known and has its argument (-p 80 / -p80, -oX file,
+#     --script=..., -T4 / -T aggressive, ...), and arguments are well formed:
+#     port lists, timing templates, times (30s, 5m), numbers,
+#   - scan types are compatible: one TCP scan type, -sn and -sL without port
+#     scans, -F without -p,
+#   - --script names exist: NSE categories, the scripts in nmap's
+#     scripts/script.db, patterns matching them, or paths to .nse files;
+#     unknown names come back with a suggestion.  Without an nmap install the
+#     names are checked against KNOWN_SCRIPTS, which is not exhaustive, so
+#     names missing from it are only warnings,
+#   - targets are IPv4 addresses, octet ranges (10.0.0-255.*), IPv6
+#     addresses (with -6), CIDR blocks or host names.
+# Scans that need root privileges without sudo are reported as warnings.
+#
+#     errors = validate("nmap -sV --script http-enum -p 80,443 scanme.nmap.org")
+#
+# `python nmap_args.py --check-corpus` validates the commands in
+# nmap_corpus.jsonl and reports those whose verdict differs from the expected one.
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import shutil
+import difflib
+import fnmatch
+import argparse
+import functools
+import ipaddress
+from dataclasses import dataclass, field
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "nmap_corpus.jsonl")
+
+SCRIPT_CATEGORIES = {"auth", "broadcast", "brute", "default", "discovery", "dos", "exploit", "external", "fuzzer",
+                     "intrusive", "malware", "safe", "version", "vuln", "all"}
+# Where nmap keeps its data directory, relative to the nmap binary and absolute
+NMAP_DATA_DIRECTORIES = ["../share/nmap", "/usr/share/nmap", "/usr/local/share/nmap", "/opt/homebrew/share/nmap"]
+# Used when nmap's script.db is not found: the scripts the agent is asked to
+# support, and commonly used ones
+KNOWN_SCRIPTS = {
+    "http-enum", "http-brute", "http-title", "http-headers", "http-methods", "http-robots.txt", "http-server-header",
+    "http-auth", "http-auth-finder", "http-form-brute", "http-sql-injection", "http-shellshock", "http-vuln-cve2017-5638",
+    "http-wordpress-enum", "http-wordpress-brute", "http-config-backup", "http-default-accounts", "http-git",
+    "http-open-proxy", "http-trace", "http-userdir-enum", "http-sitemap-generator", "http-csrf", "http-dombased-xss",
+    "http-stored-xss", "http-slowloris-check", "http-cors", "http-cookie-flags", "http-security-headers",
+    "ssl-cert", "ssl-enum-ciphers", "ssl-heartbleed", "ssl-poodle", "ssl-dh-params", "sslv2", "tls-nextprotoneg",
+    "ssh-hostkey", "ssh-auth-methods", "ssh-brute", "ssh2-enum-algos", "banner", "vulners", "vulscan",
+    "ftp-anon", "ftp-brute", "ftp-syst", "ftp-vsftpd-backdoor", "smtp-commands", "smtp-enum-users", "smtp-open-relay",
+    "dns-brute", "dns-zone-transfer", "dns-recursion", "dns-service-discovery", "smb-os-discovery",
+    "smb-enum-shares", "smb-enum-users", "smb-vuln-ms17-010", "smb-vuln-ms08-067", "smb-protocols",
+    "smb-security-mode", "smb2-security-mode", "smb2-time", "rdp-enum-encryption", "rdp-ntlm-info",
+    "mysql-info", "mysql-brute", "mysql-empty-password", "ms-sql-info", "ms-sql-brute", "mongodb-info",
+    "redis-info", "snmp-info", "snmp-brute", "snmp-sysdescr", "telnet-brute", "vnc-info", "vnc-brute",
+    "whois-ip", "whois-domain", "traceroute-geolocation", "broadcast-dhcp-discover", "targets-asn",
+    "firewalk", "ipidseq", "path-mtu", "sniffer-detect", "nbstat", "rpcinfo", "upnp-info", "krb5-enum-users",
+}
+
+TCP_SCAN_TYPES = {"S", "T", "A", "W", "M", "N", "F", "X", "I", "b"}
+PORT_SCAN_TYPES = TCP_SCAN_TYPES | {"U", "Y", "Z", "O"}
+SCAN_LETTERS = PORT_SCAN_TYPES - {"b"} | {"V", "C", "L", "n", "R"}
+# Scan types and options that need raw sockets, i.e. root
+PRIVILEGED = {"-sS", "-sA", "-sW", "-sM", "-sU", "-sN", "-sF", "-sX", "-sY", "-sZ", "-sO", "-sI", "-O", "-PE",
+              "-PP", "-PM", "-PO", "-PY", "-PR", "-S", "-D", "-g", "--spoof-mac", "--send-eth"}
+TIMING = {"0": "paranoid", "1": "sneaky", "2": "polite", "3": "normal", "4": "aggressive", "5": "insane"}
+SHELL_METACHARACTERS = re.compile(r"[;&|`$<>\n]")
+HOSTNAME_LABEL = re.compile(r"(?!-)[A-Za-z0-9_-]{1,63}(?<!-)")
+TIME_SPEC = re.compile(r"\d+(?:\.\d+)?(?:ms|s|m|h)?")
+
+
+def port_spec_error(spec):
+    """
+    -p 22,80,443 / 1-1024 / - / T:80,U:53 / http,https / [1-65535]
+    """
+    if not spec:
+        return "empty port list"
+    for part in spec.strip("[]").split(","):
+        part = part.strip("[]")
+        if part[:2] in ("T:", "U:", "S:", "P:"):
+            part = part[2:]
+        if re.fullmatch(r"\d*-\d*|\d+", part):
+            bounds = [int(bound) for bound in part.split("-") if bound]
+            if any(bound > 65535 for bound in bounds):
+                return f"port {max(bounds)} is out of range (0-65535)"
+            if len(bounds) == 2 and bounds[0] > bounds[1]:
+                return f"port range {part} is reversed"
+        elif not re.fullmatch(r"[A-Za-z0-9*?_.+-]+", part):
+            return f"invalid port specification {part!r}"
+    return None
+
+
+def timing_error(value):
+    if value in TIMING or value in TIMING.values():
+        return None
+    return f"invalid timing template {value!r} (0-5 or {', '.join(TIMING.values())})"
+
+
+def time_error(value):
+    return None if TIME_SPEC.fullmatch(value) else f"invalid time {value!r} (e.g. 500ms, 30s, 5m, 2h)"
+
+
+def number_error(value):
+    return None if re.fullmatch(r"\d+(?:\.\d+)?", value) else f"{value!r} is not a number"
+
+
+def port_number_error(value):
+    return None if value.isdigit() and int(value) <= 65535 else f"{value!r} is not a port number"
+
+
+def script_args_error(value):
+    depth = 0
+    for character in value:
+        depth += {"{": 1, "}": -1}.get(character, 0)
+        if depth < 0:
+            break
+    return None if value and depth == 0 else f"malformed --script-args {value!r}"
+
+
+def find_script_db():
+    """
+    Returns the path of nmap's scripts/script.db ($NMAPDIR first, then the
+    usual install locations), or None when nmap is not installed.
+    """
+    directories = [os.getenv("NMAPDIR")] if os.getenv("NMAPDIR") else []
+    binary = shutil.which("nmap")
+    for directory in NMAP_DATA_DIRECTORIES:
+        if not os.path.isabs(directory):
+            if not binary:
+                continue
+            directory = os.path.join(os.path.dirname(os.path.realpath(binary)), directory)
+        directories.append(directory)
+    for directory in directories:
+        path = os.path.join(directory, "scripts", "script.db")
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def installed_scripts(path=None):
+    """
+    Names of the scripts in a script.db (default: find_script_db()), or None
+    when there is none.
+    """
+    path = path or find_script_db()
+    if not path:
+        return None
+    with open(path, 'r', errors='replace') as file:
+        return frozenset(re.findall(r'filename\s*=\s*"([^"]+)\.nse"', file.read()))
+
+
+def script_errors(spec, scripts=None, warnings=None):
+    """
+    --script takes a comma-separated list, or a boolean expression, of script
+    names, categories, wildcard patterns and .nse files.  Names are checked
+    against `scripts` (default: installed_scripts()); without a script.db they
+    are checked against KNOWN_SCRIPTS, and names it lacks go to `warnings`
+    rather than the errors, since the list is not exhaustive.
+    """
+    errors = []
+    if scripts is None:
+        scripts = installed_scripts()
+    unknown, missing = errors, "unknown NSE script"
+    if scripts is None:
+        scripts, unknown = KNOWN_SCRIPTS, warnings if warnings is not None else []
+        missing = "NSE script not in the built-in list (nmap's script.db was not found)"
+    for word in re.findall(r"[^\s(),]+", spec):
+        name = word.lstrip("+")
+        if name in ("and", "or", "not") or name in SCRIPT_CATEGORIES or name in scripts:
+            continue
+        if name.endswith(".nse") or "/" in name:
+            continue  # a local script file or directory
+        if any(character in name for character in "*?["):
+            if not fnmatch.filter(scripts | SCRIPT_CATEGORIES, name):
+                unknown.append(f"script pattern {name!r} matches no known script")
+            continue
+        suggestion = difflib.get_close_matches(name, scripts | SCRIPT_CATEGORIES, n=1)
+        unknown.append(f"{missing}: {name!r}" + (f", did you mean {suggestion[0]!r}?" if suggestion else ""))
+    return errors if spec else ["empty --script"]
+
+
+def target_error(target, ipv6=False):
+    """
+    Checks one target specification: IPv4 (with octet ranges and wildcards),
+    IPv6, CIDR or host name.
+    """
+    spec, slash, prefix = target.partition("/")
+    is_ipv6 = ":" in spec
+    if slash and not (prefix.isdigit() and int(prefix) <= (128 if is_ipv6 else 32)):
+        return f"invalid CIDR prefix in {target!r}"
+    if is_ipv6:
+        try:
+            ipaddress.IPv6Address(spec.strip("[]"))
+        except ValueError:
+            return f"invalid IPv6 address {spec!r}"
+        return None if ipv6 else f"IPv6 target {target!r} needs -6"
+    if re.fullmatch(r"[\d*,\-.]+", spec):
+        octets = spec.split(".")
+        if len(octets) != 4:
+            return f"invalid IPv4 address {spec!r}"
+        for octet in octets:
+            for part in octet.split(","):
+                if part == "*":
+                    continue
+                bounds = part.split("-")
+                if not (1 <= len(bounds) <= 2) or not all(bound.isdigit() and int(bound) <= 255 for bound in bounds if bound):
+                    return f"invalid IPv4 octet {octet!r} in {spec!r}"
+                if len(bounds) == 2 and bounds[0] and bounds[1] and int(bounds[0]) > int(bounds[1]):
+                    return f"reversed octet range {part!r} in {spec!r}"
+        return f"IPv4 target {target!r} cannot be scanned with -6" if ipv6 else None
+    labels = spec.rstrip(".").split(".")
+    if len(spec) > 253 or not all(HOSTNAME_LABEL.fullmatch(label) for label in labels):
+        return f"invalid target {target!r}"
+    return None
+
+
+# Long options: name -> argument validator (None for options without an argument)
+FLAG = None
+LONG_OPTIONS = {
+    "--script": script_errors,
+    "--script-args": script_args_error,
+    "--script-args-file": lambda value: None,
+    "--script-trace": FLAG, "--script-updatedb": FLAG,
+    "--script-timeout": time_error,
+    "--top-ports": number_error,
+    "--port-ratio": number_error,
+    "--exclude": lambda value: next(filter(None, (target_error(target) for target in value.split(","))), None),
+    "--excludefile": lambda value: None,
+    "--exclude-ports": port_spec_error,
+    "--version-intensity": lambda value: None if value.isdigit() and int(value) <= 9 else "--version-intensity is 0-9",
+    "--version-light": FLAG, "--version-all": FLAG, "--version-trace": FLAG,
+    "--osscan-limit": FLAG, "--osscan-guess": FLAG, "--fuzzy": FLAG, "--max-os-tries": number_error,
+    "--min-hostgroup": number_error, "--max-hostgroup": number_error,
+    "--min-parallelism": number_error, "--max-parallelism": number_error,
+    "--min-rtt-timeout": time_error, "--max-rtt-timeout": time_error, "--initial-rtt-timeout": time_error,
+    "--max-retries": number_error, "--host-timeout": time_error,
+    "--scan-delay": time_error, "--max-scan-delay": time_error,
+    "--min-rate": number_error, "--max-rate": number_error,
+    "--defeat-rst-ratelimit": FLAG, "--defeat-icmp-ratelimit": FLAG, "--nsock-engine": lambda value: None,
+    "--mtu": number_error, "--data-length": number_error, "--ttl": number_error,
+    "--data": lambda value: None, "--data-string": lambda value: None,
+    "--ip-options": lambda value: None, "--spoof-mac": lambda value: None, "--proxies": lambda value: None,
+    "--source-port": port_number_error, "--badsum": FLAG, "--randomize-hosts": FLAG,
+    "--dns-servers": lambda value: None, "--system-dns": FLAG, "--traceroute": FLAG,
+    "--open": FLAG, "--reason": FLAG, "--packet-trace": FLAG, "--iflist": FLAG, "--append-output": FLAG,
+    "--resume": lambda value: None, "--stylesheet": lambda value: None, "--webxml": FLAG,
+    "--no-stylesheet": FLAG, "--noninteractive": FLAG, "--stats-every": time_error,
+    "--send-eth": FLAG, "--send-ip": FLAG, "--privileged": FLAG, "--unprivileged": FLAG,
+    "--disable-arp-ping": FLAG, "--discovery-ignore-rst": FLAG, "--version": FLAG, "--help": FLAG,
+    "--datadir": lambda value: None, "--servicedb": lambda value: None, "--versiondb": lambda value: None,
+    "--log-errors": FLAG,
+}
+# Short options with a required argument, attached (-p80) or separate (-p 80)
+SHORT_ARGUMENTS = {
+    "p": port_spec_error,
+    "e": lambda value: None,
+    "S": lambda value: target_error(value, ":" in value),
+    "g": port_number_error,
+    "D": lambda value: next(filter(None, (target_error(decoy, ":" in decoy) for decoy in value.split(",")
+                                          if decoy not in ("ME", "RND") and not decoy.startswith("RND:"))), None),
+    "b": lambda value: None,
+    "T": timing_error,
+}
+SHORT_FLAGS = set("46AFfnrROhV")
+OUTPUT_FORMATS = set("NXSGA")
+
+
+@dataclass
+class NmapCommand:
+    """
+    A parsed nmap command: options in the order given as (option, value), scan
+    type letters (-sS -> "S", -b -> "b"), --script specifications and targets.
+    """
+    sudo: bool = False
+    options: list = field(default_factory=list)
+    scan_types: list = field(default_factory=list)
+    scripts: list = field(default_factory=list)
+    targets: list = field(default_factory=list)
+    warnings: list = field(default_factory=list)
+
+    def has(self, option):
+        return any(name == option for name, _ in self.options)
+
+
+def parse_command(command, scripts=None):
+    """
+    Parses an nmap command line without running it.
+
+    Parameters:
+        command (str): The command line.
+        scripts (set): NSE script names --script may use (default: nmap's
+                       script.db, or KNOWN_SCRIPTS when it is not found).
+
+    Returns:
+        tuple: (NmapCommand, list of errors; empty when the command is valid).
+    """
+    parsed = NmapCommand()
+    if SHELL_METACHARACTERS.search(command):
+        return parsed, ["the command contains shell metacharacters"]
+    try:
+        tokens = shlex.split(command)
+    except ValueError as e:
+        return parsed, [f"cannot split the command: {e}"]
+    if tokens[:1] == ["sudo"]:
+        parsed.sudo = True
+        tokens = tokens[1:]
+    if not tokens or os.path.basename(tokens[0]) != "nmap":
+        return parsed, ["the command does not start with nmap"]
+
+    errors = []
+    arguments = iter(tokens[1:])
+
+    def value_of(option, attached):
+        # An attached value, even an empty one (--script=), is the option's argument
+        if attached is not None:
+            return attached
+        value = next(arguments, None)
+        if value is None or (value.startswith("-") and value != "-"):
+            errors.append(f"{option} requires an argument")
+            return None
+        return value
+
+    def check(option, validator, value):
+        if value is None or validator is None:
+            return
+        problems = validator(value)
+        errors.extend(problems if isinstance(problems, list) else [f"{option}: {problems}"] if problems else [])
+
+    for token in arguments:
+        if token.startswith("--"):
+            option, has_value, attached = token.partition("=")
+            if option not in LONG_OPTIONS:
+                suggestion = difflib.get_close_matches(option, LONG_OPTIONS, n=1)
+                errors.append(f"unknown option {option}" + (f" (did you mean {suggestion[0]}?)" if suggestion else ""))
+                continue
+            validator = LONG_OPTIONS[option]
+            if option == "--script":
+                validator = functools.partial(script_errors, scripts=scripts, warnings=parsed.warnings)
+            if validator is FLAG:
+                if has_value:
+                    errors.append(f"{option} does not take an argument")
+                parsed.options.append((option, None))
+                continue
+            value = value_of(option, attached if has_value else None)
+            check(option, validator, value)
+            parsed.options.append((option, value))
+            if option == "--script" and value:
+                parsed.scripts.append(value)
+        elif token.startswith("-") and len(token) > 1:
+            letter, rest = token[1], token[2:]
+            if letter == "s":
+                unknown = [scan for scan in rest if scan not in SCAN_LETTERS]
+                if not rest or unknown:
+                    errors.append(f"unknown scan type {token}")
+                    continue
+                for scan in rest:
+                    parsed.scan_types.append(scan)
+                    if scan == "C":
+                        parsed.scripts.append("default")
+                    value = value_of("-sI", None) if scan == "I" else None
+                    parsed.options.append((f"-s{scan}", value))
+            elif letter == "P":
+                if rest in ("n", "0", "E", "P", "M", "R") or (rest[:1] in ("S", "A", "U", "Y") and
+                                                             not port_spec_error(rest[1:] or "0")):
+                    parsed.options.append((f"-P{rest[:1]}", rest[1:] or None))
+                elif rest[:1] == "O" and re.fullmatch(r"[\d,]*", rest[1:]):
+                    parsed.options.append(("-PO", rest[1:] or None))
+                else:
+                    errors.append(f"unknown host discovery option {token}")
+            elif letter == "o":
+                if len(rest) < 1 or rest[0] not in OUTPUT_FORMATS:
+                    errors.append(f"unknown output option {token} (-oN, -oX, -oS, -oG or -oA)")
+                    continue
+                parsed.options.append((f"-o{rest[0]}", value_of(f"-o{rest[0]}", rest[1:] or None)))
+            elif letter == "i":
+                if rest[:1] not in ("L", "R"):
+                    errors.append(f"unknown input option {token} (-iL or -iR)")
+                    continue
+                value = value_of(f"-i{rest[0]}", rest[1:] or None)
+                check(f"-i{rest[0]}", number_error if rest[0] == "R" else None, value)
+                parsed.options.append((f"-i{rest[0]}", value))
+            elif letter in ("v", "d"):
+                if rest and not (rest.isdigit() or set(rest) == {letter}):
+                    errors.append(f"invalid verbosity option {token}")
+                parsed.options.append((f"-{letter}", rest or None))
+            elif letter in SHORT_ARGUMENTS:
+                if letter == "b":
+                    parsed.scan_types.append("b")
+                value = value_of(f"-{letter}", rest or None)
+                check(f"-{letter}", SHORT_ARGUMENTS[letter], value)
+                parsed.options.append((f"-{letter}", value))
+            elif set(token[1:]) <= SHORT_FLAGS:
+                # Options without arguments can be grouped: -nO, -6A
+                parsed.options.extend((f"-{flag}", None) for flag in token[1:])
+            else:
+                errors.append(f"unknown option {token}")
+        else:
+            parsed.targets.append(token)
+
+    errors.extend(semantic_errors(parsed))
+    return parsed, errors
+
+
+def semantic_errors(parsed):
+    """
+    Combinations nmap refuses, and missing or malformed targets.  Adds warnings
+    to `parsed` for scans that need root without sudo.
+    """
+    errors = []
+    tcp = sorted(set(parsed.scan_types) & TCP_SCAN_TYPES)
+    if len(tcp) > 1:
+        errors.append("only one TCP scan type can be used, got " + ", ".join(
+            "-b" if scan == "b" else f"-s{scan}" for scan in tcp))
+    if {"Y", "Z"} <= set(parsed.scan_types):
+        errors.append("-sY and -sZ cannot be combined")
+    for exclusive in ("n", "L"):
+        if exclusive in parsed.scan_types and (set(parsed.scan_types) & PORT_SCAN_TYPES
+                                                or {"n", "L"} <= set(parsed.scan_types)):
+            errors.append(f"-s{exclusive} cannot be combined with other scan types")
+    if "L" in parsed.scan_types and (parsed.has("-O") or "V" in parsed.scan_types or parsed.scripts):
+        errors.append("-sL lists targets only and cannot be combined with -O, -sV or scripts")
+    if parsed.has("-F") and parsed.has("-p"):
+        errors.append("-F (fast scan) cannot be combined with -p")
+    if "n" in parsed.scan_types and parsed.has("-p"):
+        parsed.warnings.append("-p has no effect with -sn (no port scan)")
+
+    ipv6 = parsed.has("-6")
+    # --version, --help / -h and --iflist print information and exit without scanning
+    informational = any(parsed.has(option) for option in ("--version", "--help", "-h", "--iflist"))
+    if not parsed.targets and not (parsed.has("-iL") or parsed.has("-iR") or informational):
+        errors.append("no target given")
+    errors.extend(error for error in (target_error(target, ipv6) for target in parsed.targets) if error)
+
+    if not parsed.sudo:
+        privileged = sorted({name for name, _ in parsed.options if name in PRIVILEGED})
+        if privileged:
+            parsed.warnings.append(f"{', '.join(privileged)} need root privileges; run with sudo")
+    return errors
+
+
+def validate(command, scripts=None):
+    """
+    Validates an nmap command offline (see parse_command for `scripts`).
+
+    Returns:
+        list: The errors in the command (an empty list when it is valid).
+    """
+    return parse_command(command, scripts)[1]
+
+
+def check_corpus(path=DEFAULT_CORPUS):
+    """
+    Validates every command of a JSONL corpus ({"command", "valid"} per line).
+    Script names are checked against KNOWN_SCRIPTS as if it were a complete
+    script.db, so the verdicts do not depend on the nmap install.
+
+    Returns:
+        tuple: (number of commands, list of mismatch descriptions, mean microseconds per command).
+    """
+    with open(path, 'r') as file:
+        cases = [json.loads(line) for line in file if line.strip() and not line.startswith("#")]
+    mismatches = []
+    start = time.perf_counter()
+    for case in cases:
+        errors = validate(case["command"], KNOWN_SCRIPTS)
+        if (not errors) != case["valid"]:
+            expected = "valid" if case["valid"] else "invalid"
+            mismatches.append(f"expected {expected}: {case['command']}" + (f" ({'; '.join(errors)})" if errors else ""))
+    seconds = time.perf_counter() - start
+    return len(cases), mismatches, seconds / max(len(cases), 1) * 1e6
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate nmap commands without running them.")
+    parser.add_argument("command", nargs="?", help="nmap command line (quoted)")
+    parser.add_argument("--check-corpus", nargs="?", const=DEFAULT_CORPUS, metavar="FILE",
+                        help="Validate the commands of a JSONL corpus against their expected verdicts")
+    args = parser.parse_args()
+
+    if args.check_corpus:
+        count, mismatches, microseconds = check_corpus(args.check_corpus)
+        for mismatch in mismatches:
+            print(mismatch)
+        print(f"{count - len(mismatches)}/{count} commands as expected, {microseconds:.0f} µs per command",
+              file=sys.stderr)
+        sys.exit(1 if mismatches else 0)
+    if not args.command:
+        parser.error("give a command or --check-corpus")
+    parsed, errors = parse_command(args.command)
+    for warning in parsed.warnings:
+        print(f"warning: {warning}")
+    for error in errors:
+        print(f"error: {error}")
+    print("valid" if not errors else "invalid")
+    sys.exit(1 if errors else 0)